@@ -0,0 +1,206 @@
+"""Hot/cold archival of closed jobs and sent reminders.
+
+Invoiced jobs whose invoice was paid more than ``ARCHIVE_AFTER_DAYS`` ago
+move, with their invoices, invoice items, task actions, spare-part requests
+and events, into the ``archived_*`` tables (see ``_archive_table`` in
+app/models.py); reminders sent more than ``REMINDER_ARCHIVE_DAYS`` ago move
+to ``archived_reminders``. The live tables and their indexes then only carry
+open and recent history.
+
+Each batch of ``ARCHIVE_BATCH_SIZE`` jobs (or reminders) is copied and
+deleted by primary key in its own short transaction, so locks are held for
+one batch only and an interrupted run simply resumes next time. Archived
+jobs' garages get their job board version bumped. Forecasting and reorder
+suggestions read live spare-part requests only, so ``ARCHIVE_AFTER_DAYS``
+should stay above ``PARTS_FORECAST_HISTORY_DAYS``.
+
+Reads by id fall through: when a job or invoice is not in the live tables,
+the routers look it up here and get the same shapes back.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Optional
+
+from sqlalchemy import delete, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from app.database import engine
+from app.job_board import bump_board_versions
+from app.models import (
+    Garage, Invoice, InvoiceItem, Job, JobEvent, JobStatus, JobTaskAction, Reminder, SparePartRequest, TaskAction,
+    User, Vehicle, WarehouseItem, archived_invoice_items, archived_invoices, archived_job_events,
+    archived_job_task_actions, archived_jobs, archived_reminders, archived_spare_part_requests,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+REMINDER_ARCHIVE_DAYS = int(os.getenv("REMINDER_ARCHIVE_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_HOUR = int(os.getenv("ARCHIVE_HOUR", "3"))  # nightly run, scheduler local time
+
+
+def _move(conn, archive, live, condition, now: datetime) -> None:
+    """Copy matching live rows into ``archive``; the caller deletes them."""
+    names = [column.name for column in live.columns]
+    conn.execute(
+        insert(archive).from_select(names + ["archived_at"], select(*live.columns, literal(now)).where(condition))
+    )
+
+
+def _archive_jobs(conn, job_ids: list[int], now: datetime) -> None:
+    invoice_ids = select(Invoice.id).where(Invoice.job_id.in_(job_ids)).scalar_subquery()
+    # Parents first; deleted in reverse so children never outlive their parent
+    moves = [
+        (archived_jobs, Job.__table__, Job.id.in_(job_ids)),
+        (archived_invoices, Invoice.__table__, Invoice.job_id.in_(job_ids)),
+        (archived_invoice_items, InvoiceItem.__table__, InvoiceItem.invoice_id.in_(invoice_ids)),
+        (archived_job_task_actions, JobTaskAction.__table__, JobTaskAction.job_id.in_(job_ids)),
+        (archived_spare_part_requests, SparePartRequest.__table__, SparePartRequest.job_id.in_(job_ids)),
+        (archived_job_events, JobEvent.__table__, JobEvent.job_id.in_(job_ids)),
+    ]
+    for archive, live, condition in moves:
+        _move(conn, archive, live, condition, now)
+
+    garage_ids = conn.execute(select(Job.garage_id).where(Job.id.in_(job_ids)).distinct()).scalars().all()
+    # jobs.invoice_id and invoices.job_id reference each other
+    conn.execute(update(Job.__table__).where(Job.id.in_(job_ids)).values(invoice_id=None))
+    for _, live, condition in reversed(moves):
+        conn.execute(delete(live).where(condition))
+    bump_board_versions(conn, garage_ids)
+
+
+def archive_closed_jobs(batch_size: int = ARCHIVE_BATCH_SIZE, bind=engine) -> int:
+    """Move jobs paid more than ARCHIVE_AFTER_DAYS ago to the archive. Returns the number moved."""
+    cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    eligible = (
+        select(Job.id)
+        .join(Invoice, Invoice.id == Job.invoice_id)
+        .where(Job.status == JobStatus.INVOICED)
+        .where(Invoice.paid == True)
+        .where(Invoice.paid_at < cutoff)
+        .order_by(Job.id)
+        .limit(batch_size)
+    )
+    moved = 0
+    while True:
+        with bind.begin() as conn:
+            job_ids = conn.execute(eligible).scalars().all()
+            if not job_ids:
+                return moved
+            _archive_jobs(conn, job_ids, datetime.utcnow())
+        moved += len(job_ids)
+
+
+def archive_sent_reminders(batch_size: int = ARCHIVE_BATCH_SIZE, bind=engine) -> int:
+    """Move reminders sent more than REMINDER_ARCHIVE_DAYS ago to the archive. Returns the number moved."""
+    cutoff = datetime.utcnow() - timedelta(days=REMINDER_ARCHIVE_DAYS)
+    eligible = select(Reminder.id).where(Reminder.sent_at < cutoff).order_by(Reminder.id).limit(batch_size)
+    moved = 0
+    while True:
+        with bind.begin() as conn:
+            reminder_ids = conn.execute(eligible).scalars().all()
+            if not reminder_ids:
+                return moved
+            condition = Reminder.id.in_(reminder_ids)
+            _move(conn, archived_reminders, Reminder.__table__, condition, datetime.utcnow())
+            conn.execute(delete(Reminder.__table__).where(condition))
+        moved += len(reminder_ids)
+
+
+def run_archival(bind=engine) -> dict:
+    result = {"jobs": archive_closed_jobs(bind=bind), "reminders": archive_sent_reminders(bind=bind)}
+    if result["jobs"] or result["reminders"]:
+        logger.info("Archived %d jobs and %d reminders", result["jobs"], result["reminders"])
+    return result
+
+
+# Fall-through reads ---------------------------------------------------------------------
+
+
+def _by_id(db: Session, model, ids) -> dict:
+    ids = {i for i in ids if i is not None}
+    return {obj.id: obj for obj in db.query(model).filter(model.id.in_(ids))} if ids else {}
+
+
+def archived_job(db: Session, job_id: int, garage_id: int):
+    """The archived job row, or None."""
+    return db.execute(
+        select(archived_jobs).where(archived_jobs.c.id == job_id, archived_jobs.c.garage_id == garage_id)
+    ).first()
+
+
+def archived_spare_part_requests_for(db: Session, job_id: int) -> list[SimpleNamespace]:
+    rows = db.execute(
+        select(archived_spare_part_requests)
+        .where(archived_spare_part_requests.c.job_id == job_id)
+        .order_by(archived_spare_part_requests.c.id)
+    ).all()
+    items = _by_id(db, WarehouseItem, (row.warehouse_item_id for row in rows))
+    return [SimpleNamespace(**row._mapping, warehouse_item=items.get(row.warehouse_item_id)) for row in rows]
+
+
+def archived_job_task_actions_for(db: Session, job_id: int) -> list[SimpleNamespace]:
+    rows = db.execute(
+        select(archived_job_task_actions)
+        .where(archived_job_task_actions.c.job_id == job_id)
+        .order_by(archived_job_task_actions.c.id)
+    ).all()
+    tasks = _by_id(db, TaskAction, (row.task_action_id for row in rows))
+    return [SimpleNamespace(**row._mapping, task_action=tasks.get(row.task_action_id)) for row in rows]
+
+
+def archived_job_detail(db: Session, job_id: int, garage_id: int) -> Optional[SimpleNamespace]:
+    """An archived job with what JobDetailOut serializes (attribute access, like Job), or None."""
+    job = archived_job(db, job_id, garage_id)
+    if job is None:
+        return None
+    users = _by_id(db, User, (job.site_manager_id, job.technician_id))
+    return SimpleNamespace(
+        **job._mapping,
+        vehicle=db.get(Vehicle, job.vehicle_id),
+        site_manager=users.get(job.site_manager_id),
+        technician=users.get(job.technician_id),
+        spare_part_requests=archived_spare_part_requests_for(db, job_id),
+        task_actions=archived_job_task_actions_for(db, job_id),
+    )
+
+
+def archived_job_events_for(db: Session, job_id: int) -> list:
+    return db.execute(
+        select(archived_job_events)
+        .where(archived_job_events.c.job_id == job_id)
+        .order_by(archived_job_events.c.created_at, archived_job_events.c.id)
+    ).all()
+
+
+def archived_invoice(db: Session, invoice_id: int, garage_id: int) -> Optional[SimpleNamespace]:
+    """An archived invoice with its items (attribute access, like Invoice), or None."""
+    row = db.execute(
+        select(archived_invoices)
+        .join(archived_jobs, archived_jobs.c.id == archived_invoices.c.job_id)
+        .where(archived_invoices.c.id == invoice_id, archived_jobs.c.garage_id == garage_id)
+    ).first()
+    if row is None:
+        return None
+    items = db.execute(
+        select(archived_invoice_items)
+        .where(archived_invoice_items.c.invoice_id == invoice_id)
+        .order_by(archived_invoice_items.c.id)
+    ).all()
+    return SimpleNamespace(**row._mapping, items=[SimpleNamespace(**item._mapping) for item in items])
+
+
+def archived_invoice_document(db: Session, invoice_id: int, garage_id: int) -> Optional[tuple]:
+    """(invoice, job) for invoice_documents.build_payload, or None."""
+    invoice = archived_invoice(db, invoice_id, garage_id)
+    if invoice is None:
+        return None
+    job = archived_job(db, invoice.job_id, garage_id)
+    return invoice, SimpleNamespace(
+        id=job.id, vehicle=db.get(Vehicle, job.vehicle_id), garage=db.get(Garage, job.garage_id)
+    )
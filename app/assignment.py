@@ -0,0 +1,235 @@
+"""Load- and skill-aware technician auto-assignment.
+
+Each garage's technicians are held in memory with their open job count
+(jobs ASSIGNED, IN_PROGRESS or AWAITING_PARTS) and skills, the operations
+streams listed in ``User.skills`` (none listed means any stream). A job goes
+to the least-loaded technician skilled in its operations stream, unless
+someone else has at least ``ASSIGNMENT_SKILL_PENALTY`` fewer open jobs (or
+nobody has the skill), in which case it goes to the least-loaded technician
+overall. Per garage there is a min-heap of (open jobs, technician id) for
+each stream plus one for everybody; entries whose count has since changed
+are skipped lazily.
+
+A garage is loaded with one grouped count query and then kept current by
+this process's own assignments and job transitions. Other workers' changes
+are picked up when the snapshot is older than ``ASSIGNMENT_REFRESH_SECONDS``,
+so across workers the balance is approximate; an explicit rebalance reloads
+first and corrects any drift, while the one after a manual assignment works
+from the snapshot.
+
+Rebalancing moves jobs that have not been started (ASSIGNED) off a
+technician who has at least ``ASSIGNMENT_REBALANCE_GAP`` more open jobs
+than the technician the job would go to now. Only such overloaded
+technicians' jobs are loaded, and nothing is when no one is overloaded.
+"""
+from __future__ import annotations
+
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Job, JobStatus, OperationsStream, User
+
+ASSIGNMENT_REFRESH_SECONDS = float(os.getenv("ASSIGNMENT_REFRESH_SECONDS", "30"))
+ASSIGNMENT_REBALANCE_GAP = int(os.getenv("ASSIGNMENT_REBALANCE_GAP", "2"))
+ASSIGNMENT_SKILL_PENALTY = int(os.getenv("ASSIGNMENT_SKILL_PENALTY", "3"))
+
+OPEN_STATUSES = (JobStatus.ASSIGNED, JobStatus.IN_PROGRESS, JobStatus.AWAITING_PARTS)
+
+
+def parse_skills(value: Optional[str]) -> frozenset[str]:
+    return frozenset(s.strip() for s in (value or "").split(",") if s.strip())
+
+
+def format_skills(streams: Iterable[OperationsStream]) -> str:
+    return ",".join(sorted({OperationsStream(s).value for s in streams}))
+
+
+def is_open(job_status) -> bool:
+    return job_status in OPEN_STATUSES
+
+
+def _stream_key(stream) -> str:
+    return OperationsStream(stream).value
+
+
+class _GarageTechnicians:
+    __slots__ = ("loaded_at", "skills", "counts", "heaps")
+
+    def __init__(self, skills: dict[int, frozenset[str]], counts: dict[int, int]):
+        self.loaded_at = time.monotonic()
+        self.skills = skills
+        self.counts = counts
+        # One heap per operations stream, plus None for every technician
+        self.heaps: dict[Optional[str], list[tuple[int, int]]] = {None: []}
+        for stream in OperationsStream:
+            self.heaps[stream.value] = []
+        for technician_id in skills:
+            self._push(technician_id)
+
+    def _push(self, technician_id: int) -> None:
+        entry = (self.counts[technician_id], technician_id)
+        skills = self.skills[technician_id]
+        for key, heap in self.heaps.items():
+            if key is None or not skills or key in skills:
+                heapq.heappush(heap, entry)
+
+    def _top(self, key: Optional[str]) -> Optional[int]:
+        heap = self.heaps.get(key)
+        while heap and self.counts.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
+    def best(self, stream: str) -> Optional[int]:
+        skilled, anyone = self._top(stream), self._top(None)
+        if skilled is None or (anyone is not None and self.counts[anyone] + ASSIGNMENT_SKILL_PENALTY <= self.counts[skilled]):
+            return anyone
+        return skilled
+
+    def adjust(self, technician_id: Optional[int], delta: int) -> None:
+        if technician_id not in self.counts:
+            return
+        self.counts[technician_id] = max(0, self.counts[technician_id] + delta)
+        self._push(technician_id)
+
+
+class AssignmentEngine:
+    """Per-process technician load index, keyed by garage."""
+
+    def __init__(self):
+        self._garages: dict[int, _GarageTechnicians] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session, garage_id: int) -> _GarageTechnicians:
+        technicians = (
+            db.query(User.id, User.skills)
+            .filter(User.garage_id == garage_id, User.role == "technician")
+            .all()
+        )
+        counts = dict(
+            db.query(Job.technician_id, func.count(Job.id))
+            .filter(Job.garage_id == garage_id)
+            .filter(Job.technician_id.isnot(None))
+            .filter(Job.status.in_(OPEN_STATUSES))
+            .group_by(Job.technician_id)
+            .all()
+        )
+        garage = _GarageTechnicians(
+            {t.id: parse_skills(t.skills) for t in technicians},
+            {t.id: counts.get(t.id, 0) for t in technicians},
+        )
+        with self._lock:
+            self._garages[garage_id] = garage
+        return garage
+
+    def _garage(self, db: Session, garage_id: int, reload: bool = False) -> _GarageTechnicians:
+        with self._lock:
+            garage = self._garages.get(garage_id)
+        if reload or garage is None or time.monotonic() - garage.loaded_at > ASSIGNMENT_REFRESH_SECONDS:
+            garage = self._load(db, garage_id)
+        return garage
+
+    def pick(self, db: Session, garage_id: int, stream) -> Optional[int]:
+        """Best technician for a job in ``stream``, counting the job against them right away."""
+        garage = self._garage(db, garage_id)
+        with self._lock:
+            technician_id = garage.best(_stream_key(stream))
+            garage.adjust(technician_id, 1)
+        return technician_id
+
+    def transition(self, garage_id: int, old_technician_id: Optional[int], old_status,
+                   new_technician_id: Optional[int], new_status) -> None:
+        """Fold a committed change of a job's technician or status into the counts."""
+        with self._lock:
+            garage = self._garages.get(garage_id)
+            if garage is None:
+                return
+            if old_technician_id is not None and is_open(old_status):
+                garage.adjust(old_technician_id, -1)
+            if new_technician_id is not None and is_open(new_status):
+                garage.adjust(new_technician_id, 1)
+
+    def workload(self, db: Session, garage_id: int) -> dict[int, int]:
+        garage = self._garage(db, garage_id)
+        with self._lock:
+            return dict(garage.counts)
+
+    def rebalance(
+        self, db: Session, garage_id: int, keep_job_ids: Iterable[int] = (), reload: bool = True
+    ) -> list[dict]:
+        """Move not-yet-started jobs off overloaded technicians (not committed).
+
+        Newest assignments move first; ``keep_job_ids`` are left where they are.
+        Returns the moves made.
+        """
+        garage = self._garage(db, garage_id, reload=reload)
+        with self._lock:
+            lightest = min(garage.counts.values(), default=0)
+            overloaded = [t for t, count in garage.counts.items() if count - lightest >= ASSIGNMENT_REBALANCE_GAP]
+        if not overloaded:
+            return []
+        keep = set(keep_job_ids)
+        candidates = (
+            db.query(Job)
+            .filter(Job.garage_id == garage_id)
+            .filter(Job.status == JobStatus.ASSIGNED)
+            .filter(Job.technician_id.in_(overloaded))
+            .order_by(Job.assigned_at.desc(), Job.id.desc())
+            .all()
+        )
+
+        now = datetime.utcnow()
+        moves = []
+        with self._lock:
+            for job in candidates:
+                source = job.technician_id
+                if job.id in keep or source not in garage.counts:
+                    continue
+                target = garage.best(_stream_key(job.operations_stream))
+                if target is None or target == source:
+                    continue
+                if garage.counts[source] - garage.counts[target] < ASSIGNMENT_REBALANCE_GAP:
+                    continue
+                garage.adjust(source, -1)
+                garage.adjust(target, 1)
+                job.technician_id = target
+                job.assigned_at = now
+                moves.append({"job_id": job.id, "from_technician_id": source, "to_technician_id": target})
+        return moves
+
+    def invalidate(self, garage_id: Optional[int] = None) -> None:
+        with self._lock:
+            if garage_id is None:
+                self._garages.clear()
+            else:
+                self._garages.pop(garage_id, None)
+
+
+assignment_engine = AssignmentEngine()
+
+
+def auto_assign(db: Session, jobs: Iterable[Job]) -> list[Job]:
+    """Assign unassigned RECEIVED jobs in order (not committed).
+
+    Returns the jobs that got a technician. If the transaction is rolled
+    back, call ``assignment_engine.invalidate`` for the garage.
+    """
+    now = datetime.utcnow()
+    assigned = []
+    for job in jobs:
+        if job.status != JobStatus.RECEIVED or job.technician_id is not None:
+            continue
+        technician_id = assignment_engine.pick(db, job.garage_id, job.operations_stream)
+        if technician_id is None:
+            break
+        job.technician_id = technician_id
+        job.status = JobStatus.ASSIGNED
+        job.assigned_at = now
+        assigned.append(job)
+    return assigned
@@ -1,23 +1,32 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import jwt, JWTError
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app.models import User
 
 SECRET_KEY = "dev-secret-change-me"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+# Session.info key of the user that job events flushed by the session are attributed to (app/job_events.py)
+ACTOR_KEY = "actor_id"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    # passlib (and the bcrypt backend probe) is only needed when hashing or
+    # verifying passwords, so keep it out of worker startup.
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     # Check if it's a SHA256 hash (fallback from bcrypt failure)
     if len(hashed_password) == 64 and all(c in '0123456789abcdef' for c in hashed_password.lower()):
@@ -25,7 +34,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return hashlib.sha256(plain_password.encode()).hexdigest() == hashed_password
     # Otherwise try bcrypt
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return get_pwd_context().verify(plain_password, hashed_password)
     except Exception:
         # Fallback to SHA256 if bcrypt fails
         import hashlib
@@ -37,7 +46,7 @@ def get_password_hash(password: str) -> str:
     if len(password) > 72:
         password = password[:72]
     try:
-        return pwd_context.hash(password)
+        return get_pwd_context().hash(password)
     except Exception as e:
         # Fallback if bcrypt fails
         import hashlib
@@ -45,13 +54,47 @@ def get_password_hash(password: str) -> str:
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def token_claims(request: Request) -> Optional[dict]:
+    """Claims of the request's bearer token; None without a valid token."""
+    from jose import jwt, JWTError
+
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+
+def token_garage_id(request: Request) -> Optional[int]:
+    """Garage of the request's bearer token (its ``gid`` claim); None without a valid token."""
+    payload = token_claims(request)
+    if payload is None:
+        return None
+    if "gid" in payload:
+        return payload["gid"]
+    if payload.get("sub") is None:
+        return None
+    # Tokens issued before they carried the garage: look the user up in the directory
+    db = SessionLocal()
+    try:
+        return db.query(User.garage_id).filter(User.id == int(payload["sub"])).scalar()
+    finally:
+        db.close()
+
+
 def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+    from jose import jwt, JWTError
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -65,11 +108,19 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
     except JWTError:
         raise credentials_exception
     user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+    # A token issued for another garage routed this request to that garage's database
+    if user is None or payload.get("gid", user.garage_id) != user.garage_id:
         raise credentials_exception
+    # Job events flushed by this request's session are attributed to the user
+    set_actor(db, user.id)
     return user
 
 
+def set_actor(db: Session, user_id: Optional[int]) -> None:
+    """Attribute job events flushed by this session to ``user_id``."""
+    db.info[ACTOR_KEY] = user_id
+
+
 def require_role(*roles: str):
     def _dep(user: User = Depends(get_current_user)) -> User:
         if user.role not in roles and user.role != 'admin':
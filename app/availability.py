@@ -0,0 +1,256 @@
+"""Garage appointment capacity and free-slot search.
+
+A garage can run ``min(service_bays, technicians)`` appointments at once.
+Each appointment occupies ``[scheduled_at, ends_at)``, where ``ends_at`` comes
+from the service type's duration (``SERVICE_DURATIONS``).
+
+Free-slot queries are answered from an in-memory, per-garage interval index
+(booked intervals sorted by start) instead of the appointments table. Each
+garage row carries a ``booking_version`` that every booking change bumps
+inside the booking transaction; the index compares it on each query and
+reloads the garage when another process has booked in the meantime.
+
+Bumping the version is also what makes ``reserve`` atomic: the UPDATE takes
+the garage's row lock (the write lock on SQLite) before overlapping
+bookings are counted, so two requests can't both take the last bay.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.models import Appointment, Garage, User
+
+# Minutes per service type; anything else takes DEFAULT_DURATION_MINUTES
+SERVICE_DURATIONS = {
+    "service": 120,
+    "repair": 240,
+    "inspection": 60,
+    "diagnostics": 60,
+    "wash": 30,
+}
+DEFAULT_DURATION_MINUTES = 60
+MAX_DURATION = timedelta(minutes=max([DEFAULT_DURATION_MINUTES, *SERVICE_DURATIONS.values()]))
+
+SLOT_MINUTES = int(os.getenv("APPOINTMENT_SLOT_MINUTES", "30"))
+OPENING_HOUR = int(os.getenv("GARAGE_OPENING_HOUR", "8"))
+CLOSING_HOUR = int(os.getenv("GARAGE_CLOSING_HOUR", "18"))
+MAX_AVAILABILITY_DAYS = 62
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; convert offset-aware request values to match."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def service_duration(service_type: str) -> timedelta:
+    return timedelta(minutes=SERVICE_DURATIONS.get(service_type.lower(), DEFAULT_DURATION_MINUTES))
+
+
+def appointment_end(appointment: Appointment) -> datetime:
+    return appointment.ends_at or appointment.scheduled_at + service_duration(appointment.service_type)
+
+
+def garage_capacity(db: Session, garage: Garage) -> int:
+    technicians = garage.technician_capacity
+    if technicians is None:
+        technicians = db.query(User).filter(User.garage_id == garage.id, User.role == "technician").count()
+    bays = garage.service_bays or 0
+    # A garage without technician accounts is limited by its bays only
+    return max(0, min(bays, technicians) if technicians else bays)
+
+
+def _max_overlap(intervals: list[tuple[datetime, datetime]], start: datetime, end: datetime) -> int:
+    """Highest number of intervals overlapping at any instant of [start, end)."""
+    events = []
+    for booked_start, booked_end in intervals:
+        lo, hi = max(booked_start, start), min(booked_end, end)
+        if lo < hi:
+            events.append((lo, 1))
+            events.append((hi, -1))
+    events.sort(key=lambda e: (e[0], e[1]))
+    current = peak = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+class _GarageBookings:
+    __slots__ = ("version", "starts", "entries")
+
+    def __init__(self, version: int, entries: list[tuple[datetime, datetime, int]]):
+        self.version = version
+        self.entries = sorted(entries)
+        self.starts = [entry[0] for entry in self.entries]
+
+    def add(self, start: datetime, end: datetime, appointment_id: int) -> None:
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.entries.insert(position, (start, end, appointment_id))
+
+    def remove(self, appointment_id: int) -> None:
+        for i, entry in enumerate(self.entries):
+            if entry[2] == appointment_id:
+                del self.entries[i]
+                del self.starts[i]
+                return
+
+    def overlapping(self, start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+        lo = bisect_left(self.starts, start - MAX_DURATION)
+        hi = bisect_left(self.starts, end)
+        return [(s, e) for s, e, _ in self.entries[lo:hi] if e > start]
+
+
+class BookingIndex:
+    """Per-process interval index of scheduled appointments, keyed by garage."""
+
+    def __init__(self):
+        self._garages: dict[int, _GarageBookings] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, garage: Garage) -> _GarageBookings:
+        with self._lock:
+            bookings = self._garages.get(garage.id)
+        if bookings is not None and bookings.version == garage.booking_version:
+            return bookings
+
+        horizon = datetime.utcnow() - MAX_DURATION
+        rows = (
+            db.query(Appointment)
+            .filter(Appointment.garage_id == garage.id)
+            .filter(Appointment.status == "scheduled")
+            .filter(Appointment.scheduled_at >= horizon)
+            .all()
+        )
+        bookings = _GarageBookings(garage.booking_version, [(a.scheduled_at, appointment_end(a), a.id) for a in rows])
+        with self._lock:
+            self._garages[garage.id] = bookings
+        return bookings
+
+    def apply(self, garage_id: int, version: int, appointment: Appointment) -> None:
+        """Fold a committed booking change into the index when it is the next version."""
+        with self._lock:
+            bookings = self._garages.get(garage_id)
+            if bookings is None:
+                return
+            if bookings.version != version - 1:
+                # Missed someone else's change; reload on next query
+                del self._garages[garage_id]
+                return
+            bookings.remove(appointment.id)
+            if appointment.status == "scheduled" and appointment.garage_id == garage_id:
+                bookings.add(appointment.scheduled_at, appointment_end(appointment), appointment.id)
+            bookings.version = version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._garages.clear()
+
+
+booking_index = BookingIndex()
+
+
+def bump_booking_version(db: Session, garage_id: int) -> int:
+    """Take the garage's booking lock and return the new booking version."""
+    updated = (
+        db.query(Garage)
+        .filter(Garage.id == garage_id)
+        .update({Garage.booking_version: Garage.booking_version + 1}, synchronize_session=False)
+    )
+    if not updated:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Garage not found")
+    return db.query(Garage.booking_version).filter(Garage.id == garage_id).scalar()
+
+
+def reserve(db: Session, garage_id: int, start: datetime, end: datetime, exclude_id: Optional[int] = None) -> int:
+    """Lock the garage's bookings and check [start, end) still has a free bay.
+
+    Must run in the transaction that writes the appointment. Returns the new
+    booking version to pass to ``booking_index.apply`` after commit; raises
+    409 when the slot is full.
+    """
+    version = bump_booking_version(db, garage_id)
+    garage = db.get(Garage, garage_id)
+
+    query = (
+        db.query(Appointment)
+        .filter(Appointment.garage_id == garage_id)
+        .filter(Appointment.status == "scheduled")
+        .filter(Appointment.scheduled_at < end)
+        .filter(Appointment.scheduled_at > start - MAX_DURATION)
+    )
+    if exclude_id is not None:
+        query = query.filter(Appointment.id != exclude_id)
+    booked = [(a.scheduled_at, appointment_end(a)) for a in query.all()]
+
+    if _max_overlap(booked, start, end) >= garage_capacity(db, garage):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No capacity left at this garage for the requested time"
+        )
+    return version
+
+
+def _first_slot(day_start: datetime, window_start: datetime) -> datetime:
+    step = timedelta(minutes=SLOT_MINUTES)
+    if window_start <= day_start:
+        return day_start
+    return day_start + step * math.ceil((window_start - day_start) / step)
+
+
+def available_slots(db: Session, garage: Garage, start: datetime, end: datetime, service_type: str) -> dict:
+    """Free slots for ``service_type`` between ``start`` and ``end`` within opening hours."""
+    duration = service_duration(service_type)
+    capacity = garage_capacity(db, garage)
+    bookings = booking_index.get(db, garage)
+    step = timedelta(minutes=SLOT_MINUTES)
+    cells_per_slot = math.ceil(duration / step)
+
+    start = max(start, datetime.utcnow())
+    slots = []
+    day = start.date()
+    while datetime.combine(day, time()) < end:
+        opening = datetime.combine(day, time(OPENING_HOUR))
+        closing = datetime.combine(day, time(CLOSING_HOUR))
+        day += timedelta(days=1)
+        if closing <= start or capacity == 0:
+            continue
+
+        # Occupancy per slot cell for the day via a difference array
+        cells = int((closing - opening) / step)
+        diff = [0] * (cells + 1)
+        for booked_start, booked_end in bookings.overlapping(opening, closing):
+            first = max(0, int((booked_start - opening) / step))
+            last = min(cells, math.ceil((booked_end - opening) / step))
+            diff[first] += 1
+            diff[last] -= 1
+        occupancy, running = [], 0
+        for delta in diff[:cells]:
+            running += delta
+            occupancy.append(running)
+
+        slot = _first_slot(opening, start)
+        while slot + duration <= closing and slot < end:
+            first = int((slot - opening) / step)
+            busiest = max(occupancy[first:first + cells_per_slot])
+            if busiest < capacity:
+                slots.append({"start": slot, "end": slot + duration, "available": capacity - busiest})
+            slot += step
+
+    return {
+        "garage_id": garage.id,
+        "service_type": service_type,
+        "duration_minutes": int(duration.total_seconds() // 60),
+        "capacity": capacity,
+        "slots": slots,
+    }
@@ -1,21 +1,54 @@
 import os
-from sqlalchemy import create_engine
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from app.metrics import InstrumentedQueuePool
+
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./mototrack.db")
 if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine_kwargs = {}
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine_kwargs["connect_args"] = {"check_same_thread": False}
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_kwargs)
+def make_engine(url: str, schema: Optional[str] = None):
+    """An engine with this app's pool settings; ``schema`` sets the PostgreSQL search_path."""
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    engine_kwargs = {}
+    connect_args = {}
+    if url.startswith("sqlite"):
+        connect_args["check_same_thread"] = False
+    if schema:
+        connect_args["options"] = f"-csearch_path={schema}"
+    if connect_args:
+        engine_kwargs["connect_args"] = connect_args
+    if make_url(url).database not in (None, "", ":memory:"):
+        # Same pool SQLAlchemy picks by default here, plus checkout-wait metrics
+        engine_kwargs["poolclass"] = InstrumentedQueuePool
+    return create_engine(url, **engine_kwargs)
+
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
-def get_db():
+def get_db(request: Request):
+    """Session on the database holding the authenticated user's garage (see app/tenancy.py)."""
+    from app.tenancy import session_for_request
+
+    db = session_for_request(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_directory_db():
+    """Session on the default database, which owns garages, users and task actions."""
     db = SessionLocal()
     try:
         yield db
@@ -23,10 +56,50 @@ def get_db():
         db.close()
 
 
+def add_missing_columns(bind=engine) -> None:
+    """Add columns declared on existing tables but missing from the database.
+
+    create_all only creates whole tables; this covers columns added to a model
+    later (nullable, or NOT NULL with a server_default). Their indexes are
+    created by create_missing_indexes().
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.tables.values():
+            if table.name not in existing_tables:
+                continue
+            present = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+
+
+def create_missing_indexes(bind=engine) -> None:
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
 def init_db() -> None:
     from app import models  # noqa: F401
+    from app import vehicle_identity
+    from app import stock_locations
+    from app import partitioning
+    from app import tenancy
 
-    Base.metadata.create_all(bind=engine)
+    # create_all, with jobs and invoices partitioned by month when enabled
+    partitioning.create_tables()
+    add_missing_columns()
+    # Unique lookup-key indexes can only be built once duplicates are merged
+    vehicle_identity.dedupe_vehicles()
+    create_missing_indexes()
     
     # Create default "Main" garage if it doesn't exist
     db = SessionLocal()
@@ -36,5 +109,32 @@ def init_db() -> None:
             main_garage = models.Garage(name="Main", address="Main Location")
             db.add(main_garage)
             db.commit()
+        main_garage_id = main_garage.id
     finally:
         db.close()
+    
+    with engine.begin() as conn:
+        # Appointments booked before they carried garage_id go to the garage that last serviced
+        # the vehicle (service order, then job), or to "Main", so garage-scoped lists show them
+        conn.execute(text(
+            "UPDATE appointments SET garage_id = COALESCE("
+            "(SELECT service_orders.garage_id FROM service_orders "
+            "WHERE service_orders.vehicle_id = appointments.vehicle_id AND service_orders.garage_id IS NOT NULL "
+            "ORDER BY service_orders.created_at DESC LIMIT 1), "
+            "(SELECT jobs.garage_id FROM jobs WHERE jobs.vehicle_id = appointments.vehicle_id "
+            "ORDER BY jobs.created_at DESC LIMIT 1), "
+            ":main_garage_id) "
+            "WHERE garage_id IS NULL"
+        ), {"main_garage_id": main_garage_id})
+        # Reminders written before they carried garage_id inherit their appointment's
+        conn.execute(text(
+            "UPDATE reminders SET garage_id = "
+            "(SELECT appointments.garage_id FROM appointments WHERE appointments.id = reminders.appointment_id) "
+            "WHERE garage_id IS NULL AND appointment_id IS NOT NULL"
+        ))
+    
+    # Stock recorded before per-garage locations goes to the first garage
+    stock_locations.backfill_locations()
+    
+    # Schema, id ranges and directory copies on every tenant shard
+    tenancy.prepare_shards()
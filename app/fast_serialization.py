@@ -0,0 +1,200 @@
+"""Opt-in fast path for large list responses.
+
+The default list endpoints load ORM objects, validate them through the
+``*Out`` schemas with ``from_attributes`` and encode with the stdlib JSON
+encoder. The fast path skips the ORM entirely: rows come back as plain
+mappings from Core selects, are validated by TypeAdapters built once at
+import time, and are encoded with orjson. The row shapes below mirror
+``JobOut``, ``InvoiceOut``, ``SparePartRequestOut``, ``WarehouseItemOut`` and
+``TaskActionOut`` field for field.
+
+The ``*_rows_for`` selects are also what the role dashboards are built from.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing_extensions import TypedDict
+
+from app.models import Invoice, InvoiceItem, Job, SparePartRequest, TaskAction, WarehouseItem
+
+
+class JobRow(TypedDict):
+    id: int
+    vehicle_id: int
+    garage_id: int
+    site_manager_id: int
+    technician_id: Optional[int]
+    operations_stream: str
+    revenue_stream: str
+    status: str
+    issues_reported: str
+    work_done: str
+    manager_notes: str
+    created_at: datetime
+    assigned_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    invoice_id: Optional[int]
+
+
+class InvoiceItemRow(TypedDict):
+    id: int
+    invoice_id: int
+    warehouse_item_id: Optional[int]
+    description: str
+    quantity: int
+    unit_price: float
+    total: float
+    item_type: str
+
+
+class InvoiceRow(TypedDict):
+    id: int
+    job_id: int
+    invoice_number: str
+    subtotal: float
+    tax: float
+    total: float
+    created_at: datetime
+    paid: bool
+    paid_at: Optional[datetime]
+    items: List[InvoiceItemRow]
+
+
+class WarehouseItemRow(TypedDict):
+    id: int
+    name: str
+    part_number: Optional[str]
+    description: str
+    quantity_in_stock: int
+    unit_price: float
+    reorder_level: int
+    is_active: bool
+
+
+class TaskActionRow(TypedDict):
+    id: int
+    operations_stream: str
+    name: str
+    description: str
+    default_labor_cost: float
+    is_active: bool
+
+
+class SparePartRequestRow(TypedDict):
+    id: int
+    job_id: int
+    warehouse_item_id: int
+    quantity: int
+    status: str
+    requested_by_id: int
+    approved_by_id: Optional[int]
+    issued_by_id: Optional[int]
+    requested_at: datetime
+    approved_at: Optional[datetime]
+    issued_at: Optional[datetime]
+    notes: str
+    warehouse_item: Optional[WarehouseItemRow]
+
+
+JOB_COLUMNS = [getattr(Job, name) for name in JobRow.__annotations__]
+INVOICE_COLUMNS = [getattr(Invoice, name) for name in InvoiceRow.__annotations__ if name != "items"]
+INVOICE_ITEM_COLUMNS = [getattr(InvoiceItem, name) for name in InvoiceItemRow.__annotations__]
+SPARE_PART_REQUEST_COLUMNS = [
+    getattr(SparePartRequest, name) for name in SparePartRequestRow.__annotations__ if name != "warehouse_item"
+]
+WAREHOUSE_ITEM_COLUMNS = [getattr(WarehouseItem, name) for name in WarehouseItemRow.__annotations__]
+REQUEST_WAREHOUSE_ITEM_COLUMNS = [
+    getattr(WarehouseItem, name).label(f"warehouse_item__{name}") for name in WarehouseItemRow.__annotations__
+]
+TASK_ACTION_COLUMNS = [getattr(TaskAction, name) for name in TaskActionRow.__annotations__]
+
+job_rows = TypeAdapter(List[JobRow])
+invoice_rows = TypeAdapter(List[InvoiceRow])
+spare_part_request_rows = TypeAdapter(List[SparePartRequestRow])
+warehouse_item_rows = TypeAdapter(List[WarehouseItemRow])
+task_action_rows = TypeAdapter(List[TaskActionRow])
+
+
+def job_rows_for(db: Session, conditions: list) -> list:
+    stmt = select(*JOB_COLUMNS).where(*conditions).order_by(Job.created_at.desc())
+    return job_rows.validate_python(db.execute(stmt).mappings().all())
+
+
+def job_list_response(db: Session, conditions: list) -> ORJSONResponse:
+    return ORJSONResponse(job_rows_for(db, conditions))
+
+
+def warehouse_item_rows_for(db: Session, conditions: list, order_by=WarehouseItem.name) -> list:
+    stmt = select(*WAREHOUSE_ITEM_COLUMNS).where(*conditions).order_by(order_by)
+    return warehouse_item_rows.validate_python(db.execute(stmt).mappings().all())
+
+
+def task_action_rows_for(db: Session, conditions: list) -> list:
+    stmt = select(*TASK_ACTION_COLUMNS).where(*conditions).order_by(TaskAction.operations_stream, TaskAction.name)
+    return task_action_rows.validate_python(db.execute(stmt).mappings().all())
+
+
+def invoice_rows_for(db: Session, conditions: list) -> list:
+    """``conditions`` may reference both Invoice and Job columns."""
+    stmt = (
+        select(*INVOICE_COLUMNS)
+        .join(Job, Invoice.job_id == Job.id)
+        .where(*conditions)
+        .order_by(Invoice.created_at.desc())
+    )
+    invoices = [dict(row) for row in db.execute(stmt).mappings()]
+
+    items_by_invoice = {invoice["id"]: [] for invoice in invoices}
+    if items_by_invoice:
+        items_stmt = (
+            select(*INVOICE_ITEM_COLUMNS)
+            .join(Invoice, InvoiceItem.invoice_id == Invoice.id)
+            .join(Job, Invoice.job_id == Job.id)
+            .where(*conditions)
+            .order_by(InvoiceItem.id)
+        )
+        for item in db.execute(items_stmt).mappings():
+            items_by_invoice[item["invoice_id"]].append(item)
+    for invoice in invoices:
+        invoice["items"] = items_by_invoice[invoice["id"]]
+
+    return invoice_rows.validate_python(invoices)
+
+
+def invoice_list_response(db: Session, conditions: list) -> ORJSONResponse:
+    return ORJSONResponse(invoice_rows_for(db, conditions))
+
+
+def spare_part_request_rows_for(db: Session, conditions: list, order_by=None) -> list:
+    """``conditions`` may reference both SparePartRequest and Job columns."""
+    stmt = (
+        select(*SPARE_PART_REQUEST_COLUMNS, *REQUEST_WAREHOUSE_ITEM_COLUMNS)
+        .join(Job, SparePartRequest.job_id == Job.id)
+        .outerjoin(WarehouseItem, SparePartRequest.warehouse_item_id == WarehouseItem.id)
+        .where(*conditions)
+    )
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+
+    prefix = "warehouse_item__"
+    requests = []
+    for row in db.execute(stmt).mappings():
+        request = {}
+        warehouse_item = {}
+        for key, value in row.items():
+            if key.startswith(prefix):
+                warehouse_item[key[len(prefix):]] = value
+            else:
+                request[key] = value
+        request["warehouse_item"] = warehouse_item if warehouse_item["id"] is not None else None
+        requests.append(request)
+
+    return spare_part_request_rows.validate_python(requests)
+
+
+def spare_part_request_list_response(db: Session, conditions: list, order_by=None) -> ORJSONResponse:
+    return ORJSONResponse(spare_part_request_rows_for(db, conditions, order_by=order_by))
@@ -0,0 +1,254 @@
+"""Idempotency-Key support for POST requests.
+
+Mobile clients on flaky workshop Wi-Fi retry POSTs whose response never
+arrived: creating a job, invoicing a job, issuing parts. When a POST carries
+an ``Idempotency-Key`` header, its handler runs once for that key. Retries
+with the same key get the first response again, with its headers (Location,
+ETag and the like) and an ``Idempotent-Replayed: true`` header.
+
+Keys are scoped to the user. They are stored in ``idempotency_keys`` in the
+database of the user's garage and kept for ``IDEMPOTENCY_RETENTION_HOURS``.
+The first request claims its key and holds it for up to
+``IDEMPOTENCY_LOCK_SECONDS`` while its handler runs. A duplicate that arrives
+in the meantime waits up to ``IDEMPOTENCY_WAIT_SECONDS`` for the stored
+response. If none arrives it gets 409 with Retry-After. Reusing a key for a
+different request (method, path, query or body) is rejected with 422.
+
+Only successful (2xx) responses are stored. Handlers reject a request before
+committing anything, so after an error a retry with the same key runs the
+handler again. So does a retry after the lock lapses, which happens when a
+worker dies between committing and storing the response.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.auth import token_claims, token_garage_id
+from app.database import engine
+from app.models import IdempotencyKey
+from app.tenancy import tenant_router
+
+IDEMPOTENCY_RETENTION = timedelta(hours=int(os.getenv("IDEMPOTENCY_RETENTION_HOURS", "24")))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "5"))
+
+MAX_KEY_LENGTH = 255
+_POLL_SECONDS = 0.1
+# Recomputed for the replayed body or set per connection by the server
+_UNSTORED_HEADERS = {b"content-length", b"transfer-encoding", b"connection", b"date", b"server"}
+
+keys = IdempotencyKey.__table__
+
+
+class Claim:
+    """Outcome of claiming a key: ``run`` the handler, ``replay`` a stored response, ``busy`` or ``mismatch``."""
+
+    def __init__(self, outcome: str, record_id: Optional[int] = None, created_at: Optional[datetime] = None, row=None):
+        self.outcome = outcome
+        self.record_id = record_id
+        self.created_at = created_at  # identifies this claim; a takeover resets it
+        self.row = row
+
+
+def claim(bind, user_id: int, garage_id: Optional[int], key: str, request_hash: str) -> Claim:
+    now = datetime.utcnow()
+    locked_until = now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+    try:
+        with bind.begin() as conn:
+            record_id = conn.execute(insert(keys).values(
+                user_id=user_id, garage_id=garage_id, key=key, request_hash=request_hash,
+                locked_until=locked_until, created_at=now,
+            )).inserted_primary_key[0]
+        return Claim("run", record_id, now)
+    except IntegrityError:
+        pass
+
+    with bind.begin() as conn:
+        row = conn.execute(select(keys).where(keys.c.user_id == user_id, keys.c.key == key)).first()
+        if row is None:
+            # Purged or released since the insert failed: claim again on the next poll
+            return Claim("busy")
+        expired = row.created_at < now - IDEMPOTENCY_RETENTION
+        if not expired:
+            if row.request_hash != request_hash:
+                return Claim("mismatch")
+            if row.status_code is not None:
+                return Claim("replay", row=row)
+            if row.locked_until > now:
+                return Claim("busy")
+        # An expired record, or a lock whose worker died: take the key over unless another request just did
+        stmt = update(keys).where(keys.c.id == row.id, keys.c.created_at == row.created_at)
+        if not expired:
+            stmt = stmt.where(keys.c.status_code.is_(None))
+        taken = conn.execute(stmt.values(
+            request_hash=request_hash, locked_until=locked_until, created_at=now,
+            status_code=None, content_type=None, response_headers=None, response_body=None,
+        ))
+        if taken.rowcount != 1:
+            return Claim("busy")
+        return Claim("run", row.id, now)
+
+
+def store_response(bind, claimed: Claim, status_code: int, raw_headers: list, body: bytes) -> None:
+    headers = [
+        [name.decode("latin-1"), value.decode("latin-1")]
+        for name, value in raw_headers if name.lower() not in _UNSTORED_HEADERS
+    ]
+    with bind.begin() as conn:
+        conn.execute(
+            update(keys).where(keys.c.id == claimed.record_id, keys.c.created_at == claimed.created_at)
+            .values(status_code=status_code, response_headers=json.dumps(headers), response_body=body, locked_until=None)
+        )
+
+
+def replay_response(row) -> Response:
+    """The stored response, with its original headers and ``Idempotent-Replayed: true``."""
+    if row.response_headers is None:
+        return Response(
+            content=row.response_body, status_code=row.status_code, media_type=row.content_type,
+            headers={"Idempotent-Replayed": "true"},
+        )
+    response = Response(content=row.response_body, status_code=row.status_code)
+    response.raw_headers.extend(
+        (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(row.response_headers)
+    )
+    response.raw_headers.append((b"idempotent-replayed", b"true"))
+    return response
+
+
+def release(bind, claimed: Claim) -> None:
+    """Drop a claim whose request failed, so a retry runs the handler."""
+    with bind.begin() as conn:
+        conn.execute(
+            delete(keys).where(
+                keys.c.id == claimed.record_id, keys.c.created_at == claimed.created_at, keys.c.status_code.is_(None)
+            )
+        )
+
+
+def purge_expired_keys(bind=engine) -> int:
+    """Delete keys older than the retention window; returns how many were removed."""
+    with bind.begin() as conn:
+        return conn.execute(
+            delete(keys).where(keys.c.created_at < datetime.utcnow() - IDEMPOTENCY_RETENTION)
+        ).rowcount
+
+
+def _principal(request: Request):
+    """(user id, garage id, database) of the request's token; None to leave the request to its handler."""
+    claims = token_claims(request)
+    if claims is None or claims.get("sub") is None:
+        return None
+    garage_id = token_garage_id(request)
+    if tenant_router.is_moving(garage_id):
+        # Its writes answer 503 anyway
+        return None
+    return int(claims["sub"]), garage_id, tenant_router.for_garage(garage_id).engine
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware running each keyed POST once and replaying its stored response to retries."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        key = request.headers.get("idempotency-key")
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters"}, status_code=400)
+            await response(scope, receive, send)
+            return
+        principal = await run_in_threadpool(_principal, request)
+        if principal is None:
+            await self.app(scope, receive, send)
+            return
+        user_id, garage_id, bind = principal
+
+        # Read the body up front to fingerprint the request, then hand it on to the app
+        messages = []
+        body = b""
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        fingerprint = hashlib.sha256()
+        for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body):
+            fingerprint.update(part)
+            fingerprint.update(b"\0")
+        request_hash = fingerprint.hexdigest()
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            claimed = await run_in_threadpool(claim, bind, user_id, garage_id, key, request_hash)
+            if claimed.outcome != "busy" or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(_POLL_SECONDS)
+
+        if claimed.outcome == "replay":
+            response = replay_response(claimed.row)
+            await response(scope, receive, send)
+            return
+        if claimed.outcome == "mismatch":
+            response = JSONResponse(
+                {"detail": "Idempotency-Key was already used for a different request"}, status_code=422
+            )
+            await response(scope, receive, send)
+            return
+        if claimed.outcome == "busy":
+            response = JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still in progress"}, status_code=409,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        async def receive_wrapper():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        status_code = None
+        raw_headers = []
+        chunks = []
+        finished = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, raw_headers, finished
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                raw_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                finished = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            if finished and 200 <= status_code < 300:
+                await run_in_threadpool(store_response, bind, claimed, status_code, raw_headers, b"".join(chunks))
+            else:
+                await run_in_threadpool(release, bind, claimed)
@@ -0,0 +1,4 @@
+"""When the API process started importing; main.py imports this first for its startup report."""
+import time
+
+IMPORT_STARTED = time.perf_counter()
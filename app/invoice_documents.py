@@ -0,0 +1,288 @@
+"""Invoice document rendering (HTML/PDF).
+
+Rendering is CPU bound, so it runs in a process pool instead of the request
+threadpool. Rendered documents are stored in a content-addressed file cache:
+``<INVOICE_CACHE_DIR>/<invoice_id>/<sha256>.<format>``, where the hash covers
+the invoice data, the output format and the template version. A changed
+invoice (e.g. marked paid) gets a new hash and the stale file is dropped.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+INVOICE_CACHE_DIR = os.getenv("INVOICE_CACHE_DIR", "./invoice_cache")
+INVOICE_RENDER_WORKERS = int(os.getenv("INVOICE_RENDER_WORKERS", "2"))
+
+# Bump when the templates or the PDF layout change so cached files are re-rendered.
+TEMPLATE_VERSION = "1"
+
+MEDIA_TYPES = {"html": "text/html; charset=utf-8", "pdf": "application/pdf"}
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Invoice {{ invoice.invoice_number }}</title>
+<style>
+body { font-family: Helvetica, Arial, sans-serif; margin: 2em; color: #222; }
+table { border-collapse: collapse; width: 100%; }
+th, td { border-bottom: 1px solid #ddd; padding: 6px; text-align: left; }
+td.num, th.num { text-align: right; }
+</style>
+</head>
+<body>
+<h1>{{ garage.name }}</h1>
+<p>{{ garage.address }}</p>
+<h2>Invoice {{ invoice.invoice_number }}</h2>
+<p>Date: {{ invoice.created_at[:10] }}<br>
+Job #{{ job.id }} &middot; {{ vehicle.registration_number }}{% if vehicle.make %} &middot; {{ vehicle.make }} {{ vehicle.model or "" }}{% endif %}<br>
+Customer: {{ vehicle.owner_name }} ({{ vehicle.owner_contact }})</p>
+<table>
+<tr><th>Description</th><th>Type</th><th class="num">Qty</th><th class="num">Unit price</th><th class="num">Total</th></tr>
+{% for item in items %}
+<tr><td>{{ item.description }}</td><td>{{ item.item_type }}</td><td class="num">{{ item.quantity }}</td><td class="num">{{ "%.2f"|format(item.unit_price) }}</td><td class="num">{{ "%.2f"|format(item.total) }}</td></tr>
+{% endfor %}
+<tr><td colspan="4" class="num">Subtotal</td><td class="num">{{ "%.2f"|format(invoice.subtotal) }}</td></tr>
+<tr><td colspan="4" class="num">Tax</td><td class="num">{{ "%.2f"|format(invoice.tax) }}</td></tr>
+<tr><th colspan="4" class="num">Total</th><th class="num">{{ "%.2f"|format(invoice.total) }}</th></tr>
+</table>
+<p>Status: {% if invoice.paid %}PAID{% if invoice.paid_at %} on {{ invoice.paid_at[:10] }}{% endif %}{% else %}UNPAID{% endif %}</p>
+</body>
+</html>
+"""
+
+# Plain-text layout used for the PDF body, one output line per template line.
+TEXT_TEMPLATE = """{{ garage.name }}
+{{ garage.address }}
+
+INVOICE {{ invoice.invoice_number }}
+Date: {{ invoice.created_at[:10] }}
+Job #{{ job.id }} - {{ vehicle.registration_number }}{% if vehicle.make %} - {{ vehicle.make }} {{ vehicle.model or "" }}{% endif %}
+Customer: {{ vehicle.owner_name }} ({{ vehicle.owner_contact }})
+
+{{ "%-40s %-8s %5s %12s %12s"|format("Description", "Type", "Qty", "Unit price", "Total") }}
+{% for item in items %}{{ "%-40.40s %-8.8s %5d %12.2f %12.2f"|format(item.description, item.item_type, item.quantity, item.unit_price, item.total) }}
+{% endfor %}
+{{ "%67s %12.2f"|format("Subtotal", invoice.subtotal) }}
+{{ "%67s %12.2f"|format("Tax", invoice.tax) }}
+{{ "%67s %12.2f"|format("Total", invoice.total) }}
+
+Status: {% if invoice.paid %}PAID{% if invoice.paid_at %} on {{ invoice.paid_at[:10] }}{% endif %}{% else %}UNPAID{% endif %}
+"""
+
+_templates: Optional[dict] = None
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_templates() -> dict:
+    """Compile the templates once per process."""
+    global _templates
+    if _templates is None:
+        from jinja2 import Environment, StrictUndefined
+
+        html_env = Environment(autoescape=True, undefined=StrictUndefined)
+        text_env = Environment(autoescape=False, undefined=StrictUndefined, keep_trailing_newline=True)
+        _templates = {
+            "html": html_env.from_string(HTML_TEMPLATE),
+            "pdf": text_env.from_string(TEXT_TEMPLATE),
+        }
+    return _templates
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def build_payload(invoice, job) -> dict:
+    """Snapshot an Invoice, its Job and related rows into plain, picklable data."""
+    vehicle = job.vehicle
+    garage = job.garage
+    return {
+        "invoice": {
+            "id": invoice.id,
+            "invoice_number": invoice.invoice_number,
+            "subtotal": invoice.subtotal,
+            "tax": invoice.tax,
+            "total": invoice.total,
+            "created_at": _iso(invoice.created_at),
+            "paid": bool(invoice.paid),
+            "paid_at": _iso(invoice.paid_at),
+        },
+        "items": [
+            {
+                "description": item.description,
+                "item_type": item.item_type,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+                "total": item.total,
+            }
+            for item in sorted(invoice.items, key=lambda i: i.id)
+        ],
+        "job": {"id": job.id},
+        "vehicle": {
+            "registration_number": vehicle.registration_number,
+            "make": vehicle.make,
+            "model": vehicle.model,
+            "owner_name": vehicle.owner_name,
+            "owner_contact": vehicle.owner_contact,
+        },
+        "garage": {"name": garage.name, "address": garage.address or ""},
+    }
+
+
+def content_hash(payload: dict, fmt: str) -> str:
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{TEMPLATE_VERSION}:{fmt}:{raw}".encode()).hexdigest()
+
+
+def _pdf_escape(line: str) -> str:
+    line = line.encode("latin-1", "replace").decode("latin-1")
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text_to_pdf(text: str, lines_per_page: int = 60) -> bytes:
+    """Lay out monospaced text lines as a minimal multi-page PDF."""
+    lines = text.rstrip("\n").split("\n") or [""]
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page.
+    objects = {}
+    kids = []
+    for index, page_lines in enumerate(pages):
+        page_num = 4 + index * 2
+        content_num = page_num + 1
+        kids.append(f"{page_num} 0 R")
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td\n" + "".join(f"({_pdf_escape(l)}) '\n" for l in page_lines) + "ET"
+        stream_bytes = stream.encode("latin-1")
+        objects[page_num] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_num} 0 R >>"
+        ).encode()
+        objects[content_num] = b"<< /Length %d >>\nstream\n" % len(stream_bytes) + stream_bytes + b"\nendstream"
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+    objects[3] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += b"%d 0 obj\n" % num + objects[num] + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for num in sorted(objects):
+        out += b"%010d 00000 n \n" % offsets[num]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    return bytes(out)
+
+
+def render_document(payload: dict, fmt: str) -> bytes:
+    """Render an invoice payload. Runs inside a pool worker."""
+    rendered = _get_templates()[fmt].render(**payload)
+    if fmt == "pdf":
+        return _text_to_pdf(rendered)
+    return rendered.encode("utf-8")
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=INVOICE_RENDER_WORKERS, initializer=_get_templates)
+    return _pool
+
+
+def shutdown_render_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def cache_path(invoice_id: int, digest: str, fmt: str) -> str:
+    return os.path.join(INVOICE_CACHE_DIR, str(invoice_id), f"{digest}.{fmt}")
+
+
+async def get_or_render(invoice_id: int, payload: dict, fmt: str, digest: str) -> str:
+    """Return the cached document path, rendering it in the pool on a miss."""
+    path = cache_path(invoice_id, digest, fmt)
+    if os.path.exists(path):
+        return path
+
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(get_render_pool(), render_document, payload, fmt)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+    # Older renders of the same invoice/format are unreachable once the content changed.
+    for name in os.listdir(directory):
+        if name.endswith(f".{fmt}") and name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse a single ``bytes=`` range. Returns (start, end) inclusive, or None
+    when the header should be ignored. Raises ValueError if unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Multi-range requests are served as a full response.
+        return None
+    start_s, _, end_s = spec.strip().partition("-")
+    try:
+        start = int(start_s) if start_s else None
+        end = int(end_s) if end_s else None
+    except ValueError:
+        return None
+    if start is None:
+        if end is None:
+            return None
+        if end == 0:
+            raise ValueError("empty suffix range")
+        start, end = max(size - end, 0), size - 1
+    elif end is None:
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def document_response(request: Request, path: str, fmt: str, etag: str) -> Response:
+    """Serve a cached document with ETag and single byte-range support."""
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, no-cache"}
+    media_type = MEDIA_TYPES[fmt]
+    size = os.path.getsize(path)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            with open(path, "rb") as fh:
+                fh.seek(start)
+                chunk = fh.read(end - start + 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(content=chunk, status_code=206, media_type=media_type, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers)
@@ -0,0 +1,149 @@
+"""Per-garage job status board.
+
+The board holds job counts and the oldest ``created_at`` for each
+(status, operations stream). One GROUP BY query computes it, served from the
+``ix_jobs_garage_status_stream`` index, and the result is cached per garage.
+
+Every flush that inserts, deletes or changes the status, stream or garage of
+a ``Job`` records the garage on the session, and its row in
+``job_board_versions`` is bumped as the transaction's last statement, just
+before COMMIT (see the listeners below). The version row is locked only for
+the commit itself, never while a handler runs, and garage rows are not
+touched. Any worker can check its cached copy with a single primary-key
+read. Writes that bypass the ORM unit of work (Core or bulk UPDATEs) go
+unseen for at most ``BOARD_CACHE_SECONDS``.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from typing import Iterable
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import Job, JobBoardVersion
+
+BOARD_CACHE_SECONDS = float(os.getenv("BOARD_CACHE_SECONDS", "300"))
+
+_BOARD_FIELDS = ("status", "operations_stream", "garage_id", "created_at")
+_PENDING_KEY = "job_board_garages"
+
+versions = JobBoardVersion.__table__
+
+
+# Built once; constructing the upsert on every commit took nearly as long as running it
+_BUMPS = {
+    name: dialect.insert(versions).on_conflict_do_update(
+        index_elements=["garage_id"], set_={"version": versions.c.version + 1}
+    )
+    for name, dialect in (("postgresql", postgresql), ("sqlite", sqlite))
+}
+
+
+def bump_board_versions(conn, garage_ids: Iterable[int]) -> None:
+    """Bump the board version of each garage, creating its row on first use."""
+    rows = [{"garage_id": garage_id, "version": 1} for garage_id in sorted(set(garage_ids))]
+    if not rows:
+        return
+    stmt = _BUMPS["postgresql" if conn.dialect.name == "postgresql" else "sqlite"]
+    conn.execute(stmt, rows[0] if len(rows) == 1 else rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_board_garages(session: Session, flush_context) -> None:
+    garage_ids = session.info.setdefault(_PENDING_KEY, set())
+    for obj in session.new:
+        if isinstance(obj, Job):
+            garage_ids.add(obj.garage_id)
+    for obj in session.deleted:
+        if isinstance(obj, Job):
+            garage_ids.add(obj.garage_id)
+    for obj in session.dirty:
+        if not isinstance(obj, Job):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[field].history.has_changes() for field in _BOARD_FIELDS):
+            garage_ids.add(obj.garage_id)
+            # A job moved between garages changes both boards
+            garage_ids.update(state.attrs.garage_id.history.deleted)
+    garage_ids.discard(None)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_boards_on_commit(session: Session) -> None:
+    # Flush first so the commit's own flush has nothing left to record
+    session.flush()
+    garage_ids = session.info.pop(_PENDING_KEY, None)
+    if garage_ids:
+        bump_board_versions(session.connection(), garage_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_board_garages(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+class JobBoardCache:
+    """Per-process cache of board rows, keyed by garage and checked against its board version."""
+
+    def __init__(self):
+        self._boards: dict[int, tuple[int, float, list[tuple]]] = {}
+        self._lock = threading.Lock()
+
+    def rows(self, db: Session, garage_id: int) -> list[tuple]:
+        """(status, operations_stream, count, oldest created_at) per non-empty cell."""
+        version = db.query(JobBoardVersion.version).filter(JobBoardVersion.garage_id == garage_id).scalar() or 0
+        with self._lock:
+            cached = self._boards.get(garage_id)
+        if cached is not None and cached[0] == version and time.monotonic() - cached[1] < BOARD_CACHE_SECONDS:
+            return cached[2]
+
+        rows = [
+            (status.value, stream.value, count, oldest)
+            for status, stream, count, oldest in (
+                db.query(Job.status, Job.operations_stream, func.count(Job.id), func.min(Job.created_at))
+                .filter(Job.garage_id == garage_id)
+                .group_by(Job.status, Job.operations_stream)
+                .all()
+            )
+        ]
+        with self._lock:
+            self._boards[garage_id] = (version, time.monotonic(), rows)
+        return rows
+
+    def clear(self) -> None:
+        with self._lock:
+            self._boards.clear()
+
+
+board_cache = JobBoardCache()
+
+
+def job_board(db: Session, garage_id: int) -> dict:
+    """The garage's board with ages relative to now."""
+    now = datetime.utcnow()
+    cells = []
+    by_status: dict[str, int] = {}
+    by_stream: dict[str, int] = {}
+    for status, stream, count, oldest in board_cache.rows(db, garage_id):
+        cells.append({
+            "status": status,
+            "operations_stream": stream,
+            "count": count,
+            "oldest_created_at": oldest,
+            "oldest_age_seconds": max(0, int((now - oldest).total_seconds())) if oldest else None,
+        })
+        by_status[status] = by_status.get(status, 0) + count
+        by_stream[stream] = by_stream.get(stream, 0) + count
+    return {
+        "garage_id": garage_id,
+        "generated_at": now,
+        "cells": cells,
+        "by_status": by_status,
+        "by_operations_stream": by_stream,
+    }
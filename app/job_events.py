@@ -0,0 +1,196 @@
+"""Append-only job event log and time-in-status analytics.
+
+Every flush that creates a job or changes its status or technician, creates a
+spare-part request or changes its status, or creates or pays an invoice
+appends rows to ``job_events`` on the flush's own connection (see the
+``after_flush`` listener below), so each event commits or rolls back with the
+change it records. The jobs, spare-parts and billing routers only commit as
+usual; the actor is the authenticated user, which ``get_current_user`` stores
+in ``Session.info`` through ``app.auth.set_actor``. Writes that bypass the
+ORM unit of work are not logged.
+
+Time in status is computed from the job status events, loaded as compact
+columnar arrays (job id, timestamp, status code) ordered by job and time:
+each event's interval runs to the job's next event, or to now for the job's
+current status unless that status is final.
+"""
+from __future__ import annotations
+
+import csv
+import enum
+import io
+from datetime import datetime
+from itertools import chain
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import orjson
+from sqlalchemy import event, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from app.auth import ACTOR_KEY
+from app.database import engine
+from app.models import Invoice, Job, JobEvent, JobStatus, SparePartRequest
+
+# numpy only loads when analytics are requested; the event listeners load with every worker
+if TYPE_CHECKING:
+    import numpy as np
+
+EXPORT_BATCH_SIZE = 5000
+
+STATUS_CODES = {status.value: code for code, status in enumerate(JobStatus)}
+FINAL_STATUSES = (JobStatus.INVOICED, JobStatus.CANCELLED)
+
+EXPORT_COLUMNS = (
+    JobEvent.id, JobEvent.job_id, Job.garage_id, JobEvent.event_type, JobEvent.from_status, JobEvent.to_status,
+    JobEvent.technician_id, JobEvent.reference_id, JobEvent.actor_id, JobEvent.created_at,
+)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _value(status):
+    return status.value if isinstance(status, enum.Enum) else status
+
+
+def _change(obj, field: str) -> Optional[tuple]:
+    """(old, new) if ``field`` changed in this flush."""
+    history = inspect(obj).attrs[field].history
+    if not history.has_changes():
+        return None
+    return (history.deleted[0] if history.deleted else None), (history.added[0] if history.added else None)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_events(session: Session, flush_context) -> None:
+    now = datetime.utcnow()
+    actor_id = session.info.get(ACTOR_KEY)
+    rows = []
+
+    def add(job_id, event_type, from_status=None, to_status=None, technician_id=None, reference_id=None):
+        rows.append({
+            "job_id": job_id, "event_type": event_type,
+            "from_status": _value(from_status), "to_status": _value(to_status),
+            "technician_id": technician_id, "reference_id": reference_id,
+            "actor_id": actor_id, "created_at": now,
+        })
+
+    for obj in session.new:
+        if isinstance(obj, Job):
+            add(obj.id, "job_created", to_status=obj.status or JobStatus.RECEIVED, technician_id=obj.technician_id)
+        elif isinstance(obj, SparePartRequest):
+            add(obj.job_id, "parts_requested", to_status=obj.status, reference_id=obj.id)
+        elif isinstance(obj, Invoice):
+            add(obj.job_id, "invoice_created", reference_id=obj.id)
+
+    for obj in session.dirty:
+        if isinstance(obj, Job):
+            status, technician = _change(obj, "status"), _change(obj, "technician_id")
+            if status or technician:
+                # Status fields are only set when the status changed
+                add(obj.id, "job_assigned" if technician else "job_status",
+                    from_status=status[0] if status else None, to_status=status[1] if status else None,
+                    technician_id=obj.technician_id)
+        elif isinstance(obj, SparePartRequest):
+            status = _change(obj, "status")
+            if status and status[1] is not None:
+                add(obj.job_id, f"parts_{_value(status[1])}", from_status=status[0], to_status=status[1],
+                    reference_id=obj.id)
+        elif isinstance(obj, Invoice):
+            paid = _change(obj, "paid")
+            if paid and paid[1]:
+                add(obj.job_id, "invoice_paid", reference_id=obj.id)
+
+    if rows:
+        session.connection().execute(insert(JobEvent), rows)
+
+
+@event.listens_for(Session, "before_flush")
+def _guard_append_only(session: Session, flush_context, instances) -> None:
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, JobEvent) and (obj in session.deleted or session.is_modified(obj)):
+            raise ValueError("job_events is append-only")
+
+
+def status_arrays(db: Session, conditions: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Job ids, timestamps (epoch seconds) and status codes of job status events, by job and time."""
+    import numpy as np
+
+    rows = db.execute(
+        select(JobEvent.job_id, JobEvent.created_at, JobEvent.to_status)
+        .join(Job, Job.id == JobEvent.job_id)
+        .where(*conditions)
+        .where(JobEvent.event_type.like("job\\_%", escape="\\"))
+        .where(JobEvent.to_status.isnot(None))
+        .order_by(JobEvent.job_id, JobEvent.created_at, JobEvent.id)
+    ).all()
+    n = len(rows)
+    jobs = np.fromiter((row[0] for row in rows), dtype=np.int64, count=n)
+    times = np.fromiter(((row[1] - _EPOCH).total_seconds() for row in rows), dtype=float, count=n)
+    codes = np.fromiter((STATUS_CODES[row[2]] for row in rows), dtype=np.int64, count=n)
+    return jobs, times, codes
+
+
+def time_in_status(jobs: np.ndarray, times: np.ndarray, codes: np.ndarray,
+                   now: datetime, include_current: bool = True) -> list[dict]:
+    """Per-status interval count and duration statistics (seconds)."""
+    import numpy as np
+
+    n = len(jobs)
+    if not n:
+        return []
+    last = np.ones(n, dtype=bool)
+    last[:-1] = jobs[1:] != jobs[:-1]
+    end = np.empty(n)
+    end[:-1] = times[1:]
+    end[last] = (now - _EPOCH).total_seconds()
+    durations = np.maximum(end - times, 0.0)
+
+    final = np.isin(codes, [STATUS_CODES[s.value] for s in FINAL_STATUSES])
+    current = last & ~final
+    keep = ~(last & final) & (include_current | ~current)
+
+    result = []
+    for status in JobStatus:
+        in_status = codes == STATUS_CODES[status.value]
+        d = durations[keep & in_status]
+        if not len(d):
+            continue
+        result.append({
+            "status": status.value,
+            "intervals": int(len(d)),
+            "jobs_now": int((current & in_status).sum()),
+            "total_seconds": round(float(d.sum()), 1),
+            "mean_seconds": round(float(d.mean()), 1),
+            "median_seconds": round(float(np.median(d)), 1),
+            "p90_seconds": round(float(np.percentile(d, 90)), 1),
+        })
+    return result
+
+
+def export_events(conditions: list, fmt: str = "ndjson", bind=engine) -> Iterator[bytes]:
+    """Stream matching events in id order, one batch per query, as NDJSON or CSV."""
+    names = [column.key for column in EXPORT_COLUMNS]
+    if fmt == "csv":
+        yield (",".join(names) + "\r\n").encode()
+    last_id = 0
+    with bind.connect() as conn:
+        while True:
+            rows = conn.execute(
+                select(*EXPORT_COLUMNS)
+                .join(Job, Job.id == JobEvent.job_id)
+                .where(*conditions)
+                .where(JobEvent.id > last_id)
+                .order_by(JobEvent.id)
+                .limit(EXPORT_BATCH_SIZE)
+            ).all()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            if fmt == "csv":
+                buf = io.StringIO()
+                csv.writer(buf).writerows(
+                    [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+                )
+                yield buf.getvalue().encode()
+            else:
+                yield b"".join(orjson.dumps(dict(zip(names, row))) + b"\n" for row in rows)
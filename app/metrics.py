@@ -0,0 +1,174 @@
+"""Prometheus metrics for the API process.
+
+Labels are limited to values from fixed sets so cardinality stays bounded:
+route templates (never raw paths), HTTP methods, status codes, scheduler job
+ids and notification channels.
+"""
+from __future__ import annotations
+
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy.pool import QueuePool
+
+UNMATCHED_ROUTE = "<unmatched>"
+KNOWN_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template, method and status code.",
+    ["route", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being handled.",
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the SQLAlchemy pool.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+SCHEDULER_JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds",
+    "Run time of background scheduler jobs.",
+    ["job"],
+)
+SCHEDULER_JOB_LAG = Histogram(
+    "scheduler_job_lag_seconds",
+    "Delay between a scheduler job's planned run time and its submission.",
+    ["job"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0),
+)
+NOTIFICATION_QUEUE_DEPTH = Gauge(
+    "notification_queue_depth",
+    "Reminders past their send time but not yet sent, as of the last reconciliation sweep.",
+)
+REMINDER_QUEUE_SIZE = Gauge(
+    "reminder_queue_size",
+    "Reminders held in the in-memory delay queue after the last reconciliation sweep.",
+)
+NOTIFICATIONS_SENT = Counter(
+    "notifications_sent_total",
+    "Notifications handed to a delivery channel.",
+    ["channel"],
+)
+STARTUP_DURATION = Gauge(
+    "app_startup_seconds",
+    "Time this worker spent in each startup phase.",
+    ["phase"],
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+class _RuntimeCollector:
+    """Gauges read at scrape time: DB pool occupancy and threadpool saturation."""
+
+    def __init__(self):
+        self.engine = None
+
+    def collect(self):
+        pool = self.engine.pool if self.engine is not None else None
+        if isinstance(pool, QueuePool):
+            yield GaugeMetricFamily("db_pool_size", "Configured SQLAlchemy pool size.", value=pool.size())
+            yield GaugeMetricFamily("db_pool_checked_out", "Connections currently checked out.", value=pool.checkedout())
+            yield GaugeMetricFamily(
+                "db_pool_overflow", "Connections open beyond pool_size (negative when below).", value=pool.overflow()
+            )
+
+        try:
+            from anyio.to_thread import current_default_thread_limiter
+
+            limiter = current_default_thread_limiter()
+        except Exception:
+            # Only available from inside the event loop (the /metrics handler is async).
+            return
+        yield GaugeMetricFamily(
+            "threadpool_capacity", "Worker threads available for sync endpoints and dependencies.",
+            value=limiter.total_tokens,
+        )
+        yield GaugeMetricFamily(
+            "threadpool_in_use", "Worker threads currently busy.", value=limiter.borrowed_tokens,
+        )
+        yield GaugeMetricFamily(
+            "threadpool_waiting", "Tasks queued waiting for a worker thread.", value=limiter.statistics().tasks_waiting,
+        )
+
+
+_runtime_collector = _RuntimeCollector()
+REGISTRY.register(_runtime_collector)
+
+
+def watch_engine(engine) -> None:
+    _runtime_collector.engine = engine
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            # The router stores the matched route on the shared scope.
+            route = scope.get("route")
+            method = scope["method"] if scope["method"] in KNOWN_METHODS else "OTHER"
+            HTTP_REQUEST_DURATION.labels(
+                route=getattr(route, "path", UNMATCHED_ROUTE), method=method, status=str(status_code)
+            ).observe(time.perf_counter() - start)
+
+
+def instrument_job(job_id: str):
+    """Decorator recording the run time of a scheduler job."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                SCHEDULER_JOB_DURATION.labels(job=job_id).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def observe_job_submission(event) -> None:
+    """APScheduler EVENT_JOB_SUBMITTED listener recording scheduling lag."""
+    now = datetime.now(timezone.utc)
+    for run_time in event.scheduled_run_times:
+        SCHEDULER_JOB_LAG.labels(job=event.job_id).observe(max(0.0, (now - run_time).total_seconds()))
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
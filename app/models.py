@@ -1,6 +1,6 @@
 from datetime import datetime, date
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Date, Text, Enum as SQLEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Date, Text, Index, Table, LargeBinary, Enum as SQLEnum
+from sqlalchemy.orm import relationship, validates
 import enum
 
 from app.database import Base
@@ -52,12 +52,25 @@ class Vehicle(Base):
     make = Column(String(64), nullable=True)
     model = Column(String(64), nullable=True)
     year = Column(Integer, nullable=True)
+    # Normalized lookup keys ("KAA 123B" and "kaa123b" -> "KAA123B"), see app/vehicle_identity.py
+    registration_key = Column(String(32), unique=True, index=True, nullable=True)
+    vin_key = Column(String(32), unique=True, index=True, nullable=True)
 
     service_orders = relationship("ServiceOrder", back_populates="vehicle")
     appointments = relationship("Appointment", back_populates="vehicle")
     service_history = relationship("ServiceHistory", back_populates="vehicle")
     jobs = relationship("Job", back_populates="vehicle")
 
+    @validates("registration_number", "vin")
+    def _set_lookup_key(self, field, value):
+        from app.vehicle_identity import normalize_identifier
+
+        if field == "registration_number":
+            self.registration_key = normalize_identifier(value)
+        else:
+            self.vin_key = normalize_identifier(value)
+        return value
+
 
 class Garage(Base):
     __tablename__ = "garages"
@@ -65,6 +78,16 @@ class Garage(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(128), unique=True, nullable=False)
     address = Column(String(256), default="")
+    # Appointment capacity: concurrent bookings are limited by bays and technicians.
+    # technician_capacity None means "count the garage's technician users".
+    service_bays = Column(Integer, nullable=False, default=2, server_default="2")
+    technician_capacity = Column(Integer, nullable=True)
+    # Bumped by every booking change; serializes bookings and invalidates in-memory indexes
+    booking_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Tenant routing (app/tenancy.py): the TENANT_SHARDS database holding the garage's rows,
+    # None for the default database; moving blocks writes while it moves between shards
+    shard = Column(String(64), nullable=True)
+    moving = Column(Boolean, default=False)
 
     orders = relationship("ServiceOrder", back_populates="garage")
     staff = relationship("User", back_populates="garage")
@@ -82,6 +105,7 @@ class User(Base):
     garage_id = Column(Integer, ForeignKey("garages.id"), nullable=True)
     full_name = Column(String(128), nullable=True)
     phone = Column(String(32), nullable=True)
+    skills = Column(String(128), nullable=True)  # technicians: comma-separated operations streams, empty means any
 
     garage = relationship("Garage", back_populates="staff")
     assigned_jobs = relationship("Job", foreign_keys="Job.technician_id", back_populates="technician")
@@ -107,6 +131,7 @@ class ServiceOrder(Base):
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_garage_status_stream", "garage_id", "status", "operations_stream", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False)
@@ -160,8 +185,25 @@ class JobTaskAction(Base):
     task_action = relationship("TaskAction", back_populates="job_task_actions")
 
 
+class JobEvent(Base):
+    """Append-only log of job, parts-request and invoice transitions, written by app/job_events.py."""
+    __tablename__ = "job_events"
+    __table_args__ = (Index("ix_job_events_job_created", "job_id", "created_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("jobs.id"), nullable=False)
+    event_type = Column(String(32), nullable=False)  # e.g. job_status, parts_issued, invoice_paid
+    from_status = Column(String(32), nullable=True)  # JobStatus/RequestStatus value
+    to_status = Column(String(32), nullable=True)
+    technician_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # job events
+    reference_id = Column(Integer, nullable=True)  # spare-part request or invoice id
+    actor_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
 class SparePartRequest(Base):
     __tablename__ = "spare_part_requests"
+    __table_args__ = (Index("ix_spare_part_requests_item_issued", "warehouse_item_id", "issued_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(Integer, ForeignKey("jobs.id"), nullable=False)
@@ -190,15 +232,41 @@ class WarehouseItem(Base):
     name = Column(String(128), nullable=False)
     part_number = Column(String(64), unique=True, index=True, nullable=True)
     description = Column(Text, default="")
+    # Chain-wide total of the item's stock locations, maintained by app/stock_locations.py
     quantity_in_stock = Column(Integer, default=0, nullable=False)
     unit_price = Column(Float, default=0.0, nullable=False)
-    reorder_level = Column(Integer, default=0)
+    reorder_level = Column(Integer, default=0)  # per garage
     is_active = Column(Boolean, default=True)
 
     requests = relationship("SparePartRequest", back_populates="warehouse_item")
     invoice_items = relationship("InvoiceItem", back_populates="warehouse_item")
 
 
+class StockLocation(Base):
+    """One garage's stock of one warehouse item."""
+    __tablename__ = "stock_locations"
+    __table_args__ = (UniqueConstraint("garage_id", "warehouse_item_id", name="uq_stock_locations_garage_item"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    garage_id = Column(Integer, ForeignKey("garages.id"), nullable=False)
+    warehouse_item_id = Column(Integer, ForeignKey("warehouse_items.id"), nullable=False, index=True)
+    quantity = Column(Integer, default=0, nullable=False)
+    # Chain-total reconciliation skips items whose stock changed recently (app/stock_locations.py)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+
+
+class StockTransfer(Base):
+    __tablename__ = "stock_transfers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    warehouse_item_id = Column(Integer, ForeignKey("warehouse_items.id"), nullable=False)
+    from_garage_id = Column(Integer, ForeignKey("garages.id"), nullable=False, index=True)
+    to_garage_id = Column(Integer, ForeignKey("garages.id"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    transferred_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Invoice(Base):
     __tablename__ = "invoices"
 
@@ -234,11 +302,14 @@ class InvoiceItem(Base):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (Index("ix_appointments_garage_scheduled", "garage_id", "scheduled_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False)
     service_type = Column(String(64), nullable=False)  # service, repair, wash, etc.
+    garage_id = Column(Integer, ForeignKey("garages.id"), nullable=True)
     scheduled_at = Column(DateTime, nullable=False)
+    ends_at = Column(DateTime, nullable=True)  # scheduled_at + service duration, see app/availability.py
     notes = Column(Text, default="")
     status = Column(String(32), default="scheduled", index=True)  # scheduled, completed, cancelled
     reminder_job_id = Column(String(128), nullable=True)
@@ -248,23 +319,116 @@ class Appointment(Base):
 
 class Reminder(Base):
     __tablename__ = "reminders"
+    __table_args__ = (Index("ix_reminders_garage_scheduled", "garage_id", "scheduled_for"),)
 
     id = Column(Integer, primary_key=True, index=True)
     appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=True)
+    garage_id = Column(Integer, ForeignKey("garages.id"), nullable=True)
     channel = Column(String(32), default="log")  # sms, email, push, log
+    offset_minutes = Column(Integer, nullable=True)  # minutes before the appointment, from its ReminderPolicy rule
     message = Column(Text, nullable=False)
     scheduled_for = Column(DateTime, nullable=False)
     sent_at = Column(DateTime, nullable=True)
 
 
+class ReminderPolicy(Base):
+    """One reminder rule: send on ``channel`` ``offset_minutes`` before the appointment.
+
+    Rules are grouped by scope. garage_id/service_type None mean "any"; the
+    most specific scope with rules wins (see app/reminder_policies.py).
+    """
+    __tablename__ = "reminder_policies"
+
+    id = Column(Integer, primary_key=True, index=True)
+    garage_id = Column(Integer, ForeignKey("garages.id"), nullable=True, index=True)
+    service_type = Column(String(64), nullable=True)
+    offset_minutes = Column(Integer, nullable=False)
+    channel = Column(String(32), nullable=False, default="log")
+
+
 class ServiceHistory(Base):
     __tablename__ = "service_history"
 
     id = Column(Integer, primary_key=True, index=True)
-    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False)
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False, index=True)
     date = Column(Date, default=date.today, nullable=False)
     mileage = Column(Integer, nullable=False)
     service_type = Column(String(64), nullable=False)
     notes = Column(Text, default="")
 
     vehicle = relationship("Vehicle", back_populates="service_history")
+
+
+class PartForecast(Base):
+    """Daily demand forecast and recommended reorder point per warehouse item, maintained by app/parts_forecast.py."""
+    __tablename__ = "part_forecasts"
+
+    warehouse_item_id = Column(Integer, ForeignKey("warehouse_items.id"), primary_key=True)
+    method = Column(String(16), nullable=False)  # ses, croston, none
+    daily_demand = Column(Float, nullable=False)  # forecast units/day
+    demand_std = Column(Float, nullable=False)  # one-step forecast error std, units/day
+    demand_days = Column(Integer, default=0, nullable=False)  # days with demand in the history window
+    recommended_reorder_point = Column(Integer, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ServiceForecast(Base):
+    """Next-service estimate per vehicle, maintained by app/service_forecast.py."""
+    __tablename__ = "service_forecasts"
+
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), primary_key=True)
+    due_by_mileage = Column(Integer, nullable=False)
+    due_by_date = Column(Date, nullable=True, index=True)
+    daily_mileage = Column(Float, nullable=False)  # estimated km/day
+    history_count = Column(Integer, default=0, nullable=False)
+    history_watermark = Column(Integer, default=0, nullable=False)  # highest ServiceHistory.id included
+    base_mileage = Column(Integer, nullable=True)  # vehicle's current_mileage when computed
+    reminded_due_date = Column(Date, nullable=True)  # due date the last reminder was created for
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class JobBoardVersion(Base):
+    """Per-garage version of the job board, bumped after job writes commit (app/job_board.py)."""
+    __tablename__ = "job_board_versions"
+
+    garage_id = Column(Integer, ForeignKey("garages.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    """Response to a POST sent with an Idempotency-Key header, stored by app/idempotency.py for replays."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    garage_id = Column(Integer, ForeignKey("garages.id"), nullable=True)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # sha256 of method, path, query and body
+    locked_until = Column(DateTime, nullable=True)  # while the first request runs
+    status_code = Column(Integer, nullable=True)  # null until the response is stored
+    content_type = Column(String(128), nullable=True)  # keys stored before response_headers
+    response_headers = Column(Text, nullable=True)  # JSON [name, value] pairs, e.g. Location and ETag
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+def _archive_table(live: Table, *indexed: str) -> Table:
+    """Cold copy of a live table for app/archive.py: same columns, no foreign keys, plus archived_at."""
+    name = f"archived_{live.name}"
+    return Table(
+        name,
+        Base.metadata,
+        *(Column(c.name, c.type.copy(), primary_key=c.primary_key, autoincrement=False, nullable=c.nullable)
+          for c in live.columns),
+        Column("archived_at", DateTime, nullable=False),
+        *(Index(f"ix_{name}_{column}", column) for column in indexed),
+    )
+
+
+archived_jobs = _archive_table(Job.__table__, "garage_id", "invoice_id")
+archived_invoices = _archive_table(Invoice.__table__, "job_id")
+archived_invoice_items = _archive_table(InvoiceItem.__table__, "invoice_id")
+archived_job_task_actions = _archive_table(JobTaskAction.__table__, "job_id")
+archived_spare_part_requests = _archive_table(SparePartRequest.__table__, "job_id")
+archived_job_events = _archive_table(JobEvent.__table__, "job_id")
+archived_reminders = _archive_table(Reminder.__table__, "garage_id")
@@ -1,6 +1,11 @@
 from datetime import datetime
 
+from app.metrics import NOTIFICATIONS_SENT
+
+KNOWN_CHANNELS = {"sms", "email", "push", "log"}
+
 
 def send_notification(channel: str, recipient: str, subject: str, message: str) -> None:
     # Placeholder: integrate with SMS/Email/Push here
+    NOTIFICATIONS_SENT.labels(channel=channel if channel in KNOWN_CHANNELS else "other").inc()
     print(f"[{datetime.utcnow().isoformat()}] [{channel}] To: {recipient} | {subject} -> {message}")
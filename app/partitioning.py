@@ -0,0 +1,169 @@
+"""Optional monthly range partitioning of ``jobs`` and ``invoices`` on PostgreSQL.
+
+With ``PARTITION_BY_MONTH=1`` on PostgreSQL, ``create_tables`` creates both
+tables ``PARTITION BY RANGE (created_at)``, one partition per month (named
+like ``jobs_y2026m10``) plus a default partition for rows outside them.
+``ensure_partitions`` creates the current month and the next
+``PARTITION_MONTHS_AHEAD`` months; it runs at startup and daily in the
+scheduler. A month is skipped, with a warning, if the default partition
+already holds rows for it.
+
+PostgreSQL requires the partition key in every unique constraint, so on
+partitioned tables:
+
+- the primary keys are (id, created_at) in the database; the ORM still
+  identifies rows by id;
+- ``invoice_number`` is indexed but not unique in the database;
+- foreign keys referencing jobs or invoices are not created, since they
+  cannot reference ``id`` alone.
+
+Partitioning applies when the tables are created; tables that already exist
+unpartitioned are left as they are. SQLite ignores all of this.
+
+List queries are bounded by ``created_at`` (``created_between``) so the
+planner can prune partitions; unfinished jobs and unpaid invoices are always
+listed.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Enum, inspect, or_, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.database import Base, engine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_BY_MONTH = os.getenv("PARTITION_BY_MONTH", "0").lower() in ("1", "true", "yes")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+LIST_WINDOW_DAYS = int(os.getenv("LIST_WINDOW_DAYS", "365"))
+
+PARTITIONED_TABLES = ("jobs", "invoices")
+
+
+def enabled(bind) -> bool:
+    return PARTITION_BY_MONTH and bind.dialect.name == "postgresql"
+
+
+def created_between(column, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    bind=engine, still_open=None) -> list:
+    """created_at bounds for a list query.
+
+    With partitioning enabled ``since`` defaults to LIST_WINDOW_DAYS ago, so
+    the planner can skip older months; rows matching ``still_open`` (e.g.
+    unfinished jobs) stay listed whatever their age. Without partitioning
+    there is no default bound.
+    """
+    conditions = []
+    if since is not None:
+        conditions.append(column >= since)
+    elif enabled(bind):
+        recent = column >= datetime.utcnow() - timedelta(days=LIST_WINDOW_DAYS)
+        conditions.append(recent if still_open is None else or_(recent, still_open))
+    if until:
+        conditions.append(column < until)
+    return conditions
+
+
+def _unpartitioned(ddl, target, bind, **kw) -> bool:
+    dialect = kw.get("dialect") or (bind.dialect if bind is not None else None)
+    return not (PARTITION_BY_MONTH and dialect is not None and dialect.name == "postgresql")
+
+
+def _configure() -> None:
+    """Skip the constraints partitioned tables can't have when creating the schema."""
+    for table in Base.metadata.tables.values():
+        for constraint in table.foreign_key_constraints:
+            if constraint.referred_table.name in PARTITIONED_TABLES:
+                constraint.ddl_if(callable_=_unpartitioned)
+        if table.name in PARTITIONED_TABLES:
+            for index in table.indexes:
+                if index.unique:
+                    index.ddl_if(callable_=_unpartitioned)
+
+
+def _table_ddl(table, dialect) -> str:
+    ddl = str(CreateTable(table).compile(dialect=dialect)).strip()
+    ddl = ddl.replace("PRIMARY KEY (id)", "PRIMARY KEY (id, created_at)")
+    return f"{ddl} PARTITION BY RANGE (created_at)"
+
+
+def create_tables(bind=engine) -> None:
+    """``create_all``, creating jobs and invoices partitioned when enabled."""
+    _configure()
+    if not enabled(bind):
+        Base.metadata.create_all(bind=bind)
+        return
+
+    partitioned = [Base.metadata.tables[name] for name in PARTITIONED_TABLES]
+    Base.metadata.create_all(bind=bind, tables=[t for t in Base.metadata.sorted_tables if t not in partitioned])
+    existing = set(inspect(bind).get_table_names())
+    with bind.begin() as conn:
+        for table in partitioned:
+            if table.name in existing:
+                if not is_partitioned(conn, table.name):
+                    logger.warning("%s already exists unpartitioned; leaving it as is", table.name)
+                continue
+            for column in table.columns:
+                if isinstance(column.type, Enum):
+                    column.type.create(conn, checkfirst=True)
+            conn.execute(text(_table_ddl(table, conn.dialect)))
+            for index in table.indexes:
+                if index.unique:
+                    columns = ", ".join(column.name for column in index.columns)
+                    conn.execute(text(f"CREATE INDEX {index.name} ON {table.name} ({columns})"))
+                else:
+                    conn.execute(CreateIndex(index))
+    ensure_partitions(bind=bind)
+
+
+def is_partitioned(conn, table_name: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :name"
+    ), {"name": table_name}).first() is not None
+
+
+def _months(first: date, count: int) -> list[tuple[date, date]]:
+    bounds = []
+    start = first.replace(day=1)
+    for _ in range(count):
+        end = (start + timedelta(days=32)).replace(day=1)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def ensure_partitions(months_ahead: int = PARTITION_MONTHS_AHEAD, bind=engine) -> list[str]:
+    """Create missing monthly partitions up to ``months_ahead``. Returns the partitions created."""
+    if not enabled(bind):
+        return []
+    created = []
+    with bind.begin() as conn:
+        for name in PARTITIONED_TABLES:
+            if not is_partitioned(conn, name):
+                continue
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name}_default PARTITION OF {name} DEFAULT"))
+            for start, end in _months(date.today(), months_ahead + 1):
+                partition = f"{name}_y{start.year}m{start.month:02d}"
+                if conn.execute(text("SELECT to_regclass(:name)"), {"name": partition}).scalar() is not None:
+                    continue
+                stranded = conn.execute(
+                    text(f"SELECT 1 FROM {name}_default WHERE created_at >= :start AND created_at < :end LIMIT 1"),
+                    {"start": start, "end": end},
+                ).first()
+                if stranded:
+                    logger.warning("Not creating %s: %s_default already holds rows for that month", partition, name)
+                    continue
+                conn.execute(text(
+                    f"CREATE TABLE {partition} PARTITION OF {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+                ))
+                created.append(partition)
+    if created:
+        logger.info("Created partitions %s", ", ".join(created))
+    return created
@@ -0,0 +1,198 @@
+"""Spare-parts demand forecasting.
+
+Builds a daily demand series per warehouse item from issued spare-part
+requests over the last ``PARTS_FORECAST_HISTORY_DAYS`` and fits every item
+in one vectorized NumPy pass (per chunk of ``PARTS_FORECAST_CHUNK_SIZE``
+items): the recursions step over days, each step updating all items at once.
+
+Each series starts at the item's first demand in the window, but at least
+``PARTS_MIN_HISTORY_DAYS`` before today, so an item first issued yesterday
+is averaged over that minimum history rather than taken at face value.
+Items whose average interval between demand days exceeds 1.32 days
+(intermittent demand, Syntetos-Boylan) use Croston's method with the SBA
+bias correction; the rest use simple exponential smoothing. Both use
+``PARTS_SMOOTHING_ALPHA``.
+
+The recommended reorder point covers ``PARTS_LEAD_TIME_DAYS`` of forecast
+demand plus safety stock for ``PARTS_SERVICE_LEVEL``, from the one-step
+forecast error. Results go to ``part_forecasts``; items without demand in the
+window get a zero forecast. ``reorder_level`` itself is left to the
+warehouse manager.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from itertools import chain
+from statistics import NormalDist
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Integer, cast, delete, func, insert, select
+
+from app.database import engine
+from app.models import PartForecast, RequestStatus, SparePartRequest, WarehouseItem
+
+# numpy is imported by the fitting functions, not when the scheduler imports this module
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PARTS_FORECAST_HISTORY_DAYS = int(os.getenv("PARTS_FORECAST_HISTORY_DAYS", "180"))
+PARTS_SMOOTHING_ALPHA = float(os.getenv("PARTS_SMOOTHING_ALPHA", "0.1"))
+PARTS_LEAD_TIME_DAYS = int(os.getenv("PARTS_LEAD_TIME_DAYS", "7"))
+PARTS_SERVICE_LEVEL = float(os.getenv("PARTS_SERVICE_LEVEL", "0.95"))
+PARTS_FORECAST_CHUNK_SIZE = int(os.getenv("PARTS_FORECAST_CHUNK_SIZE", "20000"))
+PARTS_FORECAST_HOUR = int(os.getenv("PARTS_FORECAST_HOUR", "2"))  # nightly run, scheduler local time
+PARTS_MIN_HISTORY_DAYS = int(os.getenv("PARTS_MIN_HISTORY_DAYS", "28"))
+INTERMITTENT_ADI = 1.32
+
+CONSUMED_STATUSES = (RequestStatus.ISSUED, RequestStatus.COMPLETED)
+
+
+def fit_demand(demand: np.ndarray, alpha: float = PARTS_SMOOTHING_ALPHA,
+               min_history: int = PARTS_MIN_HISTORY_DAYS) -> dict[str, np.ndarray]:
+    """Vectorized SES/Croston fit for an (items x days) demand matrix.
+
+    Returns per-item arrays: ``forecast`` (units/day), ``std`` (RMSE of the
+    one-step forecasts), ``croston`` (bool) and ``demand_days``.
+    """
+    import numpy as np
+
+    n, days = demand.shape
+    nonzero = demand > 0
+    demand_days = nonzero.sum(axis=1)
+    has_demand = demand_days > 0
+    first = np.where(has_demand, nonzero.argmax(axis=1), days)
+    # Series start: the first demand, or min_history days back if that is earlier
+    origin = np.where(has_demand, np.minimum(first, max(days - min_history, 0)), days)
+    adi = np.where(has_demand, (days - origin) / np.maximum(demand_days, 1), np.inf)
+    croston = has_demand & (adi > INTERMITTENT_ADI)
+
+    # State: the SES level starts at the series start, Croston's size at the first demand
+    level = np.zeros(n)        # SES level
+    size = np.zeros(n)         # Croston demand size
+    interval = np.where(has_demand, adi, 1.0)  # Croston inter-demand interval
+    since = np.ones(n)         # days since the last demand
+    sse = np.zeros(n)
+    errors = np.zeros(n)
+    sba = 1 - alpha / 2
+
+    for t in range(days):
+        y = demand[:, t]
+        started = origin < t     # one-step forecasts exist from the day after the series start
+        starting = origin == t
+        first_demand = first == t
+
+        prediction = np.where(croston, sba * size / interval, level)
+        error = y - prediction
+        sse += np.where(started, error * error, 0.0)
+        errors += started
+
+        # SES
+        level = np.where(starting, y, np.where(started, alpha * y + (1 - alpha) * level, level))
+        # Croston: update size/interval only on demand days after the first
+        hit = (first < t) & (y > 0)
+        size = np.where(first_demand, y, np.where(hit, alpha * y + (1 - alpha) * size, size))
+        interval = np.where(hit, alpha * since + (1 - alpha) * interval, interval)
+        since = np.where(first_demand | hit, 1, since + 1)
+
+    forecast = np.where(croston, sba * size / interval, level)
+    forecast = np.where(has_demand, forecast, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.where(errors > 0, np.sqrt(sse / np.maximum(errors, 1)), 0.0)
+    return {"forecast": forecast, "std": std, "croston": croston, "demand_days": demand_days}
+
+
+def reorder_points(forecast: np.ndarray, std: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    z = NormalDist().inv_cdf(PARTS_SERVICE_LEVEL)
+    point = forecast * PARTS_LEAD_TIME_DAYS + z * std * math.sqrt(PARTS_LEAD_TIME_DAYS)
+    return np.ceil(np.round(point, 6)).astype(np.int64)
+
+
+def _day_offset(column, start: datetime, dialect: str):
+    """Whole days from ``start`` to ``column``, computed in the database."""
+    if dialect == "sqlite":
+        return cast(func.julianday(column) - func.julianday(start), Integer)
+    return cast(func.floor(func.extract("epoch", column - start) / 86400), Integer)
+
+
+def _load_demand(conn, start: datetime) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Item ids, day offsets and quantities of issued requests since ``start``.
+
+    Rows are aggregated into daily buckets with NumPy rather than GROUP BY,
+    which is several times faster than sorting by item and day in SQLite.
+    """
+    import numpy as np
+
+    rows = conn.execute(
+        select(
+            SparePartRequest.warehouse_item_id,
+            _day_offset(SparePartRequest.issued_at, start, conn.dialect.name),
+            SparePartRequest.quantity,
+        )
+        .where(SparePartRequest.status.in_(CONSUMED_STATUSES))
+        .where(SparePartRequest.issued_at >= start)
+    ).all()
+    flat = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=3 * len(rows)).reshape(-1, 3)
+    return flat[:, 0], flat[:, 1], flat[:, 2].astype(float)
+
+
+def run_parts_forecast(chunk_size: int = PARTS_FORECAST_CHUNK_SIZE, bind=engine) -> dict:
+    """Refit every item's demand forecast and store it with its reorder point."""
+    import numpy as np
+
+    now = datetime.utcnow()
+    days = PARTS_FORECAST_HISTORY_DAYS
+    start = datetime.combine(now.date() - timedelta(days=days - 1), datetime.min.time())  # window ends today
+
+    with bind.connect() as conn:
+        all_items = np.fromiter(conn.execute(select(WarehouseItem.id).order_by(WarehouseItem.id)).scalars(), dtype=np.int64)
+        item_col, day_col, qty_col = _load_demand(conn, start)
+
+    # Row of each request's item in all_items, sorted so every chunk is one slice
+    position = np.searchsorted(all_items, item_col)
+    keep = (day_col >= 0) & (day_col < days) & (position < len(all_items))
+    keep[keep] &= all_items[position[keep]] == item_col[keep]
+    order = np.argsort(position[keep], kind="stable")
+    position, day_col, qty_col = position[keep][order], day_col[keep][order], qty_col[keep][order]
+
+    forecast_items = 0
+    for chunk_start in range(0, len(all_items), chunk_size):
+        chunk = all_items[chunk_start:chunk_start + chunk_size]
+        lo, hi = np.searchsorted(position, [chunk_start, chunk_start + len(chunk)])
+        demand = np.zeros((len(chunk), days))
+        np.add.at(demand, (position[lo:hi] - chunk_start, day_col[lo:hi]), qty_col[lo:hi])
+
+        fit = fit_demand(demand)
+        points = reorder_points(fit["forecast"], fit["std"])
+        has_demand = fit["demand_days"] > 0
+        forecast_items += int(has_demand.sum())
+        method = np.where(has_demand, np.where(fit["croston"], "croston", "ses"), "none")
+        records = [
+            {
+                "warehouse_item_id": item_id,
+                "method": m,
+                "daily_demand": forecast,
+                "demand_std": std,
+                "demand_days": demand_days,
+                "recommended_reorder_point": point,
+                "computed_at": now,
+            }
+            for item_id, m, forecast, std, demand_days, point in zip(
+                chunk.tolist(), method.tolist(), fit["forecast"].round(4).tolist(), fit["std"].round(4).tolist(),
+                fit["demand_days"].tolist(), points.tolist(),
+            )
+        ]
+        with bind.begin() as conn:
+            conn.execute(
+                delete(PartForecast).where(PartForecast.warehouse_item_id.between(int(chunk[0]), int(chunk[-1])))
+            )
+            conn.execute(insert(PartForecast), records)
+
+    logger.info("Parts forecast: %d items, %d with demand", len(all_items), forecast_items)
+    return {"items": int(len(all_items)), "with_demand": forecast_items}
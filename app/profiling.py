@@ -0,0 +1,192 @@
+"""On-demand statistical profiling of single requests.
+
+An admin sends a request with ``X-Profile: 1`` (plus their usual bearer
+token). While that request runs, a sampler thread snapshots the stacks of
+the threads working on it every ``PROFILE_INTERVAL_MS``: the event loop
+thread while the request's task is current, and threadpool workers running
+a call that carries the request's context (sync endpoints and
+dependencies). Samples are written in folded-stack format (one
+``frame;frame;frame count`` line per stack, readable by flamegraph.pl and
+speedscope) under ``PROFILE_DIR``, keeping at most ``PROFILE_MAX_FILES``.
+
+Requests without the header only pay for a scan of the header list.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_HEADER = b"x-profile"
+PROFILE_SUFFIX = ".folded"
+
+_active: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar("profile_session", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    marker = f"{os.sep}site-packages{os.sep}"
+    if marker in filename:
+        filename = filename.split(marker, 1)[1]
+    else:
+        filename = os.path.relpath(filename) if os.path.isabs(filename) else filename
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+class ProfileSession:
+    def __init__(self, method: str, path: str, loop_thread_id: int, task):
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
+        self.profile_id = f"{stamp}-{method.lower()}-{slug}"
+        self.loop_thread_id = loop_thread_id
+        self.task = task
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.profile_id}", daemon=True)
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self.started
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        interval = PROFILE_INTERVAL_MS / 1000
+        own_id = threading.get_ident()
+        while not self._stop.wait(interval):
+            self.sample_count += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id == self.loop_thread_id:
+                    if asyncio.current_task(self.task.get_loop()) is self.task:
+                        self._record("[event-loop]", frame)
+                elif self._runs_in_request_context(frame):
+                    self._record("[worker]", frame)
+
+    def _runs_in_request_context(self, frame) -> bool:
+        # anyio worker threads call context.run(func) from WorkerThread.run with the
+        # caller's copied context in a local named "context".
+        while frame is not None:
+            if frame.f_code.co_name == "run" and "anyio" in frame.f_code.co_filename:
+                context = frame.f_locals.get("context")
+                return isinstance(context, contextvars.Context) and context.get(_active) is self
+            frame = frame.f_back
+        return False
+
+    def _record(self, root: str, frame) -> None:
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        stack.append(root)
+        self.samples[";".join(reversed(stack))] += 1
+
+    def save(self) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, self.profile_id + PROFILE_SUFFIX)
+        with open(path, "w") as fh:
+            fh.write(f"# duration_ms={self.duration * 1000:.1f} ticks={self.sample_count} "
+                     f"interval_ms={PROFILE_INTERVAL_MS}\n")
+            for stack, count in self.samples.most_common():
+                fh.write(f"{stack} {count}\n")
+        _enforce_retention()
+        return path
+
+
+def _enforce_retention() -> None:
+    names = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(PROFILE_SUFFIX))
+    for name in names[:max(0, len(names) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles() -> list[str]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted((name[:-len(PROFILE_SUFFIX)] for name in os.listdir(PROFILE_DIR)
+                   if name.endswith(PROFILE_SUFFIX)), reverse=True)
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    if not re.fullmatch(r"[A-Za-z0-9_\-]+", profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + PROFILE_SUFFIX)
+    return path if os.path.exists(path) else None
+
+
+def _bearer_token(headers: list) -> Optional[str]:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token
+    return None
+
+
+def _is_admin(token: str) -> bool:
+    """Same check require_role("admin") applies, without a FastAPI request."""
+    from app.auth import get_current_user
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return get_current_user(db=db, token=token).role == "admin"
+    except HTTPException:
+        return False
+    finally:
+        db.close()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(
+            name == PROFILE_HEADER and value not in (b"", b"0") for name, value in scope["headers"]
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        token = _bearer_token(scope["headers"])
+        if token is None or not await run_in_threadpool(_is_admin, token):
+            # Not allowed to profile: serve the request normally
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(scope["method"], scope["path"], threading.get_ident(), asyncio.current_task())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", session.profile_id.encode())]
+            await send(message)
+
+        reset = _active.set(session)
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session.stop()
+            _active.reset(reset)
+            await run_in_threadpool(session.save)
@@ -0,0 +1,100 @@
+"""Reminder policies and per-appointment reminder sync.
+
+A policy is the set of ``ReminderPolicy`` rules sharing a scope. For an
+appointment the most specific scope with rules applies:
+(garage, service type), then (garage, any), then (any, service type), then
+(any, any); with no rules at all, ``DEFAULT_RULES`` (one log reminder 24h
+before) applies.
+
+``sync_reminders`` brings an appointment's unsent reminders in line with its
+policy and time: one SELECT for the existing rows, then at most one bulk
+INSERT, one bulk UPDATE and one bulk DELETE. Sent reminders are never
+touched.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.models import Appointment, Reminder, ReminderPolicy
+
+# (offset_minutes, channel)
+DEFAULT_RULES = [(24 * 60, "log")]
+
+
+def rules_for(db: Session, garage_id: Optional[int], service_type: str) -> list[tuple[int, str]]:
+    rows = (
+        db.query(ReminderPolicy)
+        .filter(or_(ReminderPolicy.garage_id == garage_id, ReminderPolicy.garage_id.is_(None)))
+        .filter(or_(ReminderPolicy.service_type == service_type, ReminderPolicy.service_type.is_(None)))
+        .all()
+    )
+    scopes: dict[tuple, list[tuple[int, str]]] = {}
+    for row in rows:
+        scopes.setdefault((row.garage_id, row.service_type), []).append((row.offset_minutes, row.channel))
+    for scope in ((garage_id, service_type), (garage_id, None), (None, service_type), (None, None)):
+        if scope in scopes:
+            return sorted(set(scopes[scope]), reverse=True)
+    return DEFAULT_RULES
+
+
+def reminder_message(appt: Appointment) -> str:
+    return f"Reminder: {appt.service_type} on {appt.scheduled_at.isoformat()}"
+
+
+def sync_reminders(db: Session, appt: Appointment) -> tuple[list[tuple[int, datetime]], list[int]]:
+    """Create, move or delete the appointment's unsent reminders (flushed, not committed).
+
+    Returns (reminder id, due time) pairs to (re)queue and the ids removed,
+    for the delivery queue once the transaction commits. Reminders that would
+    already be in the past are not created.
+    """
+    existing = (
+        db.query(Reminder.id, Reminder.offset_minutes, Reminder.channel)
+        .filter(Reminder.appointment_id == appt.id)
+        .filter(Reminder.sent_at.is_(None))
+        .all()
+    )
+
+    wanted: dict[tuple[int, str], datetime] = {}
+    if appt.status == "scheduled":
+        now = datetime.utcnow()
+        for offset, channel in rules_for(db, appt.garage_id, appt.service_type):
+            when = appt.scheduled_at - timedelta(minutes=offset)
+            if when > now:
+                wanted[(offset, channel)] = when
+
+    message = reminder_message(appt)
+    updates, removed = [], []
+    for reminder_id, offset, channel in existing:
+        when = wanted.pop((offset, channel), None)
+        if when is None:
+            removed.append(reminder_id)
+        else:
+            updates.append({"id": reminder_id, "scheduled_for": when, "message": message, "garage_id": appt.garage_id})
+
+    created = [
+        Reminder(
+            appointment_id=appt.id,
+            garage_id=appt.garage_id,
+            channel=channel,
+            offset_minutes=offset,
+            message=message,
+            scheduled_for=when,
+        )
+        for (offset, channel), when in wanted.items()
+    ]
+
+    if removed:
+        db.query(Reminder).filter(Reminder.id.in_(removed)).delete(synchronize_session=False)
+    if updates:
+        db.execute(update(Reminder), updates)
+    if created:
+        db.add_all(created)
+    db.flush()
+
+    moved = [(row["id"], row["scheduled_for"]) for row in updates]
+    return [*((r.id, r.scheduled_for) for r in created), *moved], removed
@@ -0,0 +1,157 @@
+"""In-memory delay queue for reminder delivery.
+
+Instead of polling the reminders table, the scheduler process keeps the
+reminders due within ``REMINDER_LOOKAHEAD_MINUTES`` in a heap and a
+dispatcher thread sleeps until the earliest one is due. Appointment
+endpoints push new and moved reminders into the queue as they commit, so
+delivery happens on time instead of up to a poll interval late.
+
+The database stays the source of truth: delivery re-checks each reminder
+(unsent, still due), and a reconciliation sweep every
+``REMINDER_SWEEP_SECONDS`` reloads the look-ahead window. The sweep picks
+up reminders written by other processes (API workers that don't run the
+scheduler) and anything the queue missed. Because the window is longer than
+the sweep interval, such reminders are still delivered on time unless they
+were created less than one sweep interval before they are due.
+
+In processes that don't run the dispatcher, ``schedule`` and ``discard`` do
+nothing.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+from app.models import Reminder
+from app.tenancy import tenant_router
+
+logger = logging.getLogger(__name__)
+
+REMINDER_LOOKAHEAD = timedelta(minutes=int(os.getenv("REMINDER_LOOKAHEAD_MINUTES", "60")))
+REMINDER_SWEEP_SECONDS = int(os.getenv("REMINDER_SWEEP_SECONDS", "300"))
+
+
+class ReminderQueue:
+    def __init__(self):
+        self._heap: list[tuple[datetime, int]] = []
+        self._due: dict[int, datetime] = {}  # reminder id -> current due time; heap entries not matching are stale
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._deliver: Optional[Callable[[list[int]], None]] = None
+        self.running = False
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def start(self, deliver: Callable[[list[int]], None]) -> None:
+        """Load the look-ahead window and start the dispatcher thread."""
+        with self._cond:
+            if self.running:
+                return
+            self._deliver = deliver
+            self.running = True
+        self.reconcile()
+        self._thread = threading.Thread(target=self._run, name="reminder-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self.running = False
+            self._heap.clear()
+            self._due.clear()
+            self._cond.notify_all()
+
+    def schedule(self, reminder_id: int, when: datetime) -> None:
+        """Add or move a reminder; ones beyond the look-ahead window are left to the sweep."""
+        with self._cond:
+            if not self.running:
+                return
+            if when > datetime.utcnow() + REMINDER_LOOKAHEAD:
+                self._due.pop(reminder_id, None)
+                return
+            self._due[reminder_id] = when
+            heapq.heappush(self._heap, (when, reminder_id))
+            if self._heap[0] == (when, reminder_id):
+                # New earliest deadline: wake the dispatcher to shorten its sleep
+                self._cond.notify()
+
+    def schedule_many(self, reminders: Iterable[tuple[int, datetime]]) -> None:
+        for reminder_id, when in reminders:
+            self.schedule(reminder_id, when)
+
+    def discard(self, *reminder_ids: int) -> None:
+        with self._cond:
+            for reminder_id in reminder_ids:
+                self._due.pop(reminder_id, None)
+
+    def reconcile(self) -> int:
+        """Replace the queue contents with the unsent reminders due within the window."""
+        horizon = datetime.utcnow() + REMINDER_LOOKAHEAD
+        rows = []
+        for shard in tenant_router.shards():
+            db = shard.session()
+            try:
+                rows += (
+                    db.query(Reminder.id, Reminder.scheduled_for)
+                    .filter(Reminder.sent_at.is_(None))
+                    .filter(Reminder.scheduled_for <= horizon)
+                    .all()
+                )
+            finally:
+                db.close()
+
+        with self._cond:
+            if not self.running:
+                return 0
+            self._due = {reminder_id: when for reminder_id, when in rows}
+            self._heap = [(when, reminder_id) for reminder_id, when in rows]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        if self._thread is not None and not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="reminder-dispatcher", daemon=True)
+            self._thread.start()
+        return len(rows)
+
+    def _pop_due(self) -> Optional[list[int]]:
+        """Block until reminders are due; None once stopped."""
+        with self._cond:
+            while self.running:
+                # Drop heap entries superseded by a later schedule() or discard()
+                while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+
+                now = datetime.utcnow()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    when, reminder_id = heapq.heappop(self._heap)
+                    if self._due.get(reminder_id) == when:
+                        del self._due[reminder_id]
+                        due.append(reminder_id)
+                if due:
+                    return due
+            return None
+
+    def _run(self) -> None:
+        while True:
+            due = self._pop_due()
+            if due is None:
+                return
+            try:
+                self._deliver(due)
+            except Exception:
+                # The sweep re-queues anything left unsent
+                logger.exception("Reminder delivery failed for %d reminder(s)", len(due))
+
+
+reminder_queue = ReminderQueue()
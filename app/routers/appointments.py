@@ -1,113 +1,219 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date, datetime, time, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
 from app import models
 from app.auth import get_current_user
 from app.models import User
-from app.schemas import AppointmentCreate, AppointmentOut, AppointmentUpdate, NextServiceRecommendation
+from app.reminder_policies import sync_reminders
+from app.reminder_queue import reminder_queue
+from app.tenancy import tenant_router
+from app.vehicle_identity import find_vehicle, get_or_create_vehicle
+from app.schemas import AppointmentCreate, AppointmentOut, AppointmentUpdate, AvailabilityOut, NextServiceRecommendation
+from app.availability import (
+    MAX_AVAILABILITY_DAYS, available_slots, booking_index, bump_booking_version, naive_utc, reserve, service_duration,
+)
 
 router = APIRouter()
 
 
+def _check_garage(user: User, garage_id: Optional[int]) -> None:
+    """Staff may only use their own garage's appointments; admins and users without a garage any."""
+    if user.role != "admin" and user.garage_id and garage_id != user.garage_id:
+        raise HTTPException(status_code=403, detail="Not your garage")
+
+
+def _check_shard(user: User, garage_id: int, detail: str) -> None:
+    """The session is on the user's garage's shard; a garage on another shard never reads it."""
+    if tenant_router.for_garage(garage_id) is not tenant_router.for_garage(user.garage_id):
+        raise HTTPException(status_code=400, detail=detail)
+
+
+def _get_appointment(db: Session, appointment_id: int, user: User) -> models.Appointment:
+    q = db.query(models.Appointment).filter(models.Appointment.id == appointment_id)
+    if user.role != "admin" and user.garage_id:
+        q = q.filter(models.Appointment.garage_id == user.garage_id)
+    appt = q.first()
+    if appt is None:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    return appt
+
+
 @router.post("/", response_model=AppointmentOut)
 def create_appointment(payload: AppointmentCreate, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    vehicle = db.query(models.Vehicle).filter(models.Vehicle.vin == payload.vehicle_vin).first()
-    if vehicle is None:
-        vehicle = models.Vehicle(
-            vin=payload.vehicle_vin,
-            owner_name="Unknown",
-            owner_contact="owner@example.com",
-            current_mileage=0,
-        )
-        db.add(vehicle)
-        db.commit()
-        db.refresh(vehicle)
+    garage_id = payload.garage_id or user.garage_id
+    if payload.garage_id is not None:
+        _check_garage(user, garage_id)
+        if db.query(models.Garage.id).filter(models.Garage.id == garage_id).first() is None:
+            raise HTTPException(status_code=404, detail="Garage not found")
+        _check_shard(user, garage_id, "Appointments can only be booked at garages on your database shard")
+
+    # Auto-create vehicle with minimal info if the VIN is new
+    vehicle = get_or_create_vehicle(
+        db,
+        vin=payload.vehicle_vin,
+        owner_name="Unknown",
+        owner_contact="owner@example.com",
+        current_mileage=0,
+    )
+
+    scheduled_at = naive_utc(payload.scheduled_at)
+    ends_at = scheduled_at + service_duration(payload.service_type)
+    # Holds the garage's booking lock until commit, 409 if the slot is full
+    booking_version = reserve(db, garage_id, scheduled_at, ends_at) if garage_id else None
 
     appt = models.Appointment(
         vehicle_id=vehicle.id,
+        garage_id=garage_id,
         service_type=payload.service_type,
-        scheduled_at=payload.scheduled_at,
+        scheduled_at=scheduled_at,
+        ends_at=ends_at,
         notes=payload.notes or "",
     )
     db.add(appt)
-    db.commit()
-    db.refresh(appt)
+    db.flush()
 
-    # Create reminder 24h before
-    reminder_time = payload.scheduled_at - timedelta(hours=24)
-    reminder = models.Reminder(
-        appointment_id=appt.id,
-        channel="log",
-        message=f"Reminder: {payload.service_type} on {payload.scheduled_at.isoformat()}",
-        scheduled_for=reminder_time,
-    )
-    db.add(reminder)
+    # Reminders per the garage/service-type policy
+    queued, _ = sync_reminders(db, appt)
     db.commit()
+    db.refresh(appt)
 
+    if booking_version is not None:
+        booking_index.apply(garage_id, booking_version, appt)
+    reminder_queue.schedule_many(queued)
     return appt
 
 
+@router.get("/availability", response_model=AvailabilityOut)
+def get_availability(
+    garage_id: int,
+    service_type: str,
+    from_: datetime = Query(..., alias="from"),
+    to: datetime = Query(...),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Free slots at a garage for a service type, e.g. for a month calendar view"""
+    from_, to = naive_utc(from_), naive_utc(to)
+    if to <= from_:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    if to - from_ > timedelta(days=MAX_AVAILABILITY_DAYS):
+        raise HTTPException(status_code=400, detail=f"Window is limited to {MAX_AVAILABILITY_DAYS} days")
+    garage = db.query(models.Garage).filter(models.Garage.id == garage_id).first()
+    if garage is None:
+        raise HTTPException(status_code=404, detail="Garage not found")
+    _check_shard(user, garage_id, "Availability is only served for garages on your database shard")
+    return available_slots(db, garage, from_, to, service_type)
+
+
 @router.get("/", response_model=List[AppointmentOut])
-def list_appointments(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    q = db.query(models.Appointment).order_by(models.Appointment.scheduled_at.desc())
-    # Note: Appointments are not linked to garage in model; can extend if needed
+def list_appointments(
+    garage_id: Optional[int] = None,
+    status_filter: Optional[str] = None,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    view: Optional[str] = Query(None, pattern="^(day|week)$"),
+    day: Optional[date] = Query(None, alias="date"),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """List a garage's appointments (the user's own by default).
+
+    Narrow with status_filter, a from/to range, or a calendar window:
+    view=day|week with date=YYYY-MM-DD (weeks start on Monday). Windowed
+    queries are ordered by time ascending, others newest first.
+    """
+    from_, to = naive_utc(from_), naive_utc(to)
+    if garage_id is None:
+        garage_id = user.garage_id
+    else:
+        _check_garage(user, garage_id)
+
+    if view is not None:
+        anchor = day or datetime.utcnow().date()
+        if view == "week":
+            anchor -= timedelta(days=anchor.weekday())
+        from_ = datetime.combine(anchor, time())
+        to = from_ + timedelta(days=7 if view == "week" else 1)
+
+    q = db.query(models.Appointment)
+    if garage_id is not None:
+        q = q.filter(models.Appointment.garage_id == garage_id)
+    if status_filter:
+        q = q.filter(models.Appointment.status == status_filter)
+    if from_ is not None:
+        q = q.filter(models.Appointment.scheduled_at >= from_)
+    if to is not None:
+        q = q.filter(models.Appointment.scheduled_at < to)
+
+    if from_ is not None or to is not None:
+        q = q.order_by(models.Appointment.scheduled_at.asc())
+    else:
+        q = q.order_by(models.Appointment.scheduled_at.desc())
     return q.all()
 
 
 @router.get("/{appointment_id}", response_model=AppointmentOut)
-def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
-    appt = db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
-    if appt is None:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-    return appt
+def get_appointment(appointment_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    return _get_appointment(db, appointment_id, user)
 
 
 @router.patch("/{appointment_id}", response_model=AppointmentOut)
-def update_appointment(appointment_id: int, payload: AppointmentUpdate, db: Session = Depends(get_db)):
-    appt = db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
-    if appt is None:
-        raise HTTPException(status_code=404, detail="Appointment not found")
+def update_appointment(
+    appointment_id: int, payload: AppointmentUpdate, db: Session = Depends(get_db), user: User = Depends(get_current_user)
+):
+    appt = _get_appointment(db, appointment_id, user)
 
     if payload.service_type is not None:
         appt.service_type = payload.service_type
+    if payload.status is not None:
+        appt.status = payload.status
     if payload.scheduled_at is not None:
-        appt.scheduled_at = payload.scheduled_at
-        # Update or add reminder 24h before new time
-        reminder = (
-            db.query(models.Reminder)
-            .filter(models.Reminder.appointment_id == appointment_id)
-            .first()
-        )
-        if reminder:
-            reminder.scheduled_for = payload.scheduled_at - timedelta(hours=24)
-            reminder.message = f"Reminder: {appt.service_type} on {payload.scheduled_at.isoformat()}"
+        appt.scheduled_at = naive_utc(payload.scheduled_at)
+    if payload.service_type is not None or payload.scheduled_at is not None:
+        appt.ends_at = appt.scheduled_at + service_duration(appt.service_type)
+
+    booking_version = None
+    if appt.garage_id and (payload.service_type is not None or payload.scheduled_at is not None or payload.status is not None):
+        if appt.status == "scheduled":
+            booking_version = reserve(db, appt.garage_id, appt.scheduled_at, appt.ends_at, exclude_id=appt.id)
         else:
-            reminder = models.Reminder(
-                appointment_id=appointment_id,
-                channel="log",
-                message=f"Reminder: {appt.service_type} on {payload.scheduled_at.isoformat()}",
-                scheduled_for=payload.scheduled_at - timedelta(hours=24),
-            )
-            db.add(reminder)
+            booking_version = bump_booking_version(db, appt.garage_id)
+
+    queued, removed = [], []
+    if payload.service_type is not None or payload.scheduled_at is not None or payload.status is not None:
+        # Move, regenerate or (when no longer scheduled) drop the unsent reminders
+        queued, removed = sync_reminders(db, appt)
     if payload.notes is not None:
         appt.notes = payload.notes
-    if payload.status is not None:
-        appt.status = payload.status
 
     db.commit()
     db.refresh(appt)
+
+    if booking_version is not None:
+        booking_index.apply(appt.garage_id, booking_version, appt)
+    reminder_queue.discard(*removed)
+    reminder_queue.schedule_many(queued)
     return appt
 
 
 @router.get("/next-service/recommendation/{vehicle_vin}", response_model=NextServiceRecommendation)
-def next_service_recommendation(vehicle_vin: str, db: Session = Depends(get_db)):
-    vehicle = db.query(models.Vehicle).filter(models.Vehicle.vin == vehicle_vin).first()
+def next_service_recommendation(vehicle_vin: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    vehicle = find_vehicle(db, vin=vehicle_vin)
     if vehicle is None:
         raise HTTPException(status_code=404, detail="Vehicle not found")
 
+    # Prefer the batch forecast (app/service_forecast.py) when one has been computed
+    forecast = db.get(models.ServiceForecast, vehicle.id)
+    if forecast is not None:
+        return NextServiceRecommendation(
+            due_by_mileage=forecast.due_by_mileage,
+            due_by_date=forecast.due_by_date,
+            reason=f"Forecast from {forecast.history_count} service record(s) at ~{forecast.daily_mileage:.0f} km/day",
+        )
+
     # Basic heuristic: recommend every 10,000 km or 12 months since last service
     last_service = (
         db.query(models.ServiceHistory)
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from app.database import get_db
-from app.models import User, Garage
+from app.database import get_db, get_directory_db
+from app.models import User, Garage, Job, OperationsStream
 from app.auth import get_password_hash, verify_password, create_access_token, get_current_user
+from app.assignment import OPEN_STATUSES, assignment_engine, format_skills, parse_skills
+from app.tenancy import mirror
 
 router = APIRouter()
 
@@ -26,10 +29,15 @@ class CreateStaffProfilePayload(BaseModel):
     garage_id: int
     full_name: str | None = None
     phone: str | None = None
+    skills: list[OperationsStream] | None = None  # technicians; empty means any operations stream
+
+
+class SkillsPayload(BaseModel):
+    skills: list[OperationsStream]
 
 
 @router.post("/signup")
-def signup(payload: SignupPayload, db: Session = Depends(get_db)):
+def signup(payload: SignupPayload, db: Session = Depends(get_directory_db)):
     """Public signup - allows staff roles only"""
     # Validate allowed staff roles
     allowed_staff_roles = ("technician", "site_manager", "workshop_manager", "warehouse_manager", "billing")
@@ -44,6 +52,7 @@ def signup(payload: SignupPayload, db: Session = Depends(get_db)):
     
     # Get or create Main garage if garage_id not provided
     garage_id = payload.garage_id
+    new_garage = False
     if not garage_id:
         main_garage = db.query(Garage).filter(Garage.name == "Main").first()
         if main_garage:
@@ -54,6 +63,7 @@ def signup(payload: SignupPayload, db: Session = Depends(get_db)):
             db.add(main_garage)
             db.flush()
             garage_id = main_garage.id
+            new_garage = True
     
     # Validate garage exists
     garage = db.query(Garage).filter(Garage.id == garage_id).first()
@@ -71,13 +81,16 @@ def signup(payload: SignupPayload, db: Session = Depends(get_db)):
     db.add(user)
     db.commit()
     db.refresh(user)
+    if new_garage:
+        mirror(Garage, [garage_id])
+    mirror(User, [user.id])
     return {"id": user.id, "email": user.email, "role": user.role, "garage_id": user.garage_id, "full_name": user.full_name, "phone": user.phone}
 
 
 @router.post("/create-staff-profile")
 def create_staff_profile(
     payload: CreateStaffProfilePayload, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_directory_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create staff profiles - only accessible by admin/operation_manager"""
@@ -110,26 +123,32 @@ def create_staff_profile(
         garage_id=payload.garage_id,
         full_name=payload.full_name,
         phone=payload.phone,
+        skills=format_skills(payload.skills) if payload.skills else None,
     )
     db.add(user)
     db.commit()
     db.refresh(user)
+    mirror(User, [user.id])
+    if user.role == "technician":
+        assignment_engine.invalidate(user.garage_id)
     return {
         "id": user.id, 
         "email": user.email, 
         "role": user.role, 
         "garage_id": user.garage_id,
         "full_name": user.full_name,
-        "phone": user.phone
+        "phone": user.phone,
+        "skills": sorted(parse_skills(user.skills))
     }
 
 
 @router.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_directory_db)):
     user = db.query(User).filter(User.email == form_data.username).first()
     if not user or not verify_password(form_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
-    token = create_access_token({"sub": str(user.id)})
+    # gid routes the user's requests to their garage's database (app/tenancy.py)
+    token = create_access_token({"sub": str(user.id), "gid": user.garage_id})
     return {"access_token": token, "token_type": "bearer"}
 
 
@@ -152,7 +171,47 @@ def list_users(role: str | None = None, db: Session = Depends(get_db), current_u
         query = query.filter(User.role == role)
     
     users = query.all()
-    return [{"id": u.id, "email": u.email, "role": u.role, "garage_id": u.garage_id, "full_name": u.full_name, "phone": u.phone} for u in users]
+    
+    # Technicians' workload: open (assigned, in progress, awaiting parts) jobs
+    open_jobs = {}
+    if any(u.role == "technician" for u in users):
+        open_jobs = dict(
+            db.query(Job.technician_id, func.count(Job.id))
+            .filter(Job.technician_id.in_([u.id for u in users if u.role == "technician"]))
+            .filter(Job.status.in_(OPEN_STATUSES))
+            .group_by(Job.technician_id)
+            .all()
+        )
+    
+    return [
+        {
+            "id": u.id, "email": u.email, "role": u.role, "garage_id": u.garage_id, "full_name": u.full_name, "phone": u.phone,
+            **({"skills": sorted(parse_skills(u.skills)), "open_jobs": open_jobs.get(u.id, 0)} if u.role == "technician" else {}),
+        }
+        for u in users
+    ]
+
+
+@router.put("/users/{user_id}/skills")
+def update_technician_skills(
+    user_id: int,
+    payload: SkillsPayload,
+    db: Session = Depends(get_directory_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Set the operations streams a technician is auto-assigned; an empty list means any"""
+    if current_user.role not in ("admin", "site_manager"):
+        raise HTTPException(status_code=403, detail="Only site managers and admins can set technician skills")
+    
+    user = db.query(User).filter(User.id == user_id, User.role == "technician").first()
+    if not user or (current_user.role != "admin" and user.garage_id != current_user.garage_id):
+        raise HTTPException(status_code=404, detail="Technician not found")
+    
+    user.skills = format_skills(payload.skills) or None
+    db.commit()
+    mirror(User, [user.id])
+    assignment_engine.invalidate(user.garage_id)
+    return {"id": user.id, "skills": sorted(parse_skills(user.skills))}
 
 
 
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from sqlalchemy.orm import Session, joinedload, selectinload
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 import random
 import string
 
@@ -9,6 +11,8 @@ from app.database import get_db
 from app.models import Invoice, InvoiceItem, Job, JobStatus, WarehouseItem, JobTaskAction, TaskAction, User
 from app.schemas import InvoiceCreate, InvoiceOut, InvoiceItemCreate
 from app.auth import get_current_user
+from app import archive, fast_serialization, invoice_documents
+from app.partitioning import created_between
 
 router = APIRouter(prefix="/billing", tags=["billing"])
 
@@ -219,14 +223,35 @@ def create_auto_invoice(
 
 @router.get("/invoices", response_model=List[InvoiceOut])
 def list_invoices(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fast: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List all invoices"""
+    """List invoices created between since and until.
+
+    With partitioning, since defaults to LIST_WINDOW_DAYS ago; unpaid invoices are always listed.
+
+    Pass fast=true for the Core/orjson serialization path.
+    """
     garage_id = get_user_garage_id(current_user)
     
-    invoices = db.query(Invoice).join(Job).filter(
-        Job.garage_id == garage_id
+    conditions = [
+        Job.garage_id == garage_id,
+        *created_between(Invoice.created_at, since, until, db.get_bind(), still_open=Invoice.paid.isnot(True)),
+    ]
+    if until:
+        # A job is always created before its invoice
+        conditions.append(Job.created_at < until)
+    
+    if fast:
+        return fast_serialization.invoice_list_response(db, conditions)
+    
+    invoices = db.query(Invoice).join(Job, Invoice.job_id == Job.id).options(
+        selectinload(Invoice.items)
+    ).filter(
+        *conditions
     ).order_by(Invoice.created_at.desc()).all()
     
     return invoices
@@ -241,10 +266,10 @@ def get_invoice(
     """Get invoice details"""
     garage_id = get_user_garage_id(current_user)
     
-    invoice = db.query(Invoice).join(Job).filter(
+    invoice = db.query(Invoice).join(Job, Invoice.job_id == Job.id).filter(
         Invoice.id == invoice_id,
         Job.garage_id == garage_id
-    ).first()
+    ).first() or archive.archived_invoice(db, invoice_id, garage_id)
     
     if not invoice:
         raise HTTPException(
@@ -264,7 +289,7 @@ def mark_invoice_paid(
     """Mark invoice as paid"""
     garage_id = get_user_garage_id(current_user)
     
-    invoice = db.query(Invoice).join(Job).filter(
+    invoice = db.query(Invoice).join(Job, Invoice.job_id == Job.id).filter(
         Invoice.id == invoice_id,
         Job.garage_id == garage_id
     ).first()
@@ -284,3 +309,45 @@ def mark_invoice_paid(
     return invoice
 
 
+def _load_document_payload(db: Session, invoice_id: int, garage_id: int):
+    row = db.query(Invoice, Job).join(Job, Invoice.job_id == Job.id).options(
+        selectinload(Invoice.items),
+        joinedload(Job.vehicle),
+        joinedload(Job.garage),
+    ).filter(
+        Invoice.id == invoice_id,
+        Job.garage_id == garage_id
+    ).first() or archive.archived_invoice_document(db, invoice_id, garage_id)
+    if not row:
+        return None
+    invoice, job = row
+    return invoice_documents.build_payload(invoice, job)
+
+
+@router.get("/invoices/{invoice_id}/document")
+async def get_invoice_document(
+    invoice_id: int,
+    request: Request,
+    format: str = Query("pdf", pattern="^(pdf|html)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Download the invoice as PDF or HTML (supports ETag and Range requests)"""
+    garage_id = get_user_garage_id(current_user)
+    
+    payload = await run_in_threadpool(_load_document_payload, db, invoice_id, garage_id)
+    
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invoice not found"
+        )
+    
+    digest = invoice_documents.content_hash(payload, format)
+    etag = f'"{digest}"'
+    
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    path = await invoice_documents.get_or_render(invoice_id, payload, format, digest)
+    return invoice_documents.document_response(request, path, format, etag)
@@ -0,0 +1,194 @@
+from datetime import datetime
+from typing import Callable
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models import Invoice, Job, JobStatus, RequestStatus, SparePartRequest, TaskAction, User, WarehouseItem
+from app.auth import get_current_user
+from app.assignment import OPEN_STATUSES, parse_skills
+from app.job_board import job_board
+from app.stock_monitor import low_stock_monitor
+from app.stock_locations import garage_stock
+from app.job_events import FINAL_STATUSES
+from app.partitioning import created_between
+from app import fast_serialization
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+# Everything a role's page loads, in one request. Each section is one set-based
+# query (the board is cached) and carries its own "as_of" freshness marker.
+
+
+def get_user_garage_id(current_user: User):
+    """Get garage_id for the current user, raise error if not set"""
+    if not current_user.garage_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User must be assigned to a garage"
+        )
+    return current_user.garage_id
+
+
+def check_role(current_user: User, role: str):
+    if current_user.role not in [role, 'admin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this dashboard"
+        )
+
+
+def section(load: Callable[[], object]) -> dict:
+    return {"as_of": datetime.utcnow(), "data": load()}
+
+
+def board_section(db: Session, garage_id: int) -> dict:
+    board = job_board(db, garage_id)
+    return {"as_of": board["generated_at"], "data": board}
+
+
+def technician_rows(db: Session, garage_id: int) -> list:
+    """The garage's technicians with their skills and open job count"""
+    open_jobs = (
+        select(Job.technician_id, func.count(Job.id).label("open_jobs"))
+        .where(Job.garage_id == garage_id, Job.status.in_(OPEN_STATUSES))
+        .group_by(Job.technician_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(User.id, User.email, User.full_name, User.phone, User.skills,
+               func.coalesce(open_jobs.c.open_jobs, 0).label("open_jobs"))
+        .outerjoin(open_jobs, open_jobs.c.technician_id == User.id)
+        .where(User.garage_id == garage_id, User.role == "technician")
+        .order_by(User.full_name, User.id)
+    ).all()
+    return [
+        {
+            "id": row.id, "email": row.email, "role": "technician", "garage_id": garage_id,
+            "full_name": row.full_name, "phone": row.phone,
+            "skills": sorted(parse_skills(row.skills)), "open_jobs": row.open_jobs,
+        }
+        for row in rows
+    ]
+
+
+def dashboard_response(garage_id: int, role: str, sections: dict) -> ORJSONResponse:
+    return ORJSONResponse({"role": role, "garage_id": garage_id, "generated_at": datetime.utcnow(), **sections})
+
+
+@router.get("/site-manager")
+def site_manager_dashboard(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Garage jobs, technicians with workload, and the job board"""
+    check_role(current_user, 'site_manager')
+    garage_id = get_user_garage_id(current_user)
+
+    return dashboard_response(garage_id, 'site_manager', {
+        "jobs": section(lambda: fast_serialization.job_rows_for(
+            db, [
+                Job.garage_id == garage_id,
+                *created_between(Job.created_at, bind=db.get_bind(), still_open=Job.status.notin_(FINAL_STATUSES)),
+            ]
+        )),
+        "technicians": section(lambda: technician_rows(db, garage_id)),
+        "board": board_section(db, garage_id),
+    })
+
+
+@router.get("/workshop-manager")
+def workshop_manager_dashboard(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Parts requests awaiting approval, completed jobs awaiting review, and the job board"""
+    check_role(current_user, 'workshop_manager')
+    garage_id = get_user_garage_id(current_user)
+
+    return dashboard_response(garage_id, 'workshop_manager', {
+        "pending_requests": section(lambda: fast_serialization.spare_part_request_rows_for(
+            db,
+            [Job.garage_id == garage_id, SparePartRequest.status == RequestStatus.PENDING],
+            order_by=SparePartRequest.requested_at.desc(),
+        )),
+        "completed_jobs": section(lambda: fast_serialization.job_rows_for(
+            db, [Job.garage_id == garage_id, Job.status == JobStatus.COMPLETED]
+        )),
+        "board": board_section(db, garage_id),
+    })
+
+
+@router.get("/warehouse-manager")
+def warehouse_manager_dashboard(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Active items, the garage's stock, approved requests awaiting issue, and low-stock items with reorder suggestions"""
+    check_role(current_user, 'warehouse_manager')
+    garage_id = get_user_garage_id(current_user)
+
+    low_stock = low_stock_monitor.items(db, garage_id)
+
+    return dashboard_response(garage_id, 'warehouse_manager', {
+        "items": section(lambda: fast_serialization.warehouse_item_rows_for(db, [WarehouseItem.is_active == True])),
+        "stock": section(lambda: garage_stock(db, garage_id)),
+        "approved_requests": section(lambda: fast_serialization.spare_part_request_rows_for(
+            db,
+            [Job.garage_id == garage_id, SparePartRequest.status == RequestStatus.APPROVED],
+            order_by=SparePartRequest.requested_at.desc(),
+        )),
+        "low_stock": {"as_of": low_stock_monitor.updated_at, "data": low_stock},
+    })
+
+
+@router.get("/billing")
+def billing_dashboard(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Jobs ready for invoicing and the garage's invoices"""
+    check_role(current_user, 'billing')
+    garage_id = get_user_garage_id(current_user)
+
+    return dashboard_response(garage_id, 'billing', {
+        "billing_jobs": section(lambda: fast_serialization.job_rows_for(
+            db, [Job.garage_id == garage_id, Job.status == JobStatus.BILLING]
+        )),
+        "invoices": section(lambda: fast_serialization.invoice_rows_for(
+            db, [
+                Job.garage_id == garage_id,
+                *created_between(Invoice.created_at, bind=db.get_bind(), still_open=Invoice.paid.isnot(True)),
+            ]
+        )),
+    })
+
+
+@router.get("/technician")
+def technician_dashboard(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """The technician's open jobs, their parts requests, and task actions for their jobs' streams"""
+    check_role(current_user, 'technician')
+    garage_id = get_user_garage_id(current_user)
+
+    jobs = section(lambda: fast_serialization.job_rows_for(
+        db, [Job.garage_id == garage_id, Job.technician_id == current_user.id, Job.status.in_(OPEN_STATUSES)]
+    ))
+    streams = {job["operations_stream"] for job in jobs["data"]}
+
+    return dashboard_response(garage_id, 'technician', {
+        "jobs": jobs,
+        "parts_requests": section(lambda: fast_serialization.spare_part_request_rows_for(
+            db,
+            [Job.garage_id == garage_id, SparePartRequest.requested_by_id == current_user.id],
+            order_by=SparePartRequest.requested_at.desc(),
+        )),
+        "task_actions": section(lambda: fast_serialization.task_action_rows_for(
+            db, [TaskAction.is_active == True, TaskAction.operations_stream.in_(streams)]
+        ) if streams else []),
+    })
@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_directory_db
 from app.models import Garage
 from app.auth import require_role
+from app.tenancy import mirror
 
 router = APIRouter()
 
@@ -12,21 +13,57 @@ router = APIRouter()
 class GarageCreate(BaseModel):
     name: str
     address: str | None = ""
+    service_bays: int | None = None
+    technician_capacity: int | None = None
+
+
+class GarageCapacityUpdate(BaseModel):
+    service_bays: int | None = None
+    technician_capacity: int | None = None
+
+
+def _garage_out(g: Garage) -> dict:
+    return {
+        "id": g.id,
+        "name": g.name,
+        "address": g.address,
+        "service_bays": g.service_bays,
+        "technician_capacity": g.technician_capacity,
+    }
 
 
 @router.post("/", dependencies=[Depends(require_role("admin"))])
-def create_garage(payload: GarageCreate, db: Session = Depends(get_db)):
+def create_garage(payload: GarageCreate, db: Session = Depends(get_directory_db)):
     if db.query(Garage).filter(Garage.name == payload.name).first():
         raise HTTPException(status_code=400, detail="Garage already exists")
-    g = Garage(name=payload.name, address=payload.address or "")
+    g = Garage(name=payload.name, address=payload.address or "", technician_capacity=payload.technician_capacity)
+    if payload.service_bays is not None:
+        g.service_bays = payload.service_bays
     db.add(g)
     db.commit()
     db.refresh(g)
-    return {"id": g.id, "name": g.name, "address": g.address}
+    mirror(Garage, [g.id])
+    return _garage_out(g)
+
+
+@router.patch("/{garage_id}/capacity", dependencies=[Depends(require_role("admin"))])
+def update_garage_capacity(garage_id: int, payload: GarageCapacityUpdate, db: Session = Depends(get_directory_db)):
+    g = db.query(Garage).filter(Garage.id == garage_id).first()
+    if g is None:
+        raise HTTPException(status_code=404, detail="Garage not found")
+    if payload.service_bays is not None:
+        g.service_bays = payload.service_bays
+    if "technician_capacity" in payload.model_fields_set:
+        # null means "count the garage's technicians"
+        g.technician_capacity = payload.technician_capacity
+    db.commit()
+    db.refresh(g)
+    mirror(Garage, [g.id])
+    return _garage_out(g)
 
 
 @router.get("/")
-def list_garages(db: Session = Depends(get_db)):
+def list_garages(db: Session = Depends(get_directory_db)):
     return db.query(Garage).order_by(Garage.name.asc()).all()
 
 
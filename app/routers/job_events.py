@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models import Job, JobEvent, OperationsStream, User
+from app.schemas import JobEventOut, StatusDurationOut
+from app.auth import get_current_user
+from app.job_events import export_events, status_arrays, time_in_status
+from app import archive
+
+router = APIRouter(prefix="/job-events", tags=["job-events"])
+
+
+def get_user_garage_id(current_user: User):
+    """Get garage_id for the current user"""
+    if not current_user.garage_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User must be assigned to a garage"
+        )
+    return current_user.garage_id
+
+
+def check_manager(current_user: User):
+    if current_user.role not in ['site_manager', 'workshop_manager', 'admin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only managers can view job events"
+        )
+
+
+@router.get("/time-in-status", response_model=List[StatusDurationOut])
+def get_time_in_status(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    operations_stream: Optional[OperationsStream] = None,
+    include_current: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """How long the garage's jobs spend in each status.
+
+    Covers jobs created between since (default 30 days ago) and until. Jobs
+    still in a status count with the time so far unless include_current=false.
+    """
+    check_manager(current_user)
+    garage_id = get_user_garage_id(current_user)
+
+    now = datetime.utcnow()
+    conditions = [Job.garage_id == garage_id, Job.created_at >= (since or now - timedelta(days=30))]
+    if until:
+        conditions.append(Job.created_at < until)
+    if operations_stream:
+        conditions.append(Job.operations_stream == operations_stream)
+
+    jobs, times, codes = status_arrays(db, conditions)
+    return time_in_status(jobs, times, codes, now, include_current)
+
+
+@router.get("/export")
+def export_job_events(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: str = "ndjson",
+    garage_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream events recorded between since and until as NDJSON or CSV.
+
+    Site managers export their garage; admins export every garage on their database shard
+    unless garage_id is given.
+    """
+    if current_user.role not in ['site_manager', 'admin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only site managers and admins can export job events"
+        )
+    if format not in ('ndjson', 'csv'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format must be ndjson or csv"
+        )
+
+    if current_user.role != 'admin':
+        garage_id = get_user_garage_id(current_user)
+
+    conditions = []
+    if garage_id:
+        conditions.append(Job.garage_id == garage_id)
+    if since:
+        conditions.append(JobEvent.created_at >= since)
+    if until:
+        conditions.append(JobEvent.created_at < until)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_events(conditions, format, db.get_bind()),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="job-events.{format}"'}
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=List[JobEventOut])
+def list_job_events(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """A job's events, oldest first"""
+    garage_id = get_user_garage_id(current_user)
+
+    job = db.query(Job).filter(
+        Job.id == job_id,
+        Job.garage_id == garage_id
+    ).first()
+
+    archived = job is None
+    if archived:
+        job = archive.archived_job(db, job_id, garage_id)
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    if current_user.role == 'technician' and job.technician_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+
+    if archived:
+        return archive.archived_job_events_for(db, job_id)
+    return db.query(JobEvent).filter(JobEvent.job_id == job_id).order_by(JobEvent.created_at, JobEvent.id).all()
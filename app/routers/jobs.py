@@ -1,13 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import or_
 from datetime import datetime
 from typing import Optional, List
 
 from app.database import get_db
-from app.models import Job, Vehicle, User, JobStatus, OperationsStream, RevenueStream, SparePartRequest, RequestStatus
-from app.schemas import JobCreate, JobOut, JobAssign, JobUpdate, JobDetailOut, VehicleCreate, VehicleOut
+from app.models import Job, Vehicle, User, JobStatus, OperationsStream, RevenueStream, SparePartRequest, RequestStatus, JobTaskAction
+from app.schemas import JobCreate, JobOut, JobAssign, JobReassignment, JobBoardOut, JobUpdate, JobDetailOut, VehicleCreate, VehicleOut
 from app.auth import get_current_user
+from app import archive, fast_serialization
+from app.assignment import assignment_engine, auto_assign
+from app.job_board import job_board
+from app.job_events import FINAL_STATUSES
+from app.partitioning import created_between
+from app.vehicle_identity import get_or_create_vehicle
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
@@ -22,6 +28,15 @@ def get_user_garage_id(current_user: User):
     return current_user.garage_id
 
 
+def commit_assignments(db: Session, garage_id: int):
+    """Commit, dropping the garage's in-memory technician loads if that fails"""
+    try:
+        db.commit()
+    except Exception:
+        assignment_engine.invalidate(garage_id)
+        raise
+
+
 @router.post("/", response_model=JobOut, status_code=status.HTTP_201_CREATED)
 def create_job(
     job_data: JobCreate,
@@ -38,25 +53,18 @@ def create_job(
     
     garage_id = get_user_garage_id(current_user)
     
-    # Check if vehicle exists, create if not
-    vehicle = db.query(Vehicle).filter(
-        Vehicle.registration_number == job_data.registration_number
-    ).first()
-    
-    if not vehicle:
-        # Create new vehicle
-        vehicle = Vehicle(
-            registration_number=job_data.registration_number,
-            vin=job_data.vin,
-            owner_name=job_data.owner_name,
-            owner_contact=job_data.owner_contact,
-            current_mileage=job_data.current_mileage,
-            make=job_data.make,
-            model=job_data.model,
-            year=job_data.year
-        )
-        db.add(vehicle)
-        db.flush()
+    # Find the vehicle by normalized registration/VIN, create if not
+    vehicle = get_or_create_vehicle(
+        db,
+        registration_number=job_data.registration_number,
+        vin=job_data.vin,
+        owner_name=job_data.owner_name,
+        owner_contact=job_data.owner_contact,
+        current_mileage=job_data.current_mileage,
+        make=job_data.make,
+        model=job_data.model,
+        year=job_data.year
+    )
     
     # Create job
     job = Job(
@@ -69,40 +77,125 @@ def create_job(
         status=JobStatus.RECEIVED
     )
     db.add(job)
-    db.commit()
+    
+    if job_data.auto_assign:
+        auto_assign(db, [job])
+        commit_assignments(db, garage_id)
+    else:
+        db.commit()
     db.refresh(job)
     
     return job
 
 
+@router.post("/auto-assign", response_model=List[JobOut])
+def auto_assign_jobs(
+    limit: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Assign the garage's unassigned received jobs, oldest first, to the least-loaded skilled technicians"""
+    if current_user.role not in ['site_manager', 'admin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only site managers can assign jobs"
+        )
+    
+    garage_id = get_user_garage_id(current_user)
+    
+    query = db.query(Job).filter(
+        Job.garage_id == garage_id,
+        Job.status == JobStatus.RECEIVED,
+        Job.technician_id.is_(None)
+    ).order_by(Job.created_at.asc(), Job.id.asc())
+    if limit:
+        query = query.limit(limit)
+    
+    assigned = auto_assign(db, query.all())
+    commit_assignments(db, garage_id)
+    
+    return assigned
+
+
+@router.post("/rebalance", response_model=List[JobReassignment])
+def rebalance_jobs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Move not-yet-started jobs from overloaded technicians to less-loaded skilled ones"""
+    if current_user.role not in ['site_manager', 'admin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only site managers can assign jobs"
+        )
+    
+    garage_id = get_user_garage_id(current_user)
+    
+    moves = assignment_engine.rebalance(db, garage_id)
+    commit_assignments(db, garage_id)
+    
+    return moves
+
+
 @router.get("/", response_model=List[JobOut])
 def list_jobs(
     status_filter: Optional[JobStatus] = None,
     operations_stream: Optional[OperationsStream] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fast: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List jobs - filtered by role"""
+    """List jobs created between since and until - filtered by role.
+
+    With partitioning, since defaults to LIST_WINDOW_DAYS ago; unfinished jobs are always listed.
+
+    Pass fast=true for the Core/orjson serialization path.
+    """
     garage_id = get_user_garage_id(current_user)
     
-    query = db.query(Job).filter(Job.garage_id == garage_id)
+    conditions = [
+        Job.garage_id == garage_id,
+        *created_between(Job.created_at, since, until, db.get_bind(), still_open=Job.status.notin_(FINAL_STATUSES)),
+    ]
     
     # Filter by status
     if status_filter:
-        query = query.filter(Job.status == status_filter)
+        conditions.append(Job.status == status_filter)
     
     # Filter by operations stream
     if operations_stream:
-        query = query.filter(Job.operations_stream == operations_stream)
+        conditions.append(Job.operations_stream == operations_stream)
     
     # Technicians only see their assigned jobs
     if current_user.role == 'technician':
-        query = query.filter(Job.technician_id == current_user.id)
+        conditions.append(Job.technician_id == current_user.id)
     
-    jobs = query.order_by(Job.created_at.desc()).all()
+    if fast:
+        return fast_serialization.job_list_response(db, conditions)
+    
+    jobs = db.query(Job).filter(*conditions).order_by(Job.created_at.desc()).all()
     return jobs
 
 
+@router.get("/board", response_model=JobBoardOut)
+def get_job_board(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Job counts and oldest job age per (status, operations stream) for the user's garage"""
+    if current_user.role not in ['site_manager', 'workshop_manager', 'admin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only managers can view the job board"
+        )
+    
+    garage_id = get_user_garage_id(current_user)
+    
+    return job_board(db, garage_id)
+
+
 @router.get("/{job_id}", response_model=JobDetailOut)
 def get_job(
     job_id: int,
@@ -112,10 +205,17 @@ def get_job(
     """Get job details"""
     garage_id = get_user_garage_id(current_user)
     
-    job = db.query(Job).filter(
+    # Load everything JobDetailOut serializes up front instead of lazily per attribute
+    job = db.query(Job).options(
+        joinedload(Job.vehicle),
+        joinedload(Job.site_manager),
+        joinedload(Job.technician),
+        selectinload(Job.spare_part_requests).joinedload(SparePartRequest.warehouse_item),
+        selectinload(Job.task_actions).joinedload(JobTaskAction.task_action),
+    ).filter(
         Job.id == job_id,
         Job.garage_id == garage_id
-    ).first()
+    ).first() or archive.archived_job_detail(db, job_id, garage_id)
     
     if not job:
         raise HTTPException(
@@ -173,11 +273,19 @@ def assign_job(
             detail="Technician not found"
         )
     
+    previous_technician_id, previous_status = job.technician_id, job.status
     job.technician_id = assign_data.technician_id
     job.status = JobStatus.ASSIGNED
     job.assigned_at = datetime.utcnow()
     
     db.commit()
+    assignment_engine.transition(
+        garage_id, previous_technician_id, previous_status, assign_data.technician_id, JobStatus.ASSIGNED
+    )
+    
+    # The technician's queue grew: spread their other not-yet-started jobs using the in-memory loads
+    if assignment_engine.rebalance(db, garage_id, keep_job_ids=[job_id], reload=False):
+        commit_assignments(db, garage_id)
     db.refresh(job)
     
     return job
@@ -211,6 +319,8 @@ def update_job(
             detail="Access denied"
         )
     
+    previous_status = job.status
+    
     if update_data.work_done is not None:
         job.work_done = update_data.work_done
     
@@ -234,6 +344,7 @@ def update_job(
             job.completed_at = datetime.utcnow()
     
     db.commit()
+    assignment_engine.transition(garage_id, job.technician_id, previous_status, job.technician_id, job.status)
     db.refresh(job)
     
     return job
@@ -277,10 +388,12 @@ def complete_job(
             detail="Cannot complete job with pending parts requests"
         )
     
+    previous_status = job.status
     job.status = JobStatus.COMPLETED
     job.completed_at = datetime.utcnow()
     
     db.commit()
+    assignment_engine.transition(garage_id, job.technician_id, previous_status, job.technician_id, job.status)
     db.refresh(job)
     
     return job
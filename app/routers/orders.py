@@ -7,6 +7,7 @@ from app import models
 from app.schemas import ServiceOrderCreate, ServiceOrderOut, ServiceOrderUpdateStatus
 from app.auth import require_role, get_current_user
 from app.models import User
+from app.vehicle_identity import get_or_create_vehicle
 from app.notifications import send_notification
 
 router = APIRouter()
@@ -14,18 +15,14 @@ router = APIRouter()
 
 @router.post("/", response_model=ServiceOrderOut)
 def create_service_order(payload: ServiceOrderCreate, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    vehicle = db.query(models.Vehicle).filter(models.Vehicle.vin == payload.vehicle_vin).first()
-    if vehicle is None:
-        # Auto-create vehicle with minimal info
-        vehicle = models.Vehicle(
-            vin=payload.vehicle_vin,
-            owner_name="Unknown",
-            owner_contact="owner@example.com",
-            current_mileage=0,
-        )
-        db.add(vehicle)
-        db.commit()
-        db.refresh(vehicle)
+    # Auto-create vehicle with minimal info if the VIN is new
+    vehicle = get_or_create_vehicle(
+        db,
+        vin=payload.vehicle_vin,
+        owner_name="Unknown",
+        owner_contact="owner@example.com",
+        current_mileage=0,
+    )
 
     order = models.ServiceOrder(vehicle_id=vehicle.id, garage_id=payload.garage_id or user.garage_id)
     db.add(order)
@@ -46,7 +43,7 @@ def list_service_orders(db: Session = Depends(get_db), user: User = Depends(get_
 
 
 @router.get("/{order_id}", response_model=ServiceOrderOut)
-def get_service_order(order_id: int, db: Session = Depends(get_db)):
+def get_service_order(order_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     order = db.query(models.ServiceOrder).filter(models.ServiceOrder.id == order_id).first()
     if order is None:
         raise HTTPException(status_code=404, detail="Service order not found")
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+from app.auth import require_role
+from app import profiling
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"], dependencies=[Depends(require_role("admin"))])
+
+
+@router.get("/")
+def list_profiles():
+    """List stored request profiles, newest first"""
+    return profiling.list_profiles()
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str):
+    """Download a profile in folded-stack format (flamegraph.pl / speedscope)"""
+    path = profiling.profile_path(profile_id)
+    
+    if not path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
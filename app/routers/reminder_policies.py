@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.database import get_db
+from app.models import ReminderPolicy, User
+from app.schemas import ReminderPolicyIn, ReminderPolicyOut
+from app.auth import get_current_user
+
+router = APIRouter(prefix="/reminder-policies", tags=["reminder-policies"])
+
+
+def check_policy_access(current_user: User, garage_id: Optional[int]):
+    """Site managers may manage their own garage's policies; admins any, including the chain default"""
+    if current_user.role not in ['site_manager', 'admin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only site managers and admins can manage reminder policies"
+        )
+    if current_user.role != 'admin' and (garage_id is None or garage_id != current_user.garage_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this garage's reminder policies"
+        )
+
+
+@router.get("/", response_model=List[ReminderPolicyOut])
+def list_reminder_policies(
+    garage_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List reminder policies by scope; with garage_id, that garage's scopes plus the chain-wide ones"""
+    query = db.query(ReminderPolicy)
+    if garage_id is not None:
+        query = query.filter((ReminderPolicy.garage_id == garage_id) | (ReminderPolicy.garage_id.is_(None)))
+
+    scopes = {}
+    for row in query.order_by(ReminderPolicy.garage_id, ReminderPolicy.service_type, ReminderPolicy.offset_minutes.desc()):
+        scopes.setdefault((row.garage_id, row.service_type), []).append(
+            {"offset_minutes": row.offset_minutes, "channel": row.channel}
+        )
+    return [
+        {"garage_id": scope_garage, "service_type": service_type, "rules": rules}
+        for (scope_garage, service_type), rules in scopes.items()
+    ]
+
+
+@router.put("/", response_model=ReminderPolicyOut)
+def replace_reminder_policy(
+    payload: ReminderPolicyIn,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Replace the rules of one scope; an empty rule list removes the scope.
+
+    Applies to appointments booked or rescheduled afterwards.
+    """
+    check_policy_access(current_user, payload.garage_id)
+
+    scope = db.query(ReminderPolicy).filter(
+        ReminderPolicy.garage_id.is_(None) if payload.garage_id is None else ReminderPolicy.garage_id == payload.garage_id,
+        ReminderPolicy.service_type.is_(None) if payload.service_type is None else ReminderPolicy.service_type == payload.service_type,
+    )
+    scope.delete(synchronize_session=False)
+
+    rules = {(rule.offset_minutes, rule.channel) for rule in payload.rules}
+    db.add_all([
+        ReminderPolicy(
+            garage_id=payload.garage_id,
+            service_type=payload.service_type,
+            offset_minutes=offset,
+            channel=channel,
+        )
+        for offset, channel in rules
+    ])
+    db.commit()
+
+    return {
+        "garage_id": payload.garage_id,
+        "service_type": payload.service_type,
+        "rules": [{"offset_minutes": offset, "channel": channel} for offset, channel in sorted(rules, reverse=True)],
+    }
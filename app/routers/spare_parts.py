@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from datetime import datetime
 from typing import List, Optional
 
@@ -7,6 +7,9 @@ from app.database import get_db
 from app.models import SparePartRequest, Job, WarehouseItem, User, RequestStatus, JobStatus
 from app.schemas import SparePartRequestCreate, SparePartRequestOut
 from app.auth import get_current_user
+from app import archive, fast_serialization
+from app.stock_monitor import low_stock_monitor
+from app.stock_locations import apply_chain_delta, location_quantity, take_stock
 
 router = APIRouter(prefix="/spare-parts", tags=["spare-parts"])
 
@@ -60,11 +63,12 @@ def create_spare_part_request(
             detail="Warehouse item not found"
         )
     
-    # Check stock availability
-    if warehouse_item.quantity_in_stock < request_data.quantity:
+    # Check the garage's stock
+    available = location_quantity(db, garage_id, warehouse_item.id)
+    if available < request_data.quantity:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Insufficient stock. Available: {warehouse_item.quantity_in_stock}"
+            detail=f"Insufficient stock. Available: {available}"
         )
     
     # Create request
@@ -103,6 +107,8 @@ def list_job_requests(
     ).first()
     
     if not job:
+        if archive.archived_job(db, job_id, garage_id) is not None:
+            return archive.archived_spare_part_requests_for(db, job_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Job not found"
@@ -207,7 +213,10 @@ def issue_parts(
     
     garage_id = get_user_garage_id(current_user)
     
-    request = db.query(SparePartRequest).join(Job).filter(
+    request = db.query(SparePartRequest).join(Job).options(
+        joinedload(SparePartRequest.warehouse_item),
+        joinedload(SparePartRequest.job)
+    ).filter(
         SparePartRequest.id == request_id,
         Job.garage_id == garage_id,
         SparePartRequest.status == RequestStatus.APPROVED
@@ -219,18 +228,13 @@ def issue_parts(
             detail="Request not found or not approved"
         )
     
-    warehouse_item = request.warehouse_item
-    
-    # Check stock availability
-    if warehouse_item.quantity_in_stock < request.quantity:
+    # Deduct from the garage's stock; only this garage's location row is locked
+    if not take_stock(db, garage_id, request.warehouse_item_id, request.quantity):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Insufficient stock. Available: {warehouse_item.quantity_in_stock}"
+            detail=f"Insufficient stock. Available: {location_quantity(db, garage_id, request.warehouse_item_id)}"
         )
     
-    # Deduct from stock
-    warehouse_item.quantity_in_stock -= request.quantity
-    
     # Update request
     request.status = RequestStatus.ISSUED
     request.issued_by_id = current_user.id
@@ -247,7 +251,9 @@ def issue_parts(
         job.status = JobStatus.IN_PROGRESS
     
     db.commit()
+    apply_chain_delta(request.warehouse_item_id, -request.quantity, db.get_bind())
     db.refresh(request)
+    low_stock_monitor.record(db, request.warehouse_item_id, garage_id)
     
     return request
 
@@ -283,27 +289,33 @@ def complete_request(
 
 @router.get("/pending", response_model=List[SparePartRequestOut])
 def list_pending_requests(
+    fast: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List pending requests based on role"""
+    """List pending requests based on role. Pass fast=true for the Core/orjson serialization path."""
     garage_id = get_user_garage_id(current_user)
     
-    query = db.query(SparePartRequest).join(Job).filter(
-        Job.garage_id == garage_id
-    )
+    conditions = [Job.garage_id == garage_id]
     
     if current_user.role == 'workshop_manager':
         # Show pending requests for approval
-        query = query.filter(SparePartRequest.status == RequestStatus.PENDING)
+        conditions.append(SparePartRequest.status == RequestStatus.PENDING)
     elif current_user.role == 'warehouse_manager':
         # Show approved requests for issuing
-        query = query.filter(SparePartRequest.status == RequestStatus.APPROVED)
+        conditions.append(SparePartRequest.status == RequestStatus.APPROVED)
     else:
         # Technicians see their own requests
-        query = query.filter(SparePartRequest.requested_by_id == current_user.id)
+        conditions.append(SparePartRequest.requested_by_id == current_user.id)
+    
+    if fast:
+        return fast_serialization.spare_part_request_list_response(
+            db, conditions, order_by=SparePartRequest.requested_at.desc()
+        )
     
-    requests = query.order_by(SparePartRequest.requested_at.desc()).all()
+    requests = db.query(SparePartRequest).join(Job).options(
+        joinedload(SparePartRequest.warehouse_item)
+    ).filter(*conditions).order_by(SparePartRequest.requested_at.desc()).all()
     return requests
 
 
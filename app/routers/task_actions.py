@@ -2,10 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from app.database import get_db
+from app.database import get_db, get_directory_db
 from app.models import TaskAction, JobTaskAction, Job, OperationsStream, User
 from app.schemas import TaskActionCreate, TaskActionOut, JobTaskActionCreate, JobTaskActionOut
 from app.auth import get_current_user
+from app import archive
+from app.tenancy import mirror
 
 router = APIRouter(prefix="/task-actions", tags=["task-actions"])
 
@@ -23,7 +25,7 @@ def get_user_garage_id(current_user: User):
 @router.post("/", response_model=TaskActionOut, status_code=status.HTTP_201_CREATED)
 def create_task_action(
     task_data: TaskActionCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_directory_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new task action (admin only)"""
@@ -37,6 +39,7 @@ def create_task_action(
     db.add(task_action)
     db.commit()
     db.refresh(task_action)
+    mirror(TaskAction, [task_action.id])
     
     return task_action
 
@@ -86,7 +89,7 @@ def update_task_action(
     description: Optional[str] = None,
     default_labor_cost: Optional[float] = None,
     is_active: Optional[bool] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_directory_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update task action (admin only)"""
@@ -115,6 +118,7 @@ def update_task_action(
     
     db.commit()
     db.refresh(task)
+    mirror(TaskAction, [task.id])
     
     return task
 
@@ -202,6 +206,8 @@ def list_job_tasks(
     ).first()
     
     if not job:
+        if archive.archived_job(db, job_id, garage_id) is not None:
+            return archive.archived_job_task_actions_for(db, job_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Job not found"
@@ -1,15 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app.database import get_db
-from app.models import WarehouseItem, User
-from app.schemas import WarehouseItemCreate, WarehouseItemUpdate, WarehouseItemOut
+from app.models import Garage, PartForecast, StockLocation, StockTransfer, WarehouseItem, User
+from app.schemas import (
+    WarehouseItemCreate, WarehouseItemUpdate, WarehouseItemOut, LowStockItemOut, PartForecastOut,
+    StockLevelOut, StockLevelSet, ItemAvailabilityOut, ItemAvailabilityDetailOut, StockTransferCreate, StockTransferOut
+)
 from app.auth import get_current_user
+from app.stock_monitor import low_stock_monitor
+from app.stock_locations import apply_chain_delta, garage_stock, set_stock, transfer_stock
+from app.tenancy import tenant_router
 
 router = APIRouter(prefix="/warehouse", tags=["warehouse"])
 
 
+def get_user_garage_id(current_user: User):
+    """Get garage_id for the current user"""
+    if not current_user.garage_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User must be assigned to a garage"
+        )
+    return current_user.garage_id
+
+
+def check_stock_access(current_user: User):
+    if current_user.role not in ['warehouse_manager', 'admin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only warehouse managers and admins can change stock"
+        )
+
+
 @router.post("/items", response_model=WarehouseItemOut, status_code=status.HTTP_201_CREATED)
 def create_warehouse_item(
     item_data: WarehouseItemCreate,
@@ -36,8 +61,14 @@ def create_warehouse_item(
     
     item = WarehouseItem(**item_data.dict())
     db.add(item)
+    if item.quantity_in_stock:
+        # Opening stock is received at the creator's garage
+        garage_id = get_user_garage_id(current_user)
+        db.flush()
+        db.add(StockLocation(garage_id=garage_id, warehouse_item_id=item.id, quantity=item.quantity_in_stock))
     db.commit()
     db.refresh(item)
+    low_stock_monitor.record(db, item.id)
     
     return item
 
@@ -58,6 +89,48 @@ def list_warehouse_items(
     return items
 
 
+@router.get("/items/low-stock", response_model=List[LowStockItemOut])
+def list_low_stock_items(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List active items at or below reorder level in the user's garage, with consumption-based reorder suggestions"""
+    garage_id = get_user_garage_id(current_user)
+    return Response(content=low_stock_monitor.json(db, garage_id), media_type="application/json")
+
+
+@router.get("/items/{item_id}/availability", response_model=ItemAvailabilityDetailOut)
+def get_item_availability(
+    item_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Chain-wide stock of an item with the quantity held by each garage"""
+    item = db.query(WarehouseItem).filter(WarehouseItem.id == item_id).first()
+    
+    if not item:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item not found"
+        )
+    
+    locations = (
+        db.query(StockLocation.garage_id, Garage.name, StockLocation.quantity)
+        .join(Garage, Garage.id == StockLocation.garage_id)
+        .filter(StockLocation.warehouse_item_id == item_id, StockLocation.quantity > 0)
+        .order_by(StockLocation.quantity.desc(), StockLocation.garage_id)
+        .all()
+    )
+    return {
+        "warehouse_item_id": item.id,
+        "name": item.name,
+        "part_number": item.part_number,
+        "chain_quantity": item.quantity_in_stock,
+        "garage_quantity": next((q for g, _, q in locations if g == current_user.garage_id), 0),
+        "garages": [{"garage_id": g, "garage_name": name, "quantity": q} for g, name, q in locations],
+    }
+
+
 @router.get("/items/{item_id}", response_model=WarehouseItemOut)
 def get_warehouse_item(
     item_id: int,
@@ -110,27 +183,221 @@ def update_warehouse_item(
                 detail="Part number already exists"
             )
     
+    changes = update_data.dict(exclude_unset=True)
+    
+    # A stock quantity is a count of the user's garage shelf
+    delta = 0
+    if changes.get("quantity_in_stock") is not None:
+        delta = set_stock(db, get_user_garage_id(current_user), item.id, changes["quantity_in_stock"])
+    changes.pop("quantity_in_stock", None)
+    
     # Update fields
-    for field, value in update_data.dict(exclude_unset=True).items():
+    for field, value in changes.items():
         setattr(item, field, value)
     
     db.commit()
+    apply_chain_delta(item.id, delta, db.get_bind())
     db.refresh(item)
+    low_stock_monitor.record(db, item.id)
     
     return item
 
 
-@router.get("/items/low-stock", response_model=List[WarehouseItemOut])
-def list_low_stock_items(
+@router.get("/forecasts", response_model=List[PartForecastOut])
+def list_part_forecasts(
+    changed_only: bool = False,
+    limit: int = 100,
+    offset: int = 0,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """List items that are below reorder level"""
-    items = db.query(WarehouseItem).filter(
-        WarehouseItem.quantity_in_stock <= WarehouseItem.reorder_level,
-        WarehouseItem.is_active == True
-    ).order_by(WarehouseItem.quantity_in_stock).all()
+    """Nightly demand forecasts with recommended reorder points (highest demand first).
     
-    return items
+    changed_only=true lists items whose reorder level differs from the recommendation.
+    """
+    if current_user.role not in ['warehouse_manager', 'admin']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only warehouse managers and admins can view forecasts"
+        )
+    
+    query = db.query(
+        PartForecast, WarehouseItem.name, WarehouseItem.part_number,
+        WarehouseItem.quantity_in_stock, WarehouseItem.reorder_level
+    ).join(WarehouseItem, WarehouseItem.id == PartForecast.warehouse_item_id).filter(WarehouseItem.is_active == True)
+    
+    if changed_only:
+        query = query.filter(PartForecast.recommended_reorder_point != WarehouseItem.reorder_level)
+    
+    rows = query.order_by(PartForecast.daily_demand.desc(), PartForecast.warehouse_item_id).offset(offset).limit(min(limit, 1000)).all()
+    return [
+        {
+            "warehouse_item_id": forecast.warehouse_item_id,
+            "name": name,
+            "part_number": part_number,
+            "quantity_in_stock": quantity_in_stock,
+            "reorder_level": reorder_level or 0,
+            "method": forecast.method,
+            "daily_demand": forecast.daily_demand,
+            "demand_std": forecast.demand_std,
+            "demand_days": forecast.demand_days,
+            "recommended_reorder_point": forecast.recommended_reorder_point,
+            "computed_at": forecast.computed_at,
+        }
+        for forecast, name, part_number, quantity_in_stock, reorder_level in rows
+    ]
 
 
+@router.get("/stock", response_model=List[StockLevelOut])
+def list_garage_stock(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """The user's garage shelf: active items it holds, with the chain-wide total"""
+    garage_id = get_user_garage_id(current_user)
+    return garage_stock(db, garage_id)
+
+
+@router.put("/stock/{item_id}", response_model=StockLevelOut)
+def set_garage_stock(
+    item_id: int,
+    stock_data: StockLevelSet,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Set the user's garage stock of an item after a count or delivery (admin/warehouse manager only)"""
+    check_stock_access(current_user)
+    garage_id = get_user_garage_id(current_user)
+    
+    item = db.query(WarehouseItem).filter(WarehouseItem.id == item_id).first()
+    
+    if not item:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item not found"
+        )
+    
+    delta = set_stock(db, garage_id, item_id, stock_data.quantity)
+    db.commit()
+    apply_chain_delta(item_id, delta, db.get_bind())
+    db.refresh(item)
+    low_stock_monitor.record(db, item_id, garage_id)
+    
+    return {
+        "warehouse_item_id": item.id,
+        "name": item.name,
+        "part_number": item.part_number,
+        "quantity": stock_data.quantity,
+        "reorder_level": item.reorder_level or 0,
+        "chain_quantity": item.quantity_in_stock,
+    }
+
+
+@router.get("/availability", response_model=List[ItemAvailabilityOut])
+def list_availability(
+    active_only: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Chain-wide stock of every item next to the user's garage stock.
+    
+    Chain totals are maintained on each stock change, not summed here.
+    """
+    query = db.query(
+        WarehouseItem.id, WarehouseItem.name, WarehouseItem.part_number,
+        WarehouseItem.quantity_in_stock, StockLocation.quantity
+    ).outerjoin(StockLocation, and_(
+        StockLocation.warehouse_item_id == WarehouseItem.id,
+        StockLocation.garage_id == current_user.garage_id
+    ))
+    
+    if active_only:
+        query = query.filter(WarehouseItem.is_active == True)
+    
+    return [
+        {
+            "warehouse_item_id": item_id,
+            "name": name,
+            "part_number": part_number,
+            "chain_quantity": chain_quantity,
+            "garage_quantity": garage_quantity or 0,
+        }
+        for item_id, name, part_number, chain_quantity, garage_quantity in query.order_by(WarehouseItem.name).all()
+    ]
+
+
+@router.post("/transfers", response_model=StockTransferOut, status_code=status.HTTP_201_CREATED)
+def create_transfer(
+    transfer_data: StockTransferCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Move stock from one garage to another (warehouse managers send from their own garage)"""
+    check_stock_access(current_user)
+    
+    from_garage_id = transfer_data.from_garage_id or get_user_garage_id(current_user)
+    if current_user.role != 'admin' and from_garage_id != current_user.garage_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Warehouse managers can only transfer stock out of their own garage"
+        )
+    
+    if from_garage_id == transfer_data.to_garage_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Source and destination garage must differ"
+        )
+    
+    garage_count = db.query(Garage).filter(Garage.id.in_([from_garage_id, transfer_data.to_garage_id])).count()
+    if garage_count != 2:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Garage not found"
+        )
+    
+    # The session is on the user's garage's shard; stock there is invisible to garages on other shards
+    shard = tenant_router.for_garage(current_user.garage_id)
+    if any(tenant_router.for_garage(garage_id) is not shard for garage_id in (from_garage_id, transfer_data.to_garage_id)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Stock can only be transferred between garages on your database shard"
+        )
+    
+    item = db.query(WarehouseItem).filter(WarehouseItem.id == transfer_data.warehouse_item_id).first()
+    if not item:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item not found"
+        )
+    
+    transfer = transfer_stock(
+        db, item.id, from_garage_id, transfer_data.to_garage_id, transfer_data.quantity, current_user.id
+    )
+    if transfer is None:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Insufficient stock at the source garage"
+        )
+    
+    db.commit()
+    db.refresh(transfer)
+    low_stock_monitor.record(db, item.id, from_garage_id)
+    low_stock_monitor.record(db, item.id, transfer_data.to_garage_id)
+    
+    return transfer
+
+
+@router.get("/transfers", response_model=List[StockTransferOut])
+def list_transfers(
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Recent transfers into or out of the user's garage"""
+    garage_id = get_user_garage_id(current_user)
+    
+    return db.query(StockTransfer).filter(or_(
+        StockTransfer.from_garage_id == garage_id,
+        StockTransfer.to_garage_id == garage_id
+    )).order_by(StockTransfer.created_at.desc(), StockTransfer.id.desc()).limit(min(limit, 1000)).all()
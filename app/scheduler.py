@@ -1,12 +1,23 @@
 from __future__ import annotations
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Sequence
+from apscheduler.events import EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from app.database import SessionLocal
 from app.models import Reminder
 from app.notifications import send_notification
+from app.vehicle_identity import dedupe_vehicles
+from app.service_forecast import run_forecast
+from app.parts_forecast import PARTS_FORECAST_HOUR, run_parts_forecast
+from app.stock_locations import reconcile_chain_totals
+from app.archive import ARCHIVE_HOUR, run_archival
+from app.partitioning import ensure_partitions
+from app.idempotency import purge_expired_keys
+from app.metrics import NOTIFICATION_QUEUE_DEPTH, REMINDER_QUEUE_SIZE, instrument_job, observe_job_submission
+from app.reminder_queue import REMINDER_SWEEP_SECONDS, reminder_queue
+from app.tenancy import sync_all_reference, tenant_router
 
 _scheduler: Optional[BackgroundScheduler] = None
 
@@ -15,30 +26,59 @@ def get_scheduler() -> BackgroundScheduler:
     global _scheduler
     if _scheduler is None:
         _scheduler = BackgroundScheduler()
+        _scheduler.add_listener(observe_job_submission, EVENT_JOB_SUBMITTED)
     return _scheduler
 
 
 def start_scheduler(scheduler: BackgroundScheduler) -> None:
     if not scheduler.running:
         scheduler.start()
-        scheduler.add_job(process_due_reminders, "interval", seconds=30, id="process_due_reminders", replace_existing=True)
+        reminder_queue.start(process_due_reminders)
+        scheduler.add_job(
+            reconcile_reminders, "interval", seconds=REMINDER_SWEEP_SECONDS, id="reconcile_reminders", replace_existing=True
+        )
+        scheduler.add_job(merge_duplicate_vehicles, "interval", hours=1, id="merge_duplicate_vehicles", replace_existing=True)
+        scheduler.add_job(forecast_next_service, "interval", hours=1, id="forecast_next_service", replace_existing=True)
+        scheduler.add_job(
+            forecast_parts_demand, "cron", hour=PARTS_FORECAST_HOUR, id="forecast_parts_demand", replace_existing=True
+        )
+        scheduler.add_job(reconcile_chain_stock, "interval", hours=1, id="reconcile_chain_stock", replace_existing=True)
+        scheduler.add_job(archive_closed_records, "cron", hour=ARCHIVE_HOUR, id="archive_closed_records", replace_existing=True)
+        scheduler.add_job(create_partitions, "interval", days=1, id="create_partitions", replace_existing=True)
+        scheduler.add_job(
+            purge_idempotency_keys, "interval", hours=1, id="purge_idempotency_keys", replace_existing=True
+        )
+        if tenant_router.enabled:
+            scheduler.add_job(
+                sync_tenant_reference, "interval", hours=1, id="sync_tenant_reference", replace_existing=True
+            )
 
 
 def shutdown_scheduler(scheduler: BackgroundScheduler) -> None:
     if scheduler.running:
         scheduler.shutdown(wait=False)
+    reminder_queue.stop()
+
 
+@instrument_job("process_due_reminders")
+def process_due_reminders(reminder_ids: Optional[Sequence[int]] = None) -> None:
+    """Send reminders that are due and unsent (only ``reminder_ids`` when given), on every shard."""
+    for shard in tenant_router.shards():
+        _send_due_reminders(shard.session(), reminder_ids)
 
-def process_due_reminders() -> None:
+
+def _send_due_reminders(db: Session, reminder_ids: Optional[Sequence[int]]) -> None:
     now = datetime.utcnow()
-    db: Session = SessionLocal()
     try:
-        due = (
+        query = (
             db.query(Reminder)
             .filter(Reminder.sent_at.is_(None))
             .filter(Reminder.scheduled_for <= now)
-            .all()
         )
+        if reminder_ids is not None:
+            query = query.filter(Reminder.id.in_(reminder_ids))
+        # Skip rows another process is delivering right now (no-op on SQLite)
+        due = query.with_for_update(skip_locked=True).all()
         for r in due:
             send_notification(r.channel, "owner", "Appointment Reminder", r.message)
             r.sent_at = now
@@ -46,3 +86,77 @@ def process_due_reminders() -> None:
             db.commit()
     finally:
         db.close()
+
+
+@instrument_job("reconcile_reminders")
+def reconcile_reminders() -> None:
+    """Safety net for the delay queue: reload the look-ahead window from the table."""
+    REMINDER_QUEUE_SIZE.set(reminder_queue.reconcile())
+    NOTIFICATION_QUEUE_DEPTH.set(_count_overdue_reminders())
+
+
+def _count_overdue_reminders() -> int:
+    """Unsent reminders whose send time has passed, on every shard; a growing value means delivery is behind."""
+    now = datetime.utcnow()
+    overdue = 0
+    for shard in tenant_router.shards():
+        db = shard.session()
+        try:
+            overdue += (
+                db.query(func.count(Reminder.id))
+                .filter(Reminder.sent_at.is_(None))
+                .filter(Reminder.scheduled_for <= now)
+                .scalar()
+            )
+        finally:
+            db.close()
+    return overdue
+
+
+@instrument_job("merge_duplicate_vehicles")
+def merge_duplicate_vehicles() -> None:
+    for shard in tenant_router.shards():
+        dedupe_vehicles(bind=shard.engine)
+
+
+@instrument_job("forecast_next_service")
+def forecast_next_service() -> None:
+    reminders = sum(run_forecast(bind=shard.engine)["reminders"] for shard in tenant_router.shards())
+    if reminders:
+        reconcile_reminders()
+
+
+@instrument_job("forecast_parts_demand")
+def forecast_parts_demand() -> None:
+    for shard in tenant_router.shards():
+        run_parts_forecast(bind=shard.engine)
+
+
+@instrument_job("reconcile_chain_stock")
+def reconcile_chain_stock() -> None:
+    for shard in tenant_router.shards():
+        reconcile_chain_totals(shard.engine)
+
+
+@instrument_job("archive_closed_records")
+def archive_closed_records() -> None:
+    for shard in tenant_router.shards():
+        run_archival(bind=shard.engine)
+
+
+@instrument_job("create_partitions")
+def create_partitions() -> None:
+    for shard in tenant_router.shards():
+        ensure_partitions(bind=shard.engine)
+
+
+@instrument_job("purge_idempotency_keys")
+def purge_idempotency_keys() -> None:
+    for shard in tenant_router.shards():
+        purge_expired_keys(shard.engine)
+
+
+@instrument_job("sync_tenant_reference")
+def sync_tenant_reference() -> None:
+    """Safety net for ``mirror``: copy the directory's garages, users and task actions to every shard."""
+    sync_all_reference()
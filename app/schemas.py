@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic import BaseModel, Field
 from app.models import OperationsStream, RevenueStream, JobStatus, RequestStatus
 
@@ -44,12 +44,35 @@ class JobCreate(BaseModel):
     operations_stream: OperationsStream
     revenue_stream: RevenueStream
     issues_reported: str
+    auto_assign: bool = False
 
 
 class JobAssign(BaseModel):
     technician_id: int
 
 
+class JobReassignment(BaseModel):
+    job_id: int
+    from_technician_id: int
+    to_technician_id: int
+
+
+class JobBoardCell(BaseModel):
+    status: str
+    operations_stream: str
+    count: int
+    oldest_created_at: Optional[datetime]
+    oldest_age_seconds: Optional[int]
+
+
+class JobBoardOut(BaseModel):
+    garage_id: int
+    generated_at: datetime
+    cells: List[JobBoardCell]
+    by_status: Dict[str, int]
+    by_operations_stream: Dict[str, int]
+
+
 class JobUpdate(BaseModel):
     work_done: Optional[str] = None
     status: Optional[JobStatus] = None
@@ -78,10 +101,10 @@ class JobOut(BaseModel):
 
 class JobDetailOut(JobOut):
     vehicle: VehicleOut
-    site_manager: Optional[dict] = None
-    technician: Optional[dict] = None
-    spare_part_requests: List[dict] = []
-    task_actions: List[dict] = []
+    site_manager: Optional["UserOut"] = None
+    technician: Optional["UserOut"] = None
+    spare_part_requests: List["SparePartRequestOut"] = []
+    task_actions: List["JobTaskActionOut"] = []
 
     class Config:
         from_attributes = True
@@ -146,7 +169,7 @@ class SparePartRequestOut(BaseModel):
     approved_at: Optional[datetime]
     issued_at: Optional[datetime]
     notes: str
-    warehouse_item: Optional[dict] = None
+    warehouse_item: Optional["WarehouseItemOut"] = None
 
     class Config:
         from_attributes = True
@@ -186,6 +209,103 @@ class WarehouseItemOut(BaseModel):
         from_attributes = True
 
 
+class LowStockItemOut(WarehouseItemOut):
+    garage_id: int
+    daily_usage: float
+    days_of_stock: Optional[float]
+    suggested_reorder_quantity: int
+
+
+class StockLevelOut(BaseModel):
+    warehouse_item_id: int
+    name: str
+    part_number: Optional[str]
+    quantity: int
+    reorder_level: int
+    chain_quantity: int
+
+
+class StockLevelSet(BaseModel):
+    quantity: int = Field(..., ge=0)
+
+
+class GarageStockOut(BaseModel):
+    garage_id: int
+    garage_name: str
+    quantity: int
+
+
+class ItemAvailabilityOut(BaseModel):
+    warehouse_item_id: int
+    name: str
+    part_number: Optional[str]
+    chain_quantity: int
+    garage_quantity: int
+
+
+class ItemAvailabilityDetailOut(ItemAvailabilityOut):
+    garages: List[GarageStockOut]
+
+
+class StockTransferCreate(BaseModel):
+    warehouse_item_id: int
+    to_garage_id: int
+    from_garage_id: Optional[int] = None  # defaults to the user's garage
+    quantity: int = Field(..., gt=0)
+
+
+class StockTransferOut(BaseModel):
+    id: int
+    warehouse_item_id: int
+    from_garage_id: int
+    to_garage_id: int
+    quantity: int
+    transferred_by_id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class JobEventOut(BaseModel):
+    id: int
+    job_id: int
+    event_type: str
+    from_status: Optional[str]
+    to_status: Optional[str]
+    technician_id: Optional[int]
+    reference_id: Optional[int]
+    actor_id: Optional[int]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class StatusDurationOut(BaseModel):
+    status: str
+    intervals: int
+    jobs_now: int
+    total_seconds: float
+    mean_seconds: float
+    median_seconds: float
+    p90_seconds: float
+
+
+class PartForecastOut(BaseModel):
+    warehouse_item_id: int
+    name: str
+    part_number: Optional[str]
+    quantity_in_stock: int
+    reorder_level: int
+    method: str
+    daily_demand: float
+    demand_std: float
+    demand_days: int
+    recommended_reorder_point: int
+    computed_at: datetime
+
+
 # Invoice Schemas
 class InvoiceItemCreate(BaseModel):
     warehouse_item_id: Optional[int] = None
@@ -201,6 +321,20 @@ class InvoiceCreate(BaseModel):
     tax_rate: float = 0.0
 
 
+class InvoiceItemOut(BaseModel):
+    id: int
+    invoice_id: int
+    warehouse_item_id: Optional[int]
+    description: str
+    quantity: int
+    unit_price: float
+    total: float
+    item_type: str
+
+    class Config:
+        from_attributes = True
+
+
 class InvoiceOut(BaseModel):
     id: int
     job_id: int
@@ -211,7 +345,7 @@ class InvoiceOut(BaseModel):
     created_at: datetime
     paid: bool
     paid_at: Optional[datetime]
-    items: List[dict] = []
+    items: List[InvoiceItemOut] = []
 
     class Config:
         from_attributes = True
@@ -286,8 +420,10 @@ class AppointmentUpdate(BaseModel):
 class AppointmentOut(BaseModel):
     id: int
     vehicle_id: int
+    garage_id: Optional[int] = None
     service_type: str
     scheduled_at: datetime
+    ends_at: Optional[datetime] = None
     notes: str
     status: str
 
@@ -295,10 +431,26 @@ class AppointmentOut(BaseModel):
         from_attributes = True
 
 
+class AvailabilitySlot(BaseModel):
+    start: datetime
+    end: datetime
+    available: int
+
+
+class AvailabilityOut(BaseModel):
+    garage_id: int
+    service_type: str
+    duration_minutes: int
+    capacity: int
+    slots: List[AvailabilitySlot]
+
+
 class ReminderOut(BaseModel):
     id: int
     appointment_id: Optional[int]
+    garage_id: Optional[int] = None
     channel: str
+    offset_minutes: Optional[int] = None
     message: str
     scheduled_for: datetime
     sent_at: Optional[datetime]
@@ -307,6 +459,23 @@ class ReminderOut(BaseModel):
         from_attributes = True
 
 
+class ReminderRule(BaseModel):
+    offset_minutes: int = Field(..., gt=0, description="Minutes before the appointment")
+    channel: str = Field("log", pattern="^(sms|email|push|log)$")
+
+
+class ReminderPolicyIn(BaseModel):
+    garage_id: Optional[int] = None
+    service_type: Optional[str] = None
+    rules: List[ReminderRule]
+
+
+class ReminderPolicyOut(BaseModel):
+    garage_id: Optional[int]
+    service_type: Optional[str]
+    rules: List[ReminderRule]
+
+
 class ServiceHistoryOut(BaseModel):
     id: int
     vehicle_id: int
@@ -0,0 +1,272 @@
+"""Fleet-wide next-service forecasting.
+
+For every vehicle whose service history changed since the last run, estimate
+its mileage rate (least-squares km/day over its history) and the next due
+date and mileage, in one vectorized NumPy pass per chunk, and store the
+result in ``service_forecasts``. Vehicles with fewer than two usable history
+points use the fleet median rate.
+
+A vehicle is due after ``SERVICE_INTERVAL_KM`` from its last service or
+``SERVICE_INTERVAL_DAYS`` after it, whichever the estimated rate reaches
+first; vehicles with no history are due at current mileage plus the interval.
+
+After the forecasts are updated, vehicles whose due date falls within
+``SERVICE_REMINDER_WINDOW_DAYS`` get one ``Reminder`` per due date, for the
+garage that last serviced them, created by the shard serving that garage.
+
+Incremental by construction: each forecast records the highest
+``ServiceHistory.id`` it includes and the current mileage it started from.
+Only vehicles with newer history or no forecast yet are recomputed, plus
+vehicles on the fleet rate when the fleet median has moved and vehicles
+without history whose current mileage changed.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+
+from app.database import engine
+from app.models import Garage, Job, Reminder, ServiceForecast, ServiceHistory, ServiceOrder, Vehicle, archived_jobs
+from app.tenancy import tenant_router
+
+# numpy is imported by the fitting functions, not when the scheduler imports this module
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SERVICE_INTERVAL_KM = int(os.getenv("SERVICE_INTERVAL_KM", "10000"))
+SERVICE_INTERVAL_DAYS = int(os.getenv("SERVICE_INTERVAL_DAYS", "365"))
+DEFAULT_DAILY_KM = float(os.getenv("DEFAULT_DAILY_KM", "40"))
+SERVICE_REMINDER_WINDOW_DAYS = int(os.getenv("SERVICE_REMINDER_WINDOW_DAYS", "14"))
+FORECAST_CHUNK_SIZE = 5000
+
+
+def _stale_vehicle_ids(conn, fleet_rate: float) -> list[int]:
+    latest = (
+        select(ServiceHistory.vehicle_id, func.max(ServiceHistory.id).label("latest"))
+        .group_by(ServiceHistory.vehicle_id)
+        .subquery()
+    )
+    query = (
+        select(Vehicle.id)
+        .outerjoin(latest, latest.c.vehicle_id == Vehicle.id)
+        .outerjoin(ServiceForecast, ServiceForecast.vehicle_id == Vehicle.id)
+        .where(or_(
+            ServiceForecast.vehicle_id.is_(None),
+            ServiceForecast.history_watermark < func.coalesce(latest.c.latest, 0),
+            and_(
+                ServiceForecast.history_count == 0,
+                or_(ServiceForecast.base_mileage.is_(None), ServiceForecast.base_mileage != Vehicle.current_mileage),
+            ),
+            and_(ServiceForecast.history_count < 2, ServiceForecast.daily_mileage != fleet_rate),
+        ))
+        .order_by(Vehicle.id)
+    )
+    return list(conn.execute(query).scalars())
+
+
+def _fleet_rate(conn) -> float:
+    """Median of the stored per-vehicle rates, for vehicles without enough history.
+
+    Rounded to 0.1 km/day, so that fleet-rate forecasts are only recomputed
+    when the median has really moved.
+    """
+    import numpy as np
+
+    rates = np.fromiter(
+        conn.execute(select(ServiceForecast.daily_mileage).where(ServiceForecast.history_count >= 2)).scalars(),
+        dtype=float,
+    )
+    return round(float(np.median(rates)), 1) if rates.size else DEFAULT_DAILY_KM
+
+
+def compute_forecasts(vehicle_ids: np.ndarray, current_mileage: np.ndarray, history: list[tuple],
+                      fallback_rate: float) -> dict[str, np.ndarray]:
+    """Vectorized forecast for one chunk.
+
+    ``vehicle_ids`` is sorted; ``history`` holds (vehicle_id, id, date, mileage)
+    rows ordered by vehicle_id, date, id. Returns arrays aligned with
+    ``vehicle_ids``; due days are proleptic ordinals (NaN when unknown).
+    """
+    import numpy as np
+
+    m = len(vehicle_ids)
+    if history:
+        h_vehicle, h_id, h_date, h_km = zip(*history)
+        group = np.searchsorted(vehicle_ids, np.asarray(h_vehicle))
+        hist_id = np.asarray(h_id, dtype=np.int64)
+        day = np.fromiter((d.toordinal() for d in h_date), dtype=float, count=len(h_date))
+        km = np.asarray(h_km, dtype=float)
+    else:
+        group = np.empty(0, dtype=np.int64)
+        hist_id = np.empty(0, dtype=np.int64)
+        day = km = np.empty(0, dtype=float)
+
+    count = np.bincount(group, minlength=m)
+    # Least-squares slope km/day per vehicle from grouped sums (x centred for precision)
+    x = day - (day.min() if day.size else 0.0)
+    sx = np.bincount(group, weights=x, minlength=m)
+    sy = np.bincount(group, weights=km, minlength=m)
+    sxx = np.bincount(group, weights=x * x, minlength=m)
+    sxy = np.bincount(group, weights=x * km, minlength=m)
+    denominator = count * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (count * sxy - sx * sy) / denominator
+    fitted = (count >= 2) & (denominator > 0) & np.isfinite(slope) & (slope > 0)
+    rate = np.where(fitted, slope, fallback_rate)
+
+    # Last service per vehicle: rows are ordered, so it is the last row of each group
+    last_day = np.full(m, np.nan)
+    last_km = np.full(m, np.nan)
+    watermark = np.zeros(m, dtype=np.int64)
+    if group.size:
+        last = np.flatnonzero(np.r_[group[1:] != group[:-1], True])
+        last_day[group[last]] = day[last]
+        last_km[group[last]] = km[last]
+        np.maximum.at(watermark, group, hist_id)
+
+    has_history = count > 0
+    base_km = np.where(has_history, last_km, current_mileage)
+    due_km = base_km + SERVICE_INTERVAL_KM
+    due_day = np.minimum(last_day + SERVICE_INTERVAL_DAYS, last_day + np.floor(SERVICE_INTERVAL_KM / rate))
+
+    return {
+        "due_by_mileage": due_km.astype(np.int64),
+        "due_day": due_day,
+        "daily_mileage": rate,
+        "history_count": count,
+        "history_watermark": watermark,
+    }
+
+
+def _process_chunk(conn, chunk: list[int], fallback_rate: float, now: datetime) -> None:
+    import numpy as np
+
+    vehicles = conn.execute(
+        select(Vehicle.id, Vehicle.current_mileage).where(Vehicle.id.in_(chunk)).order_by(Vehicle.id)
+    ).all()
+    if not vehicles:
+        return
+    vehicle_ids = np.asarray([v.id for v in vehicles], dtype=np.int64)
+    current_mileage = np.asarray([v.current_mileage or 0 for v in vehicles], dtype=float)
+    history = conn.execute(
+        select(ServiceHistory.vehicle_id, ServiceHistory.id, ServiceHistory.date, ServiceHistory.mileage)
+        .where(ServiceHistory.vehicle_id.in_(chunk))
+        .order_by(ServiceHistory.vehicle_id, ServiceHistory.date, ServiceHistory.id)
+    ).all()
+
+    result = compute_forecasts(vehicle_ids, current_mileage, history, fallback_rate)
+
+    reminded = dict(conn.execute(
+        select(ServiceForecast.vehicle_id, ServiceForecast.reminded_due_date)
+        .where(ServiceForecast.vehicle_id.in_(chunk))
+    ).all())
+    rows = []
+    for i, vehicle_id in enumerate(vehicle_ids.tolist()):
+        due_day = result["due_day"][i]
+        rows.append({
+            "vehicle_id": vehicle_id,
+            "due_by_mileage": int(result["due_by_mileage"][i]),
+            "due_by_date": None if np.isnan(due_day) else date.fromordinal(int(due_day)),
+            "daily_mileage": float(result["daily_mileage"][i]),
+            "history_count": int(result["history_count"][i]),
+            "history_watermark": int(result["history_watermark"][i]),
+            "base_mileage": int(current_mileage[i]),
+            "reminded_due_date": reminded.get(vehicle_id),
+            "computed_at": now,
+        })
+    conn.execute(delete(ServiceForecast).where(ServiceForecast.vehicle_id.in_(chunk)))
+    conn.execute(insert(ServiceForecast), rows)
+
+
+def _servicing_garages():
+    """Correlated lookups of the garage that last serviced the vehicle, in order of preference."""
+    last_order = (
+        select(ServiceOrder.garage_id)
+        .where(ServiceOrder.vehicle_id == Vehicle.id, ServiceOrder.garage_id.isnot(None))
+        .order_by(ServiceOrder.created_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    last_job = (
+        select(Job.garage_id).where(Job.vehicle_id == Vehicle.id).order_by(Job.created_at.desc()).limit(1)
+        .scalar_subquery()
+    )
+    last_archived_job = (
+        select(archived_jobs.c.garage_id).where(archived_jobs.c.vehicle_id == Vehicle.id)
+        .order_by(archived_jobs.c.created_at.desc()).limit(1)
+        .scalar_subquery()
+    )
+    return last_order, last_job, last_archived_job
+
+
+def _create_due_reminders(conn, now: datetime) -> int:
+    """One reminder per due date, for the garage that last serviced the vehicle.
+
+    Vehicles are shared between shards, so only the shard serving that garage
+    creates the reminder. Vehicles no garage has serviced go to "Main" on a
+    single database; with shards they are skipped, since the copy may be one
+    left behind by a garage move.
+    """
+    window_end = now.date() + timedelta(days=SERVICE_REMINDER_WINDOW_DAYS)
+    needs_reminder = (
+        ServiceForecast.due_by_date.isnot(None),
+        ServiceForecast.due_by_date <= window_end,
+        or_(ServiceForecast.reminded_due_date.is_(None), ServiceForecast.reminded_due_date != ServiceForecast.due_by_date),
+    )
+    main_garage_id = None
+    if not tenant_router.enabled:
+        main_garage_id = conn.execute(select(Garage.id).where(Garage.name == "Main")).scalar()
+    garage_id = func.coalesce(*_servicing_garages(), main_garage_id).label("garage_id")
+    due = [
+        row for row in conn.execute(
+            select(Vehicle.id, Vehicle.registration_number, ServiceForecast.due_by_date, ServiceForecast.due_by_mileage,
+                   garage_id)
+            .join(Vehicle, Vehicle.id == ServiceForecast.vehicle_id)
+            .where(*needs_reminder)
+        ).all()
+        if row.garage_id is not None and tenant_router.for_garage(row.garage_id).engine is conn.engine
+    ]
+    if not due:
+        return 0
+    conn.execute(insert(Reminder), [
+        {
+            "appointment_id": None,
+            "garage_id": row.garage_id,
+            "channel": "log",
+            "message": f"Service due for {row.registration_number} by {row.due_by_date.isoformat()} "
+                       f"or {row.due_by_mileage} km",
+            "scheduled_for": now,
+        }
+        for row in due
+    ])
+    conn.execute(
+        update(ServiceForecast)
+        .where(ServiceForecast.vehicle_id.in_([row.id for row in due]), *needs_reminder)
+        .values(reminded_due_date=ServiceForecast.due_by_date)
+    )
+    return len(due)
+
+
+def run_forecast(chunk_size: int = FORECAST_CHUNK_SIZE, bind=engine) -> dict:
+    """Recompute stale forecasts and create reminders for vehicles entering their window."""
+    now = datetime.utcnow()
+    with bind.connect() as conn:
+        fallback_rate = _fleet_rate(conn)
+        stale = _stale_vehicle_ids(conn, fallback_rate)
+
+    for start in range(0, len(stale), chunk_size):
+        with bind.begin() as conn:
+            _process_chunk(conn, stale[start:start + chunk_size], fallback_rate, now)
+
+    with bind.begin() as conn:
+        reminders = _create_due_reminders(conn, now)
+
+    if stale or reminders:
+        logger.info("Service forecast: %d vehicles recomputed, %d reminders created", len(stale), reminders)
+    return {"vehicles": len(stale), "reminders": reminders}
@@ -0,0 +1,131 @@
+"""Per-request SQL instrumentation and N+1 detection.
+
+Engine events record every statement executed while a request is being
+handled: query count, total DB time and how often each statement shape
+(the SQL text with bound parameters, IN-lists collapsed) repeats. The
+middleware reports them in a ``Server-Timing`` header and logs requests
+that are slow or that repeat one SELECT shape often enough to look like
+an N+1 lazy-load loop.
+
+Settings (environment):
+    SQL_SLOW_REQUEST_MS    log requests slower than this (default 500)
+    SQL_N_PLUS_ONE_THRESHOLD  flag a SELECT shape repeated this many times (default 5)
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("SQL_SLOW_REQUEST_MS", "500"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_IN_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class RequestQueryStats:
+    __slots__ = ("count", "duration", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated_selects(self, threshold: int) -> list[tuple[str, int]]:
+        return [
+            (shape, n) for shape, n in self.shapes.most_common()
+            if n >= threshold and shape.lstrip().upper().startswith("SELECT")
+        ]
+
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = conn.info.get("query_start")
+    if stats is None or not starts:
+        return
+    stats.record(statement, time.perf_counter() - starts.pop())
+
+
+def install(engine) -> None:
+    """Register the statement timing hooks on an engine (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLInstrumentationMiddleware:
+    """ASGI middleware collecting RequestQueryStats for each HTTP request.
+
+    Sync endpoints and dependencies run in worker threads with a copy of the
+    request's context, so they record into the same stats object.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", app;dur={elapsed_ms:.1f}',
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._report(scope, stats, (time.perf_counter() - start) * 1000)
+
+    @staticmethod
+    def _report(scope, stats: RequestQueryStats, elapsed_ms: float) -> None:
+        repeated = stats.repeated_selects(N_PLUS_ONE_THRESHOLD)
+        if elapsed_ms < SLOW_REQUEST_MS and not repeated:
+            return
+        route = getattr(scope.get("route"), "path", scope["path"])
+        logger.warning(
+            "%s %s took %.1fms with %d queries (%.1fms in DB)%s",
+            scope["method"], route, elapsed_ms, stats.count, stats.duration * 1000,
+            " - possible N+1" if repeated else "",
+        )
+        for shape, n in repeated:
+            logger.warning("  %dx %s", n, shape[:300])
@@ -0,0 +1,195 @@
+"""Per-garage stock locations and the chain-wide availability total.
+
+Each garage's shelf is one ``StockLocation`` row per item. Issuing parts is a
+single conditional UPDATE of the issuing garage's row (``quantity >= n``), so
+concurrent issues only contend within a garage and stock can't go negative.
+Transfers move stock between two garages' rows in one transaction.
+
+``WarehouseItem.quantity_in_stock`` is the chain-wide total. Rather than
+summing locations on read, every committed stock change applies its delta
+to the total in its own short transaction (``apply_chain_delta``), so no
+request holds the item row while it works. The item row is still written
+once per issue, so a busy item's row stays a hotspot; it is held for one
+statement instead of a whole request. Transfers leave the total unchanged.
+
+``reconcile_chain_totals`` runs hourly in the scheduler and corrects drift,
+e.g. a delta lost to a crash between the two commits. A location change
+whose delta has not been applied yet would look like drift, and the late
+delta would then count twice, so items with a location changed in the last
+``STOCK_RECONCILE_GRACE_SECONDS`` are left for a later run.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import exists, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import engine
+from app.models import Garage, StockLocation, StockTransfer, WarehouseItem
+
+logger = logging.getLogger(__name__)
+
+STOCK_RECONCILE_GRACE_SECONDS = int(os.getenv("STOCK_RECONCILE_GRACE_SECONDS", "300"))
+
+
+def location_quantity(db: Session, garage_id: int, item_id: int) -> int:
+    return db.query(StockLocation.quantity).filter(
+        StockLocation.garage_id == garage_id,
+        StockLocation.warehouse_item_id == item_id
+    ).scalar() or 0
+
+
+def take_stock(db: Session, garage_id: int, item_id: int, quantity: int) -> bool:
+    """Decrement a garage's stock if it has enough (not committed)."""
+    result = db.execute(
+        update(StockLocation)
+        .where(StockLocation.garage_id == garage_id)
+        .where(StockLocation.warehouse_item_id == item_id)
+        .where(StockLocation.quantity >= quantity)
+        .values(quantity=StockLocation.quantity - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def put_stock(db: Session, garage_id: int, item_id: int, quantity: int) -> None:
+    """Increment a garage's stock, creating its location if needed (not committed)."""
+    increment = (
+        update(StockLocation)
+        .where(StockLocation.garage_id == garage_id)
+        .where(StockLocation.warehouse_item_id == item_id)
+        .values(quantity=StockLocation.quantity + quantity)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(increment).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(StockLocation).values(garage_id=garage_id, warehouse_item_id=item_id, quantity=quantity))
+    except IntegrityError:
+        # Another transaction created the location first
+        db.execute(increment)
+
+
+def set_stock(db: Session, garage_id: int, item_id: int, quantity: int) -> int:
+    """Set a garage's stock after a count (not committed). Returns the change."""
+    location = db.query(StockLocation).filter(
+        StockLocation.garage_id == garage_id,
+        StockLocation.warehouse_item_id == item_id
+    ).with_for_update().first()
+    if location is None:
+        db.add(StockLocation(garage_id=garage_id, warehouse_item_id=item_id, quantity=quantity))
+        return quantity
+    delta = quantity - location.quantity
+    location.quantity = quantity
+    return delta
+
+
+def transfer_stock(db: Session, item_id: int, from_garage_id: int, to_garage_id: int,
+                   quantity: int, user_id: int) -> Optional[StockTransfer]:
+    """Move stock between garages (not committed).
+
+    Returns None, having changed nothing that will be committed, if the
+    source garage lacks the stock; the caller must then roll back.
+    """
+    # Touch the two rows in garage id order so opposite transfers can't deadlock
+    if from_garage_id < to_garage_id:
+        if not take_stock(db, from_garage_id, item_id, quantity):
+            return None
+        put_stock(db, to_garage_id, item_id, quantity)
+    else:
+        put_stock(db, to_garage_id, item_id, quantity)
+        if not take_stock(db, from_garage_id, item_id, quantity):
+            return None
+    transfer = StockTransfer(
+        warehouse_item_id=item_id,
+        from_garage_id=from_garage_id,
+        to_garage_id=to_garage_id,
+        quantity=quantity,
+        transferred_by_id=user_id
+    )
+    db.add(transfer)
+    return transfer
+
+
+def apply_chain_delta(item_id: int, delta: int, bind=engine) -> None:
+    """Fold a committed stock change into the item's chain-wide total."""
+    if not delta:
+        return
+    with bind.begin() as conn:
+        conn.execute(
+            update(WarehouseItem)
+            .where(WarehouseItem.id == item_id)
+            .values(quantity_in_stock=WarehouseItem.quantity_in_stock + delta)
+        )
+
+
+def reconcile_chain_totals(bind=engine) -> int:
+    """Reset chain-wide totals that drifted from their locations. Returns the number fixed."""
+    total = (
+        select(func.coalesce(func.sum(StockLocation.quantity), 0))
+        .where(StockLocation.warehouse_item_id == WarehouseItem.id)
+        .scalar_subquery()
+    )
+    recently_changed = exists().where(
+        StockLocation.warehouse_item_id == WarehouseItem.id,
+        StockLocation.updated_at >= datetime.utcnow() - timedelta(seconds=STOCK_RECONCILE_GRACE_SECONDS),
+    )
+    with bind.begin() as conn:
+        fixed = conn.execute(
+            update(WarehouseItem)
+            .where(WarehouseItem.quantity_in_stock != total)
+            .where(~recently_changed)
+            .values(quantity_in_stock=total)
+        ).rowcount
+    if fixed:
+        logger.warning("Reconciled chain-wide stock for %d items", fixed)
+    return fixed
+
+
+def backfill_locations() -> int:
+    """Give stock recorded before per-garage locations to the first garage."""
+    with engine.begin() as conn:
+        garage_id = conn.execute(select(func.min(Garage.id))).scalar()
+        if garage_id is None:
+            return 0
+        located = exists().where(StockLocation.warehouse_item_id == WarehouseItem.id)
+        moved = conn.execute(
+            insert(StockLocation).from_select(
+                ["garage_id", "warehouse_item_id", "quantity"],
+                select(literal(garage_id), WarehouseItem.id, WarehouseItem.quantity_in_stock)
+                .where(WarehouseItem.quantity_in_stock > 0)
+                .where(~located)
+            )
+        ).rowcount
+    if moved:
+        logger.info("Moved stock of %d items to garage %d", moved, garage_id)
+    return moved
+
+
+def garage_stock(db: Session, garage_id: int) -> list[dict]:
+    """The garage's shelf: every active item it holds, with the chain-wide total."""
+    rows = (
+        db.query(StockLocation.warehouse_item_id, WarehouseItem.name, WarehouseItem.part_number,
+                 StockLocation.quantity, WarehouseItem.reorder_level, WarehouseItem.quantity_in_stock)
+        .join(WarehouseItem, WarehouseItem.id == StockLocation.warehouse_item_id)
+        .filter(StockLocation.garage_id == garage_id, WarehouseItem.is_active == True)
+        .order_by(WarehouseItem.name, WarehouseItem.id)
+        .all()
+    )
+    return [
+        {
+            "warehouse_item_id": row.warehouse_item_id,
+            "name": row.name,
+            "part_number": row.part_number,
+            "quantity": row.quantity,
+            "reorder_level": row.reorder_level or 0,
+            "chain_quantity": row.quantity_in_stock,
+        }
+        for row in rows
+    ]
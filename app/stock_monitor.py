@@ -0,0 +1,181 @@
+"""Maintained per-garage low-stock sets with consumption-based reorder suggestions.
+
+Instead of scanning stock on every read, each stock change (issuing parts,
+a transfer, a count, editing an item) re-evaluates just the affected stock
+locations against the item's reorder level and adds them to or drops them
+from an in-memory set per garage. Reads return a pre-encoded JSON snapshot of
+the garage's set, rebuilt only when it changes.
+
+Each low item carries its consumption velocity at that garage: units issued
+to the garage's jobs over the last ``REORDER_LOOKBACK_DAYS`` per day, from
+``spare_part_requests``. The suggested order tops the garage's stock up to
+the reorder level plus ``REORDER_COVER_DAYS`` of that consumption.
+
+Stock changes made by other workers are picked up by a full reload (one
+query for the low locations plus one grouped usage query) when the sets are
+older than ``LOW_STOCK_REFRESH_SECONDS``.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+import orjson
+from sqlalchemy import func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models import Job, RequestStatus, SparePartRequest, StockLocation, WarehouseItem
+
+REORDER_LOOKBACK_DAYS = int(os.getenv("REORDER_LOOKBACK_DAYS", "30"))
+REORDER_COVER_DAYS = int(os.getenv("REORDER_COVER_DAYS", "30"))
+LOW_STOCK_REFRESH_SECONDS = float(os.getenv("LOW_STOCK_REFRESH_SECONDS", "60"))
+
+CONSUMED_STATUSES = (RequestStatus.ISSUED, RequestStatus.COMPLETED)
+
+_ITEM_FIELDS = ("id", "name", "part_number", "description", "unit_price", "reorder_level", "is_active")
+
+
+def is_low(quantity_in_stock: int, reorder_level: Optional[int], is_active: Optional[bool]) -> bool:
+    return bool(is_active) and quantity_in_stock <= (reorder_level or 0)
+
+
+def issued_units(db: Session, item_ids: Iterable[int], garage_id: Optional[int] = None) -> dict[tuple[int, int], int]:
+    """Units issued per (garage, item) within the lookback window"""
+    item_ids = list(item_ids)
+    if not item_ids:
+        return {}
+    since = datetime.utcnow() - timedelta(days=REORDER_LOOKBACK_DAYS)
+    query = (
+        db.query(Job.garage_id, SparePartRequest.warehouse_item_id, func.sum(SparePartRequest.quantity))
+        .join(Job, Job.id == SparePartRequest.job_id)
+        .filter(SparePartRequest.warehouse_item_id.in_(item_ids))
+        .filter(SparePartRequest.status.in_(CONSUMED_STATUSES))
+        .filter(SparePartRequest.issued_at >= since)
+    )
+    if garage_id is not None:
+        query = query.filter(Job.garage_id == garage_id)
+    return {
+        (garage, item_id): issued
+        for garage, item_id, issued in query.group_by(Job.garage_id, SparePartRequest.warehouse_item_id).all()
+    }
+
+
+def low_stock_entry(row, issued: int) -> dict:
+    entry = {field: getattr(row, field) for field in _ITEM_FIELDS}
+    entry["garage_id"] = row.garage_id
+    entry["quantity_in_stock"] = row.quantity
+    entry["reorder_level"] = entry["reorder_level"] or 0
+    daily_usage = (issued or 0) / REORDER_LOOKBACK_DAYS
+    order_up_to = entry["reorder_level"] + math.ceil(daily_usage * REORDER_COVER_DAYS)
+    entry["daily_usage"] = round(daily_usage, 3)
+    entry["days_of_stock"] = round(entry["quantity_in_stock"] / daily_usage, 1) if daily_usage else None
+    entry["suggested_reorder_quantity"] = max(0, order_up_to - entry["quantity_in_stock"])
+    return entry
+
+
+def _location_rows(db: Session):
+    """Active items' stock locations, with the item fields an entry needs"""
+    return (
+        db.query(StockLocation.garage_id, StockLocation.quantity, *(getattr(WarehouseItem, field) for field in _ITEM_FIELDS))
+        .join(WarehouseItem, WarehouseItem.id == StockLocation.warehouse_item_id)
+        .filter(WarehouseItem.is_active == True)
+    )
+
+
+class LowStockMonitor:
+    def __init__(self):
+        self._entries: dict[int, dict[int, dict]] = {}  # garage_id -> item id -> entry
+        self._snapshots: dict[int, tuple[list[dict], bytes]] = {}
+        # Per database (tenant shards load separately): last full load, and the garages it covers
+        self._loaded_at: dict[Engine, float] = {}
+        self._garages: dict[Engine, set[int]] = {}
+        self.updated_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def _publish(self, garage_id: int) -> None:
+        """Rebuild the garage's sorted snapshot; call with the lock held."""
+        items = sorted(self._entries.get(garage_id, {}).values(), key=lambda e: (e["quantity_in_stock"], e["id"]))
+        self._snapshots[garage_id] = (items, orjson.dumps(items))
+        self.updated_at = datetime.utcnow()
+
+    def reload(self, db: Session) -> None:
+        bind = db.get_bind()
+        rows = _location_rows(db).filter(
+            StockLocation.quantity <= func.coalesce(WarehouseItem.reorder_level, 0)
+        ).all()
+        issued = issued_units(db, {row.id for row in rows})
+        entries: dict[int, dict[int, dict]] = {}
+        for row in rows:
+            entries.setdefault(row.garage_id, {})[row.id] = low_stock_entry(row, issued.get((row.garage_id, row.id), 0))
+        with self._lock:
+            for garage_id in self._garages.get(bind, set()) - entries.keys():
+                self._entries.pop(garage_id, None)
+                self._snapshots.pop(garage_id, None)
+            self._entries.update(entries)
+            self._garages[bind] = set(entries)
+            self._loaded_at[bind] = time.monotonic()
+            for garage_id in entries:
+                self._publish(garage_id)
+
+    def _ensure_loaded(self, db: Session) -> None:
+        loaded_at = self._loaded_at.get(db.get_bind())
+        if loaded_at is None or time.monotonic() - loaded_at > LOW_STOCK_REFRESH_SECONDS:
+            self.reload(db)
+
+    def record(self, db: Session, item_id: int, garage_id: Optional[int] = None) -> None:
+        """Re-evaluate an item after a committed stock or item change.
+
+        Only the given garage's location is checked; ``garage_id=None``
+        (an edit to the item itself) re-checks every garage stocking it.
+        """
+        bind = db.get_bind()
+        if bind not in self._loaded_at:
+            # Nothing maintained yet; the first read loads everything
+            return
+        query = _location_rows(db).filter(StockLocation.warehouse_item_id == item_id)
+        if garage_id is not None:
+            query = query.filter(StockLocation.garage_id == garage_id)
+        rows = query.all()
+        low = [row for row in rows if is_low(row.quantity, row.reorder_level, row.is_active)]
+        issued = issued_units(db, [item_id], garage_id) if low else {}
+        entries = {row.garage_id: low_stock_entry(row, issued.get((row.garage_id, item_id), 0)) for row in low}
+
+        with self._lock:
+            if garage_id is not None:
+                garage_ids = {garage_id}
+            else:
+                # Also drops the item where it was deactivated
+                garage_ids = {g for g in self._garages.get(bind, set()) if item_id in self._entries.get(g, {})}
+                garage_ids |= set(entries)
+            self._garages.setdefault(bind, set()).update(garage_ids)
+            for g in garage_ids:
+                garage_entries = self._entries.setdefault(g, {})
+                if g in entries:
+                    garage_entries[item_id] = entries[g]
+                elif garage_entries.pop(item_id, None) is None:
+                    continue
+                self._publish(g)
+
+    def items(self, db: Session, garage_id: int) -> list[dict]:
+        self._ensure_loaded(db)
+        return self._snapshots.get(garage_id, ([], b"[]"))[0]
+
+    def json(self, db: Session, garage_id: int) -> bytes:
+        self._ensure_loaded(db)
+        return self._snapshots.get(garage_id, ([], b"[]"))[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            self._snapshots = {}
+            self._loaded_at = {}
+            self._garages = {}
+            self.updated_at = datetime.utcnow()
+
+
+low_stock_monitor = LowStockMonitor()
@@ -0,0 +1,516 @@
+"""Database-per-tenant routing: garages mapped to database shards.
+
+``TENANT_SHARDS`` names the extra databases as JSON, either a URL or a URL
+plus a PostgreSQL schema (used through the search_path)::
+
+    {"east": "postgresql://db-east/mototrack",
+     "west": {"url": "postgresql://db-main/mototrack", "schema": "west"}}
+
+The default database (``DATABASE_URL``) is the directory. It owns garages,
+users and task actions, and it serves every garage whose ``shard`` column is
+null. ``garages.shard`` maps the other garages to their shards. Every shard
+carries the full schema. The directory's garages, users and task actions are
+mirrored into each shard so that joins and foreign keys work there:
+``mirror`` runs after each write and ``sync_reference`` runs at startup and
+hourly.
+
+``get_db`` opens its session on the shard of the authenticated user's garage,
+taken from the ``gid`` claim of their token. Each shard has its own
+connection pool. Requests without a principal use the directory. Background
+jobs run once per shard (``tenant_router.shards()``).
+
+Row ids stay unique across shards, so a garage's rows keep their ids when it
+moves. On PostgreSQL each shard's id sequences start at its position in
+TENANT_SHARDS times SHARD_ID_SPAN, so only ever append shards to that list.
+SQLite shards get no id ranges and are for development only.
+
+``move_garage`` (scripts/move_garage.py) moves a garage between shards while
+it keeps serving:
+
+1. copy its rows to the target;
+2. mark it moving, which makes its writes answer 503 with Retry-After, and
+   wait until every worker has seen the flag;
+3. copy again to catch up, and drop target rows deleted in the meantime;
+4. point the garage at the target, clear the flag, wait again, and delete
+   its rows from the source.
+
+Reads are never interrupted. Writes pause during step 3 only.
+
+A garage owns its jobs (with their invoices, items, task actions, parts
+requests and events, live and archived), its appointments, reminders,
+reminder policies, service orders, stock locations and idempotency keys.
+Vehicles, service history, stock transfers and the warehouse catalogue are
+shared: a move copies whatever the target is missing and leaves the source
+copy in place.
+Chain-wide views (availability, transfers, admin exports) only cover the
+garages on the same shard.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import bindparam, delete, insert, or_, select, text, union, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import partitioning
+from app.auth import token_garage_id
+from app.database import (
+    SQLALCHEMY_DATABASE_URL, Base, SessionLocal, add_missing_columns, create_missing_indexes, engine, make_engine,
+)
+from app.models import (
+    Appointment, Garage, IdempotencyKey, Invoice, InvoiceItem, Job, JobBoardVersion, JobEvent, JobTaskAction, Reminder,
+    ReminderPolicy, ServiceHistory, ServiceOrder, SparePartRequest, StockLocation, StockTransfer, TaskAction, User,
+    Vehicle, WarehouseItem,
+    archived_invoice_items, archived_invoices, archived_job_events, archived_job_task_actions, archived_jobs,
+    archived_reminders, archived_spare_part_requests,
+)
+from app.sql_instrumentation import install as install_sql_instrumentation
+from app.stock_locations import reconcile_chain_totals
+
+logger = logging.getLogger(__name__)
+
+TENANT_SHARDS = os.getenv("TENANT_SHARDS", "")
+TENANT_ROUTES_REFRESH_SECONDS = int(os.getenv("TENANT_ROUTES_REFRESH_SECONDS", "30"))
+SHARD_ID_SPAN = int(os.getenv("SHARD_ID_SPAN", "100000000"))
+MOVE_BATCH_SIZE = int(os.getenv("MOVE_BATCH_SIZE", "1000"))
+
+DIRECTORY = "default"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Owned by the directory and mirrored into every shard, parents first
+REFERENCE_TABLES = (Garage.__table__, User.__table__, TaskAction.__table__)
+# Counters each database keeps for itself; mirroring never overwrites them
+SHARD_OWNED_COLUMNS = ("booking_version",)
+
+
+class Shard:
+    """One tenant database (or PostgreSQL schema) with its own connection pool, opened on first use."""
+
+    def __init__(self, name: str, index: int, url: str, schema: Optional[str] = None,
+                 shard_engine=None, sessions: Optional[sessionmaker] = None):
+        self.name = name
+        self.index = index
+        self.url = url
+        self.schema = schema
+        self._engine = shard_engine
+        self._sessions = sessions
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        with self._lock:
+            if self._engine is None:
+                shard_engine = make_engine(self.url, self.schema)
+                install_sql_instrumentation(shard_engine)
+                self._sessions = sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+                self._engine = shard_engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._open()
+        return self._engine
+
+    def session(self) -> Session:
+        if self._engine is None:
+            self._open()
+        return self._sessions()
+
+
+class TenantRouter:
+    """Garage -> shard map, read from the directory's garages every TENANT_ROUTES_REFRESH_SECONDS."""
+
+    def __init__(self, config: str):
+        self.directory = Shard(DIRECTORY, 0, SQLALCHEMY_DATABASE_URL, shard_engine=engine, sessions=SessionLocal)
+        self._shards = {DIRECTORY: self.directory}
+        specs = json.loads(config) if config.strip() else {}
+        for index, (name, spec) in enumerate(specs.items(), start=1):
+            if isinstance(spec, str):
+                spec = {"url": spec}
+            self._shards[name] = Shard(name, index, spec["url"], spec.get("schema"))
+        self._routes: dict[int, tuple[Optional[str], bool]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return len(self._shards) > 1
+
+    def shards(self) -> list[Shard]:
+        """Every database, the directory first."""
+        return list(self._shards.values())
+
+    def shard(self, name: Optional[str]) -> Shard:
+        name = name or DIRECTORY
+        if name not in self._shards:
+            raise ValueError(f"Unknown shard {name!r}; add it to TENANT_SHARDS")
+        return self._shards[name]
+
+    def _route(self, garage_id: int) -> tuple[Optional[str], bool]:
+        with self._lock:
+            now = time.monotonic()
+            age = None if self._loaded_at is None else now - self._loaded_at
+            # A garage created since the last load is picked up on its first request
+            if age is None or age > TENANT_ROUTES_REFRESH_SECONDS or (garage_id not in self._routes and age > 1):
+                with engine.connect() as conn:
+                    rows = conn.execute(select(Garage.id, Garage.shard, Garage.moving)).all()
+                self._routes = {row.id: (row.shard, bool(row.moving)) for row in rows}
+                self._loaded_at = now
+            return self._routes.get(garage_id, (None, False))
+
+    def for_garage(self, garage_id: Optional[int]) -> Shard:
+        if garage_id is None or not self.enabled:
+            return self.directory
+        return self.shard(self._route(garage_id)[0])
+
+    def is_moving(self, garage_id: Optional[int]) -> bool:
+        return self.enabled and garage_id is not None and self._route(garage_id)[1]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+
+tenant_router = TenantRouter(TENANT_SHARDS)
+
+
+def session_for_request(request: Request) -> Session:
+    """``get_db``'s session: the shard of the token's garage, or the directory without one."""
+    if not tenant_router.enabled:
+        return SessionLocal()
+    garage_id = token_garage_id(request)
+    if request.method not in SAFE_METHODS and tenant_router.is_moving(garage_id):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Garage is moving to another database; retry shortly",
+            headers={"Retry-After": str(TENANT_ROUTES_REFRESH_SECONDS)},
+        )
+    return tenant_router.for_garage(garage_id).session()
+
+
+# Copying rows -----------------------------------------------------------------------------
+
+
+def _rows(conn, stmt) -> list[dict]:
+    return [dict(row) for row in conn.execute(stmt).mappings()]
+
+
+def _conflict_keys(conn, table) -> list[str]:
+    if table.name in partitioning.PARTITIONED_TABLES and partitioning.is_partitioned(conn, table.name):
+        return ["id", "created_at"]
+    return ["id"]
+
+
+def _upsert(conn, table, rows: list[dict], overwrite: bool = True, keys: Optional[list[str]] = None) -> None:
+    """Insert rows; on a conflict overwrite the existing row, or keep it when ``overwrite`` is False."""
+    if not rows:
+        return
+    stmt = (postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert)(table)
+    if overwrite:
+        keys = keys or _conflict_keys(conn, table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={
+                column.name: stmt.excluded[column.name] for column in table.columns
+                if column.name not in keys and column.name not in SHARD_OWNED_COLUMNS
+            },
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing()
+    conn.execute(stmt, rows)
+
+
+def _copy(source, target, table, condition, batch_size: int, overwrite: bool = True,
+          remap: Optional[dict[str, dict[int, int]]] = None, invoice_links: Optional[list] = None) -> int:
+    """Copy matching rows in id order, rewriting ``remap``ped foreign keys. Returns the number copied."""
+    keys = _conflict_keys(target, table)
+    copied = 0
+    last_id = None
+    while True:
+        stmt = select(table).order_by(table.c.id).limit(batch_size)
+        if condition is not None:
+            stmt = stmt.where(condition)
+        if last_id is not None:
+            stmt = stmt.where(table.c.id > last_id)
+        rows = _rows(source, stmt)
+        if not rows:
+            return copied
+        last_id = rows[-1]["id"]
+        for row in rows:
+            for column, ids in (remap or {}).items():
+                if row.get(column) in ids:
+                    row[column] = ids[row[column]]
+            if invoice_links is not None and row["invoice_id"] is not None:
+                # jobs and invoices reference each other: linked once both are copied
+                invoice_links.append({"b_job": row["id"], "b_invoice": row["invoice_id"]})
+                row["invoice_id"] = None
+        _upsert(target, table, rows, overwrite, keys)
+        copied += len(rows)
+
+
+def _copy_shared(source, target, table, condition, natural_keys: tuple[str, ...], batch_size: int) -> dict[int, int]:
+    """Copy shared rows the target is missing.
+
+    Returns source id -> target id for rows the target already holds under
+    another id (matched on ``natural_keys``), e.g. a vehicle both shards saw.
+    """
+    mapping = {}
+    last_id = None
+    while True:
+        stmt = select(table).order_by(table.c.id).limit(batch_size)
+        if condition is not None:
+            stmt = stmt.where(condition)
+        if last_id is not None:
+            stmt = stmt.where(table.c.id > last_id)
+        rows = _rows(source, stmt)
+        if not rows:
+            return mapping
+        last_id = rows[-1]["id"]
+        _upsert(target, table, rows, overwrite=False)
+        present = set(target.execute(select(table.c.id).where(table.c.id.in_([row["id"] for row in rows]))).scalars())
+        for row in rows:
+            if row["id"] in present:
+                continue
+            match = None
+            for key in natural_keys:
+                if row[key] is not None:
+                    match = target.execute(select(table.c.id).where(table.c[key] == row[key])).scalar()
+                    if match is not None:
+                        break
+            if match is None:
+                raise RuntimeError(f"{table.name} {row['id']} conflicts with a different row on the target")
+            mapping[row["id"]] = match
+
+
+def _owned_rows(garage_id: int) -> list[tuple]:
+    """(table, condition) for every row the garage owns, parents before children."""
+    jobs = select(Job.id).where(Job.garage_id == garage_id)
+    invoices = select(Invoice.id).where(Invoice.job_id.in_(jobs))
+    appointments = select(Appointment.id).where(Appointment.garage_id == garage_id)
+    old_jobs = select(archived_jobs.c.id).where(archived_jobs.c.garage_id == garage_id)
+    old_invoices = select(archived_invoices.c.id).where(archived_invoices.c.job_id.in_(old_jobs))
+    return [
+        (ServiceOrder.__table__, ServiceOrder.garage_id == garage_id),
+        (Appointment.__table__, Appointment.garage_id == garage_id),
+        (Reminder.__table__, or_(Reminder.garage_id == garage_id, Reminder.appointment_id.in_(appointments))),
+        (ReminderPolicy.__table__, ReminderPolicy.garage_id == garage_id),
+        (StockLocation.__table__, StockLocation.garage_id == garage_id),
+        (Job.__table__, Job.garage_id == garage_id),
+        (Invoice.__table__, Invoice.job_id.in_(jobs)),
+        (InvoiceItem.__table__, InvoiceItem.invoice_id.in_(invoices)),
+        (JobTaskAction.__table__, JobTaskAction.job_id.in_(jobs)),
+        (SparePartRequest.__table__, SparePartRequest.job_id.in_(jobs)),
+        (JobEvent.__table__, JobEvent.job_id.in_(jobs)),
+        (archived_jobs, archived_jobs.c.garage_id == garage_id),
+        (archived_invoices, archived_invoices.c.job_id.in_(old_jobs)),
+        (archived_invoice_items, archived_invoice_items.c.invoice_id.in_(old_invoices)),
+        (archived_job_task_actions, archived_job_task_actions.c.job_id.in_(old_jobs)),
+        (archived_spare_part_requests, archived_spare_part_requests.c.job_id.in_(old_jobs)),
+        (archived_job_events, archived_job_events.c.job_id.in_(old_jobs)),
+        (archived_reminders, archived_reminders.c.garage_id == garage_id),
+        (IdempotencyKey.__table__, IdempotencyKey.garage_id == garage_id),
+    ]
+
+
+@contextmanager
+def _snapshot(bind):
+    """A connection reading one consistent snapshot (REPEATABLE READ on PostgreSQL)."""
+    with bind.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            yield conn
+
+
+def _drop_stale(source, target, garage_id: int) -> int:
+    """Delete the garage's target rows that no longer exist in the source, children first."""
+    dropped = 0
+    for table, condition in reversed(_owned_rows(garage_id)):
+        kept = set(source.execute(select(table.c.id).where(condition)).scalars())
+        stale = [row_id for row_id in target.execute(select(table.c.id).where(condition)).scalars() if row_id not in kept]
+        for start in range(0, len(stale), MOVE_BATCH_SIZE):
+            chunk = stale[start:start + MOVE_BATCH_SIZE]
+            if table is Invoice.__table__:
+                target.execute(update(Job.__table__).where(Job.invoice_id.in_(chunk)).values(invoice_id=None))
+            target.execute(delete(table).where(table.c.id.in_(chunk)))
+        dropped += len(stale)
+    return dropped
+
+
+def _copy_garage(source_engine, target_engine, garage_id: int, batch_size: int, final: bool = False) -> dict:
+    """Copy the garage's rows (and the shared rows they need) from one database to another."""
+    counts = {}
+    with _snapshot(source_engine) as source, target_engine.begin() as target:
+        vehicles = Vehicle.id.in_(union(
+            select(Job.vehicle_id).where(Job.garage_id == garage_id),
+            select(Appointment.vehicle_id).where(Appointment.garage_id == garage_id),
+            select(ServiceOrder.vehicle_id).where(ServiceOrder.garage_id == garage_id),
+            select(archived_jobs.c.vehicle_id).where(archived_jobs.c.garage_id == garage_id),
+        ))
+        remap = {
+            "vehicle_id": _copy_shared(
+                source, target, Vehicle.__table__, vehicles, ("registration_key", "vin_key"), batch_size
+            ),
+            "warehouse_item_id": _copy_shared(
+                source, target, WarehouseItem.__table__, None, ("part_number",), batch_size
+            ),
+        }
+        _copy(source, target, ServiceHistory.__table__, ServiceHistory.vehicle_id.in_(select(Vehicle.id).where(vehicles)),
+              batch_size, overwrite=False, remap=remap)
+        _copy(source, target, StockTransfer.__table__,
+              or_(StockTransfer.from_garage_id == garage_id, StockTransfer.to_garage_id == garage_id),
+              batch_size, overwrite=False, remap=remap)
+
+        invoice_links = []
+        for table, condition in _owned_rows(garage_id):
+            counts[table.name] = _copy(
+                source, target, table, condition, batch_size, remap=remap,
+                invoice_links=invoice_links if table is Job.__table__ else None,
+            )
+        if invoice_links:
+            target.execute(
+                update(Job.__table__).where(Job.id == bindparam("b_job")).values(invoice_id=bindparam("b_invoice")),
+                invoice_links,
+            )
+
+        if final:
+            counts["dropped"] = _drop_stale(source, target, garage_id)
+            # Past anything cached from the source, so boards and booking indexes reload
+            booking_version = source.execute(select(Garage.booking_version).where(Garage.id == garage_id)).scalar()
+            target.execute(
+                update(Garage.__table__).where(Garage.id == garage_id).values(booking_version=booking_version + 1)
+            )
+            board_version = max(
+                conn.execute(select(JobBoardVersion.version).where(JobBoardVersion.garage_id == garage_id)).scalar() or 0
+                for conn in (source, target)
+            )
+            target.execute(delete(JobBoardVersion.__table__).where(JobBoardVersion.garage_id == garage_id))
+            target.execute(insert(JobBoardVersion.__table__).values(garage_id=garage_id, version=board_version + 1))
+    return counts
+
+
+def _delete_garage(bind, garage_id: int) -> None:
+    with bind.begin() as conn:
+        # jobs.invoice_id and invoices.job_id reference each other
+        conn.execute(update(Job.__table__).where(Job.garage_id == garage_id).values(invoice_id=None))
+        for table, condition in reversed(_owned_rows(garage_id)):
+            conn.execute(delete(table).where(condition))
+
+
+# Shards and directory copies --------------------------------------------------------------
+
+
+def mirror(model, ids: Iterable[int]) -> None:
+    """Copy directory rows of a reference table into every shard; call after committing them."""
+    ids = list(ids)
+    if not tenant_router.enabled or not ids:
+        return
+    table = model.__table__
+    with engine.connect() as conn:
+        rows = _rows(conn, select(table).where(table.c.id.in_(ids)))
+    for shard in tenant_router.shards()[1:]:
+        with shard.engine.begin() as conn:
+            _upsert(conn, table, rows)
+
+
+def sync_reference(shard: Shard, batch_size: int = MOVE_BATCH_SIZE) -> None:
+    """Copy every directory row of the reference tables into ``shard``."""
+    with engine.connect() as source, shard.engine.begin() as target:
+        for table in REFERENCE_TABLES:
+            _copy(source, target, table, None, batch_size)
+
+
+def sync_all_reference() -> None:
+    for shard in tenant_router.shards()[1:]:
+        sync_reference(shard)
+
+
+def _reserve_ids(shard: Shard) -> None:
+    """Start the shard's id sequences in its own range so row ids stay unique across shards."""
+    if shard.engine.dialect.name != "postgresql":
+        return
+    floor = shard.index * SHARD_ID_SPAN
+    with shard.engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table in REFERENCE_TABLES or table.autoincrement_column is None:
+                continue
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"GREATEST((SELECT COALESCE(MAX(id), 0) FROM {table.name}), :floor))"
+            ), {"floor": floor})
+
+
+def prepare_shard(shard: Shard) -> None:
+    """Create the schema on a shard, reserve its id range and copy in the reference tables."""
+    if shard.schema and shard.engine.dialect.name == "postgresql":
+        with shard.engine.begin() as conn:
+            conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{shard.schema}"'))
+    partitioning.create_tables(shard.engine)
+    add_missing_columns(shard.engine)
+    create_missing_indexes(shard.engine)
+    _reserve_ids(shard)
+    sync_reference(shard)
+
+
+def prepare_shards() -> None:
+    for shard in tenant_router.shards()[1:]:
+        prepare_shard(shard)
+
+
+# Moving garages ---------------------------------------------------------------------------
+
+
+def _set_route(garage_id: int, **values) -> None:
+    with engine.begin() as conn:
+        conn.execute(update(Garage.__table__).where(Garage.id == garage_id).values(**values))
+    mirror(Garage, [garage_id])
+    tenant_router.invalidate()
+
+
+def move_garage(garage_id: int, target_name: str, batch_size: int = MOVE_BATCH_SIZE,
+                settle_seconds: Optional[float] = None) -> dict:
+    """Move a garage's rows to another shard while it keeps serving. Returns rows copied per table.
+
+    ``settle_seconds`` (default TENANT_ROUTES_REFRESH_SECONDS + 5) is how long
+    to wait for every worker to pick up a route change.
+    """
+    settle = TENANT_ROUTES_REFRESH_SECONDS + 5 if settle_seconds is None else settle_seconds
+    with engine.connect() as conn:
+        garage = conn.execute(select(Garage.shard, Garage.moving).where(Garage.id == garage_id)).first()
+    if garage is None:
+        raise ValueError(f"Garage {garage_id} not found")
+    if garage.moving:
+        raise ValueError(f"Garage {garage_id} is already moving")
+    source, target = tenant_router.shard(garage.shard), tenant_router.shard(target_name)
+    if source is target:
+        raise ValueError(f"Garage {garage_id} is already on {target.name}")
+    if target is not tenant_router.directory:
+        prepare_shard(target)
+
+    logger.info("Moving garage %d from %s to %s: copying", garage_id, source.name, target.name)
+    _copy_garage(source.engine, target.engine, garage_id, batch_size)
+
+    # From here writes for the garage answer 503 until the route switches
+    _set_route(garage_id, moving=True)
+    time.sleep(settle)
+    try:
+        counts = _copy_garage(source.engine, target.engine, garage_id, batch_size, final=True)
+        _set_route(garage_id, shard=None if target is tenant_router.directory else target.name, moving=False)
+    except Exception:
+        _set_route(garage_id, moving=False)
+        raise
+    logger.info("Garage %d now served from %s", garage_id, target.name)
+
+    # Workers that haven't refreshed their routes may still read the source
+    time.sleep(settle)
+    _delete_garage(source.engine, garage_id)
+    reconcile_chain_totals(source.engine)
+    reconcile_chain_totals(target.engine)
+    return counts
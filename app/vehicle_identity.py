@@ -0,0 +1,246 @@
+"""Vehicle identity: normalized lookup keys, a cached resolver and deduplication.
+
+Registration numbers and VINs are typed by hand, so "KAA 123B", "kaa123b" and
+"KAA-123B" must all find the same vehicle. Vehicles carry normalized copies of
+both identifiers (``registration_key``/``vin_key``, uppercase alphanumerics
+only) under unique indexes, and every endpoint that looks a vehicle up by
+registration or VIN goes through the resolver here.
+
+The resolver keeps a per-process LRU map from lookup key to vehicle id, so a
+repeat lookup is a primary-key ``Session.get`` (often served from the identity
+map). Entries are checked against the loaded row and dropped when stale, e.g.
+after the vehicle was merged away by another process.
+
+``dedupe_vehicles`` fills in missing keys (rows written before the keys
+existed, or by bulk loaders that bypass the ORM) and merges vehicles whose
+keys collide into the oldest one, repointing their jobs, service orders,
+appointments and service history.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, engine
+from app.models import Appointment, Job, ServiceForecast, ServiceHistory, ServiceOrder, Vehicle, archived_jobs
+
+VEHICLE_CACHE_SIZE = int(os.getenv("VEHICLE_CACHE_SIZE", "10000"))
+
+_NON_ALNUM = re.compile(r"[^0-9A-Za-z]+")
+
+# Optional attributes copied from a duplicate onto the surviving vehicle when it has none
+_FILL_IN_FIELDS = ("make", "model", "year")
+
+
+def normalize_identifier(value: Optional[str]) -> Optional[str]:
+    """Uppercase alphanumerics only; None for empty input."""
+    if value is None:
+        return None
+    return _NON_ALNUM.sub("", value).upper() or None
+
+
+class VehicleResolver:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._ids: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, cache_key: tuple[str, str]) -> Optional[int]:
+        with self._lock:
+            vehicle_id = self._ids.get(cache_key)
+            if vehicle_id is not None:
+                self._ids.move_to_end(cache_key)
+            return vehicle_id
+
+    def _remember(self, cache_key: tuple[str, str], vehicle_id: int) -> None:
+        with self._lock:
+            self._ids[cache_key] = vehicle_id
+            self._ids.move_to_end(cache_key)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def forget(self, *vehicle_ids: int) -> None:
+        ids = set(vehicle_ids)
+        with self._lock:
+            for cache_key in [k for k, v in self._ids.items() if v in ids]:
+                del self._ids[cache_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+
+    def _lookup(self, db: Session, key_attr: str, key: str) -> Optional[Vehicle]:
+        cache_key = (key_attr, key)
+        vehicle_id = self._cached(cache_key)
+        if vehicle_id is not None:
+            vehicle = db.get(Vehicle, vehicle_id)
+            if vehicle is not None and getattr(vehicle, key_attr) == key:
+                return vehicle
+            with self._lock:
+                self._ids.pop(cache_key, None)
+
+        vehicle = db.query(Vehicle).filter(getattr(Vehicle, key_attr) == key).first()
+        if vehicle is not None:
+            self._remember(cache_key, vehicle.id)
+        return vehicle
+
+    def find(self, db: Session, registration_number: Optional[str] = None, vin: Optional[str] = None) -> Optional[Vehicle]:
+        """Find a vehicle by registration, then by VIN."""
+        registration_key = normalize_identifier(registration_number)
+        if registration_key:
+            vehicle = self._lookup(db, "registration_key", registration_key)
+            if vehicle is not None:
+                return vehicle
+        vin_key = normalize_identifier(vin)
+        if vin_key:
+            return self._lookup(db, "vin_key", vin_key)
+        return None
+
+    def get_or_create(
+        self,
+        db: Session,
+        registration_number: Optional[str] = None,
+        vin: Optional[str] = None,
+        **defaults,
+    ) -> Vehicle:
+        """Return the matching vehicle, creating it (flushed, not committed) if there is none.
+
+        A vehicle first seen by VIN only gets the VIN as its registration
+        number; the real registration replaces it once a job brings one.
+        """
+        vehicle = self.find(db, registration_number, vin)
+        if vehicle is not None:
+            if (registration_number and vehicle.vin_key
+                    and vehicle.registration_key == vehicle.vin_key
+                    and normalize_identifier(registration_number) != vehicle.registration_key):
+                vehicle.registration_number = registration_number
+                db.flush()
+                self._remember(("registration_key", vehicle.registration_key), vehicle.id)
+            return vehicle
+
+        vehicle = Vehicle(registration_number=registration_number or vin, vin=vin, **defaults)
+        try:
+            with db.begin_nested():
+                db.add(vehicle)
+        except IntegrityError:
+            # Another request created it between our lookup and insert
+            vehicle = self.find(db, registration_number, vin)
+            if vehicle is None:
+                raise
+        return vehicle
+
+
+_resolver = VehicleResolver(VEHICLE_CACHE_SIZE)
+
+
+def find_vehicle(db: Session, registration_number: Optional[str] = None, vin: Optional[str] = None) -> Optional[Vehicle]:
+    return _resolver.find(db, registration_number, vin)
+
+
+def get_or_create_vehicle(
+    db: Session,
+    registration_number: Optional[str] = None,
+    vin: Optional[str] = None,
+    **defaults,
+) -> Vehicle:
+    return _resolver.get_or_create(db, registration_number, vin, **defaults)
+
+
+def merge_vehicles(db: Session, survivor: Vehicle, duplicate: Vehicle) -> None:
+    """Move everything attached to ``duplicate`` onto ``survivor`` and delete it."""
+    for model in (Job, ServiceOrder, Appointment, ServiceHistory):
+        db.query(model).filter(model.vehicle_id == duplicate.id).update(
+            {model.vehicle_id: survivor.id}, synchronize_session=False
+        )
+    db.execute(
+        update(archived_jobs).where(archived_jobs.c.vehicle_id == duplicate.id).values(vehicle_id=survivor.id)
+    )
+
+    # History moved, so both forecasts are recomputed on the next forecast run
+    db.query(ServiceForecast).filter(ServiceForecast.vehicle_id.in_([survivor.id, duplicate.id])).delete(
+        synchronize_session=False
+    )
+
+    vin = duplicate.vin
+    fill_in = {field: getattr(duplicate, field) for field in _FILL_IN_FIELDS if getattr(survivor, field) is None}
+    survivor.current_mileage = max(survivor.current_mileage or 0, duplicate.current_mileage or 0)
+
+    # Delete first: vin and the key columns are unique
+    db.delete(duplicate)
+    db.flush()
+
+    for field, value in fill_in.items():
+        setattr(survivor, field, value)
+    if survivor.vin is None and vin is not None:
+        vin_key = normalize_identifier(vin)
+        if not db.query(Vehicle.id).filter(Vehicle.vin_key == vin_key).first():
+            survivor.vin = vin
+    db.flush()
+
+
+def _assign_keys(db: Session, rows: list[Vehicle], field: str, key_attr: str) -> list[int]:
+    """Set ``key_attr`` on rows missing it, merging rows whose key is already taken."""
+    key_column = getattr(Vehicle, key_attr)
+    pending = {row.id: normalize_identifier(getattr(row, field)) for row in rows
+               if getattr(row, key_attr) is None and getattr(row, field) is not None}
+    wanted = {key for key in pending.values() if key}
+    owners = dict(db.query(key_column, Vehicle.id).filter(key_column.in_(wanted))) if wanted else {}
+
+    merged = []
+    for row in rows:
+        if row.id not in pending:
+            continue
+        key = pending[row.id]
+        owner_id = owners.get(key)
+        if key is None or owner_id is None:
+            setattr(row, key_attr, key)
+            if key is not None:
+                owners[key] = row.id
+            continue
+        merge_vehicles(db, db.get(Vehicle, owner_id), row)
+        merged.append(row.id)
+    db.flush()
+    return merged
+
+
+def dedupe_vehicles(batch_size: int = 500, bind=engine) -> int:
+    """Backfill missing lookup keys and merge duplicates. Returns the number of vehicles merged away."""
+    db = SessionLocal(bind=bind)
+    merged_total = 0
+    last_id = 0
+    try:
+        while True:
+            rows = (
+                db.query(Vehicle)
+                .filter(Vehicle.id > last_id)
+                .filter(or_(
+                    and_(Vehicle.registration_key.is_(None), Vehicle.registration_number.isnot(None)),
+                    and_(Vehicle.vin_key.is_(None), Vehicle.vin.isnot(None)),
+                ))
+                .order_by(Vehicle.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            merged = _assign_keys(db, rows, "registration_number", "registration_key")
+            merged_ids = set(merged)
+            remaining = [row for row in rows if row.id not in merged_ids]
+            merged += _assign_keys(db, remaining, "vin", "vin_key")
+            db.commit()
+
+            if merged:
+                _resolver.forget(*merged)
+                merged_total += len(merged)
+        return merged_total
+    finally:
+        db.close()
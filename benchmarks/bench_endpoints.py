@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""Endpoint benchmark suite: replay role-based traffic against the app in-process.
+
+Run from repo root:
+
+    python benchmarks/bench_endpoints.py                      # scratch SQLite
+    python benchmarks/bench_endpoints.py --database-url postgresql://localhost/mototrack_bench --reset
+    python benchmarks/bench_endpoints.py --against origin/main # compare with another commit
+    python benchmarks/bench_endpoints.py --update-baseline    # record a local baseline
+
+Each run seeds a dataset, replays a weighted mix of site manager, technician,
+warehouse and billing traffic through FastAPI's TestClient, and reports
+p50/p95/p99 latency and throughput per route. The script exits non-zero if
+any route's p50 or p95 regresses beyond the tolerance against the reference:
+
+* ``--against REF`` runs the same traffic on commit REF (checked out in a
+  temporary git worktree) and on this tree, alternating for ``--rounds``
+  rounds, and compares each route's best round on either side, so a machine
+  that slows down halfway affects both;
+* otherwise benchmarks/baseline.json (per database backend), recorded on this
+  machine with ``--update-baseline``. Latencies from another machine are not
+  comparable, so the file is not committed.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# The app is imported from --app-root (this checkout by default) once the database URL is set
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Role mix (share of sessions) and per-role request mix (weight, route template).
+ROLE_MIX = {
+    "site_manager": 0.30,
+    "technician": 0.40,
+    "warehouse_manager": 0.15,
+    "billing": 0.15,
+}
+TRAFFIC = {
+    "site_manager": [
+        (6, "GET /jobs/"),
+        (2, "POST /jobs/"),
+        (1, "POST /jobs/{job_id}/assign"),
+        (2, "GET /auth/users"),
+        (1, "POST /auth/token"),
+    ],
+    "technician": [
+        (6, "GET /jobs/"),
+        (2, "PATCH /jobs/{job_id}"),
+        (2, "GET /spare-parts/pending"),
+        (2, "GET /task-actions/"),
+        (1, "POST /auth/token"),
+    ],
+    "warehouse_manager": [
+        (4, "GET /warehouse/items"),
+        (2, "GET /warehouse/items/{item_id}"),
+        (3, "GET /spare-parts/pending"),
+        (1, "POST /auth/token"),
+    ],
+    "billing": [
+        (3, "GET /billing/invoices"),
+        (2, "GET /billing/invoices/{invoice_id}"),
+        (2, "POST /billing/jobs/{job_id}/auto-invoice"),
+        (1, "POST /auth/token"),
+    ],
+}
+PASSWORD = "bench-pass"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay role-based traffic and check latency against a baseline.")
+    parser.add_argument("--database-url", default=None, help="defaults to a scratch SQLite file")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate tables on a non-empty database")
+    parser.add_argument("--garages", type=int, default=2)
+    parser.add_argument("--jobs-per-garage", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression (0.25 = 25%%)")
+    parser.add_argument("--slack-ms", type=float, default=2.0, help="absolute slack added to every threshold")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--against", metavar="REF", help="compare with a run of git commit REF on this machine")
+    parser.add_argument("--rounds", type=int, default=3, help="alternating runs per side with --against")
+    parser.add_argument("--app-root", default=ROOT, help=argparse.SUPPRESS)
+    parser.add_argument("--results-out", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class Dataset:
+    """Ids the traffic generator draws from, per garage."""
+
+    def __init__(self):
+        self.users = defaultdict(dict)  # garage_id -> role -> (user_id, email)
+        self.jobs = defaultdict(list)  # garage_id -> job ids
+        self.received_jobs = defaultdict(list)
+        self.technician_jobs = defaultdict(list)
+        self.billing_jobs = defaultdict(list)
+        self.invoices = defaultdict(list)
+        self.items = []
+        self.registration_counter = 0
+
+
+def _known_columns(table, rows: list[dict]) -> list[dict]:
+    """Drop keys the table lacks, so older commits can be seeded for --against runs."""
+    names = set(table.c.keys())
+    return [{key: value for key, value in row.items() if key in names} for row in rows]
+
+
+def seed(garages: int, jobs_per_garage: int, billing_jobs: int, rng: random.Random) -> Dataset:
+    from app.auth import get_password_hash
+    from app.database import engine
+    from app.models import (
+        Garage, Invoice, InvoiceItem, Job, JobStatus, JobTaskAction, OperationsStream, RevenueStream,
+        TaskAction, User, Vehicle, WarehouseItem,
+    )
+
+    data = Dataset()
+    now = datetime.utcnow()
+    password_hash = get_password_hash(PASSWORD)
+    streams = list(OperationsStream)
+    background_statuses = [s for s in JobStatus if s not in (JobStatus.BILLING, JobStatus.INVOICED)]
+
+    with engine.begin() as conn:
+        task_action_ids = [
+            conn.execute(TaskAction.__table__.insert().values(
+                operations_stream=stream.name, name=f"{stream.value} check", description="",
+                default_labor_cost=25.0, is_active=True,
+            )).inserted_primary_key[0]
+            for stream in streams
+        ]
+        conn.execute(WarehouseItem.__table__.insert(), [
+            {"name": f"Part {i}", "part_number": f"BP-{i:05d}", "description": "", "quantity_in_stock": 10_000,
+             "unit_price": round(rng.uniform(2, 200), 2), "reorder_level": 10, "is_active": True}
+            for i in range(500)
+        ])
+        data.items = [row.id for row in conn.execute(WarehouseItem.__table__.select())]
+
+        # Explicit ids let jobs, vehicles and invoices reference each other in one bulk pass.
+        vehicle_id = job_id = invoice_id = 0
+        for g in range(garages):
+            garage_id = conn.execute(Garage.__table__.insert().values(
+                name=f"Bench Garage {g}", address="",
+            )).inserted_primary_key[0]
+            for role in ROLE_MIX:
+                email = f"{role}.{g}@bench.local"
+                user_id = conn.execute(User.__table__.insert().values(
+                    email=email, hashed_password=password_hash, role=role, garage_id=garage_id,
+                )).inserted_primary_key[0]
+                data.users[garage_id][role] = (user_id, email)
+            site_manager_id = data.users[garage_id]["site_manager"][0]
+            technician_id = data.users[garage_id]["technician"][0]
+
+            vehicles, jobs, task_rows, invoices, invoice_items = [], [], [], [], []
+            per_garage_billing = billing_jobs // garages + 1
+            for n in range(jobs_per_garage + per_garage_billing):
+                vehicle_id += 1
+                job_id += 1
+                vehicles.append({
+                    "id": vehicle_id, "registration_number": f"BENCH {vehicle_id:07d}",
+                    "registration_key": f"BENCH{vehicle_id:07d}", "owner_name": "Owner",
+                    "owner_contact": "0700000000", "current_mileage": rng.randint(0, 200_000),
+                })
+                if n < jobs_per_garage:
+                    status = rng.choice(background_statuses + [JobStatus.INVOICED] * 3)
+                else:
+                    status = JobStatus.BILLING
+                assigned = status not in (JobStatus.RECEIVED, JobStatus.CANCELLED)
+                job = {
+                    "id": job_id, "vehicle_id": vehicle_id, "garage_id": garage_id,
+                    "site_manager_id": site_manager_id, "technician_id": technician_id if assigned else None,
+                    "operations_stream": rng.choice(streams).name, "revenue_stream": RevenueStream.WALK_IN.name,
+                    "status": status.name, "issues_reported": "Customer reports a noise", "work_done": "",
+                    "manager_notes": "", "created_at": now - timedelta(minutes=rng.randint(0, 525_600)),
+                    "invoice_id": None,
+                }
+                if status == JobStatus.INVOICED:
+                    invoice_id += 1
+                    job["invoice_id"] = invoice_id
+                    invoices.append({
+                        "id": invoice_id, "job_id": job_id, "invoice_number": f"BENCH-{invoice_id:08d}",
+                        "subtotal": 100.0, "tax": 16.0, "total": 116.0, "created_at": job["created_at"],
+                        "paid": rng.random() < 0.7,
+                    })
+                    invoice_items.append({
+                        "invoice_id": invoice_id, "warehouse_item_id": None, "description": "Labor",
+                        "quantity": 1, "unit_price": 100.0, "total": 100.0, "item_type": "labor",
+                    })
+                    data.invoices[garage_id].append(invoice_id)
+                elif status == JobStatus.BILLING:
+                    task_rows.append({
+                        "job_id": job_id, "task_action_id": rng.choice(task_action_ids), "labor_cost": 40.0,
+                        "notes": "", "completed": True,
+                    })
+                    data.billing_jobs[garage_id].append(job_id)
+                elif status == JobStatus.RECEIVED:
+                    data.received_jobs[garage_id].append(job_id)
+                elif status == JobStatus.IN_PROGRESS:
+                    data.technician_jobs[garage_id].append(job_id)
+                data.jobs[garage_id].append(job_id)
+                jobs.append(job)
+
+            conn.execute(Vehicle.__table__.insert(), _known_columns(Vehicle.__table__, vehicles))
+            if invoices:
+                conn.execute(Invoice.__table__.insert(), invoices)
+                conn.execute(InvoiceItem.__table__.insert(), invoice_items)
+            conn.execute(Job.__table__.insert(), jobs)
+            if task_rows:
+                conn.execute(JobTaskAction.__table__.insert(), task_rows)
+
+        if conn.dialect.name == "postgresql":
+            # Explicit ids do not advance SERIAL sequences; move them past the seeded rows.
+            for table in ("vehicles", "jobs", "invoices"):
+                conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                )
+    return data
+
+
+def build_request(route: str, garage_id: int, data: Dataset, rng: random.Random):
+    """Turn a route template into (method, url, kwargs), or None if the pool is exhausted."""
+    method, template = route.split(" ", 1)
+    if template == "/jobs/" and method == "POST":
+        data.registration_counter += 1
+        return method, template, {"json": {
+            "registration_number": f"NEW {garage_id}-{data.registration_counter:06d}", "owner_name": "Walk-in",
+            "owner_contact": "0711111111", "operations_stream": "mechanical_works", "revenue_stream": "walk_in",
+            "issues_reported": "Brake squeal",
+        }}
+    if template == "/jobs/{job_id}/assign":
+        pool = data.received_jobs[garage_id] or data.jobs[garage_id]
+        technician_id = data.users[garage_id]["technician"][0]
+        return method, f"/jobs/{rng.choice(pool)}/assign", {"json": {"technician_id": technician_id}}
+    if template == "/jobs/{job_id}":
+        if not data.technician_jobs[garage_id]:
+            return None
+        return method, f"/jobs/{rng.choice(data.technician_jobs[garage_id])}", {"json": {"work_done": "Checked"}}
+    if template == "/auth/users":
+        return method, "/auth/users?role=technician", {}
+    if template == "/auth/token":
+        role = rng.choice(list(ROLE_MIX))
+        return method, template, {"data": {"username": data.users[garage_id][role][1], "password": PASSWORD}}
+    if template == "/warehouse/items/{item_id}":
+        return method, f"/warehouse/items/{rng.choice(data.items)}", {}
+    if template == "/billing/invoices/{invoice_id}":
+        if not data.invoices[garage_id]:
+            return None
+        return method, f"/billing/invoices/{rng.choice(data.invoices[garage_id])}", {}
+    if template == "/billing/jobs/{job_id}/auto-invoice":
+        if not data.billing_jobs[garage_id]:
+            return None
+        return method, f"/billing/jobs/{data.billing_jobs[garage_id].pop()}/auto-invoice?tax_rate=16", {}
+    return method, template, {}
+
+
+def run_traffic(client, data: Dataset, total: int, rng: random.Random) -> tuple[dict, float]:
+    from app.auth import create_access_token
+
+    tokens = {
+        (garage_id, role): {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+        for garage_id, roles in data.users.items()
+        for role, (user_id, _) in roles.items()
+    }
+    roles, role_weights = zip(*ROLE_MIX.items())
+    garages = list(data.users)
+    samples = defaultdict(list)
+    started = time.perf_counter()
+    sent = 0
+    while sent < total:
+        role = rng.choices(roles, role_weights)[0]
+        garage_id = rng.choice(garages)
+        weights, routes = zip(*TRAFFIC[role])
+        route = rng.choices(routes, weights)[0]
+        built = build_request(route, garage_id, data, rng)
+        if built is None:
+            continue
+        method, url, kwargs = built
+        t0 = time.perf_counter()
+        response = client.request(method, url, headers=tokens[(garage_id, role)], **kwargs)
+        elapsed = time.perf_counter() - t0
+        if response.status_code >= 400:
+            raise SystemExit(f"{method} {url} as {role} -> {response.status_code}: {response.text[:200]}")
+        samples[route].append(elapsed * 1000)
+        sent += 1
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples: dict, wall_seconds: float) -> dict:
+    return {
+        route: {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "rps": round(len(values) / wall_seconds, 2),
+        }
+        for route, values in sorted(samples.items())
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, slack_ms: float) -> list:
+    regressions = []
+    for route, stats in results.items():
+        reference = baseline.get(route)
+        if not reference:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            limit = reference[key] * (1 + tolerance) + slack_ms
+            if stats[key] > limit:
+                regressions.append(f"{route}: {key} {stats[key]:.1f} > {limit:.1f} (baseline {reference[key]:.1f})")
+    return regressions
+
+
+def run_tree(args, tree: str) -> dict:
+    """Run the traffic on the app checked out at ``tree`` in a fresh process and return its results."""
+    with tempfile.TemporaryDirectory(prefix="mototrack-bench-") as workdir:
+        out = os.path.join(workdir, "results.json")
+        command = [
+            sys.executable, os.path.abspath(__file__), "--app-root", tree, "--results-out", out,
+            "--garages", str(args.garages), "--jobs-per-garage", str(args.jobs_per_garage),
+            "--requests", str(args.requests), "--seed", str(args.seed),
+        ]
+        if args.database_url:
+            command += ["--database-url", args.database_url, "--reset"]
+        if subprocess.run(command).returncode != 0:
+            raise SystemExit(f"Run on {tree} failed")
+        with open(out) as fh:
+            return json.load(fh)
+
+
+def best_of(runs: list) -> dict:
+    """Per route, the lowest latencies seen in any run."""
+    best = {}
+    for results in runs:
+        for route, stats in results.items():
+            if route not in best:
+                best[route] = dict(stats)
+                continue
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                best[route][key] = min(best[route][key], stats[key])
+            best[route]["rps"] = max(best[route]["rps"], stats["rps"])
+    return best
+
+
+def run_against(args) -> tuple[dict, dict]:
+    """(reference, current) best-of-rounds results, alternating between commit ``args.against`` and this tree."""
+    workdir = tempfile.mkdtemp(prefix="mototrack-bench-ref-")
+    tree = os.path.join(workdir, "tree")
+    subprocess.run(["git", "-C", ROOT, "worktree", "add", "--detach", "--quiet", tree, args.against], check=True)
+    reference, current = [], []
+    try:
+        for round_number in range(1, args.rounds + 1):
+            print(f"Round {round_number}/{args.rounds}, reference run on {args.against}:")
+            reference.append(run_tree(args, tree))
+            print(f"Round {round_number}/{args.rounds}, current tree:")
+            current.append(run_tree(args, args.app_root))
+    finally:
+        subprocess.run(["git", "-C", ROOT, "worktree", "remove", "--force", tree], check=False)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return best_of(reference), best_of(current)
+
+
+def print_results(results: dict) -> None:
+    print(f"{'route':42} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for route, stats in results.items():
+        print(f"{route:42} {stats['count']:6d} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} "
+              f"{stats['p99_ms']:9.2f} {stats['rps']:8.1f}")
+
+
+def report(regressions: list) -> None:
+    if regressions:
+        print("REGRESSIONS:")
+        for line in regressions:
+            print(f"  {line}")
+        raise SystemExit(1)
+    print("No regressions against baseline.")
+
+
+def main() -> None:
+    args = parse_args()
+    if args.against and args.update_baseline:
+        raise SystemExit("--against compares with another commit; it does not record a baseline")
+    if args.against:
+        reference, results = run_against(args)
+        print(f"Best of {args.rounds} rounds, reference {args.against}:")
+        print_results(reference)
+        print(f"Best of {args.rounds} rounds, current tree:")
+        print_results(results)
+        report(compare(results, reference, args.tolerance, args.slack_ms))
+        return
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='mototrack-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = url
+    sys.path.insert(0, args.app_root)
+    os.chdir(args.app_root)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import inspect
+
+    from app.database import Base, engine, init_db
+    from main import app
+
+    backend = engine.dialect.name
+    if inspect(engine).has_table("jobs"):
+        if not args.reset:
+            raise SystemExit("Target database already has tables; pass --reset to drop them (bench databases only).")
+        Base.metadata.drop_all(bind=engine)
+    init_db()
+
+    rng = random.Random(args.seed)
+    data = seed(args.garages, args.jobs_per_garage, args.requests, rng)
+
+    with TestClient(app) as client:
+        samples, wall = run_traffic(client, data, args.requests, rng)
+    results = summarize(samples, wall)
+
+    print(f"backend={backend} requests={args.requests} wall={wall:.2f}s throughput={args.requests / wall:.1f} req/s")
+    print_results(results)
+
+    if args.results_out:
+        with open(args.results_out, "w") as fh:
+            json.dump(results, fh)
+        return
+
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            stored = json.load(fh)
+
+    if args.update_baseline:
+        stored[backend] = results
+        with open(args.baseline, "w") as fh:
+            json.dump(stored, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Baseline for {backend} written to {args.baseline}")
+        return
+
+    if backend not in stored:
+        print(f"No stored baseline for {backend}; pass --against REF, or record one with --update-baseline.")
+        return
+    report(compare(results, stored[backend], args.tolerance, args.slack_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Compare the default and fast (fast=true) serialization paths of list endpoints.
+
+Run from repo root: python benchmarks/bench_serialization.py [--rows 5000] [--repeat 20]
+
+Uses a throwaway SQLite database, seeds it with Core bulk inserts and calls
+the endpoints in-process through FastAPI's TestClient.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Repo root on path; point the app at a scratch database before importing it
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+_tmpdir = tempfile.mkdtemp(prefix="mototrack-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/bench.db"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.database import engine, init_db  # noqa: E402
+from app.models import (  # noqa: E402
+    Garage, Invoice, InvoiceItem, Job, JobStatus, OperationsStream, RequestStatus, RevenueStream,
+    SparePartRequest, User, Vehicle, WarehouseItem,
+)
+from main import app  # noqa: E402
+
+
+def seed(rows: int) -> dict:
+    init_db()
+    now = datetime.utcnow()
+    streams = list(OperationsStream)
+    statuses = list(JobStatus)
+    with engine.begin() as conn:
+        garage_id = conn.execute(Garage.__table__.select().where(Garage.name == "Main")).first().id
+        users = {}
+        for role in ("site_manager", "billing", "workshop_manager"):
+            users[role] = conn.execute(User.__table__.insert().values(
+                email=f"{role}@bench.local", hashed_password="x", role=role, garage_id=garage_id,
+            )).inserted_primary_key[0]
+        conn.execute(WarehouseItem.__table__.insert(), [
+            {"id": i, "name": f"Part {i}", "part_number": f"P{i}", "description": "", "quantity_in_stock": 100,
+             "unit_price": 9.5, "reorder_level": 5, "is_active": True}
+            for i in range(1, 51)
+        ])
+        conn.execute(Vehicle.__table__.insert(), [
+            {"id": i, "registration_number": f"KAA {i:05d}", "owner_name": "Owner", "owner_contact": "000",
+             "current_mileage": 0}
+            for i in range(1, rows + 1)
+        ])
+        conn.execute(Job.__table__.insert(), [
+            {"id": i, "vehicle_id": i, "garage_id": garage_id, "site_manager_id": users["site_manager"],
+             "operations_stream": streams[i % len(streams)].name, "revenue_stream": RevenueStream.WALK_IN.name,
+             "status": statuses[i % len(statuses)].name, "issues_reported": "Noise from front axle",
+             "work_done": "", "manager_notes": "", "created_at": now - timedelta(minutes=i)}
+            for i in range(1, rows + 1)
+        ])
+        conn.execute(Invoice.__table__.insert(), [
+            {"id": i, "job_id": i, "invoice_number": f"INV-{i:07d}", "subtotal": 100.0, "tax": 16.0,
+             "total": 116.0, "created_at": now - timedelta(minutes=i), "paid": False}
+            for i in range(1, rows + 1)
+        ])
+        conn.execute(InvoiceItem.__table__.insert(), [
+            {"invoice_id": i, "warehouse_item_id": (i % 50) + 1, "description": "Part", "quantity": 1,
+             "unit_price": 50.0, "total": 50.0, "item_type": "part" if n else "labor"}
+            for i in range(1, rows + 1) for n in range(2)
+        ])
+        conn.execute(SparePartRequest.__table__.insert(), [
+            {"job_id": i, "warehouse_item_id": (i % 50) + 1, "quantity": 1, "status": RequestStatus.PENDING.name,
+             "requested_by_id": users["site_manager"], "requested_at": now - timedelta(minutes=i), "notes": ""}
+            for i in range(1, rows + 1)
+        ])
+    return {role: {"Authorization": f"Bearer {create_access_token({'sub': str(uid)})}"} for role, uid in users.items()}
+
+
+def timed(client: TestClient, url: str, headers: dict, repeat: int) -> tuple[list, object]:
+    samples = []
+    body = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        samples.append(time.perf_counter() - start)
+        response.raise_for_status()
+        body = response.json()
+    return samples, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    headers = seed(args.rows)
+    endpoints = [
+        ("/jobs/", headers["site_manager"]),
+        ("/billing/invoices", headers["billing"]),
+        ("/spare-parts/pending", headers["workshop_manager"]),
+    ]
+
+    print(f"rows={args.rows} repeat={args.repeat}")
+    print(f"{'endpoint':24} {'default ms':>12} {'fast ms':>12} {'speedup':>8}")
+    with TestClient(app) as client:
+        for url, auth in endpoints:
+            default, default_body = timed(client, url, auth, args.repeat)
+            fast, fast_body = timed(client, f"{url}?fast=true", auth, args.repeat)
+            if default_body != fast_body:
+                raise SystemExit(f"{url}: fast path payload differs from default path")
+            default_ms = statistics.median(default) * 1000
+            fast_ms = statistics.median(fast) * 1000
+            print(f"{url:24} {default_ms:12.1f} {fast_ms:12.1f} {default_ms / fast_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
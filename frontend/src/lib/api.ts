@@ -169,6 +169,8 @@ export const api = {
   addTaskToJob: (job_id: number, payload: any) => request(`/task-actions/jobs/${job_id}/add-task`, { method: 'POST', body: JSON.stringify(payload) }),
   listJobTasks: (job_id: number) => request(`/task-actions/jobs/${job_id}/tasks`),
   completeJobTask: (job_id: number, task_id: number) => request(`/task-actions/jobs/${job_id}/tasks/${task_id}/complete`, { method: 'PATCH' }),
+  // Role dashboards: everything a role's page loads, one request
+  dashboard: (role: 'site-manager' | 'workshop-manager' | 'warehouse-manager' | 'billing' | 'technician') => request<any>(`/dashboard/${role}`),
   // Users (for technician list)
   listUsers: (role?: string) => request(`/auth/users${role ? `?role=${role}` : ''}`),
 };
@@ -14,12 +14,9 @@ export default function Billing() {
 
   const loadData = async () => {
     try {
-      const [jobs, invoicesData] = await Promise.all([
-        api.listJobs({ status: 'billing' }),
-        api.listInvoices()
-      ])
-      setBillingJobs(jobs as any)
-      setInvoices(invoicesData as any)
+      const dashboard = await api.dashboard('billing')
+      setBillingJobs(dashboard.billing_jobs.data)
+      setInvoices(dashboard.invoices.data)
     } catch (err: any) {
       setMsg(err.message)
     }
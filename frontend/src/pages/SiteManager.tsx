@@ -28,12 +28,9 @@ export default function SiteManager() {
 
   const loadData = async () => {
     try {
-      const [jobsData, techsData] = await Promise.all([
-        api.listJobs(),
-        api.listUsers('technician')
-      ])
-      setJobs(jobsData as any[])
-      setTechnicians((techsData as any[]) || [])
+      const dashboard = await api.dashboard('site-manager')
+      setJobs(dashboard.jobs.data)
+      setTechnicians(dashboard.technicians.data || [])
     } catch (err: any) {
       setMsg(err.message)
     }
@@ -27,8 +27,8 @@ export default function Technician() {
 
   const loadJobs = async () => {
     try {
-      const data = await api.listJobs({ status: 'assigned' })
-      setJobs(data as any)
+      const dashboard = await api.dashboard('technician')
+      setJobs(dashboard.jobs.data.filter((j: any) => j.status === 'assigned'))
     } catch (err: any) {
       setMsg(err.message)
     }
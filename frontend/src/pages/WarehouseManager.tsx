@@ -23,14 +23,10 @@ export default function WarehouseManager() {
 
   const loadData = async () => {
     try {
-      const [itemsData, requests, lowStock] = await Promise.all([
-        api.listWarehouseItems(true),
-        api.listPendingRequests(),
-        api.listLowStockItems()
-      ])
-      setItems(itemsData as any)
-      setApprovedRequests((requests as any[]).filter((r: any) => r.status === 'approved'))
-      setLowStockItems(lowStock as any)
+      const dashboard = await api.dashboard('warehouse-manager')
+      setItems(dashboard.items.data)
+      setApprovedRequests(dashboard.approved_requests.data)
+      setLowStockItems(dashboard.low_stock.data)
     } catch (err: any) {
       setMsg(err.message)
     }
@@ -12,12 +12,9 @@ export default function WorkshopManager() {
 
   const loadData = async () => {
     try {
-      const [requests, jobs] = await Promise.all([
-        api.listPendingRequests(),
-        api.listJobs({ status: 'completed' })
-      ])
-      setPendingRequests((requests as any[]).filter((r: any) => r.status === 'pending'))
-      setCompletedJobs(jobs as any)
+      const dashboard = await api.dashboard('workshop-manager')
+      setPendingRequests(dashboard.pending_requests.data)
+      setCompletedJobs(dashboard.completed_jobs.data)
     } catch (err: any) {
       setMsg(err.message)
     }
@@ -1,19 +1,41 @@
+# Imported first so the startup report covers every import below
+from app.import_clock import IMPORT_STARTED
+
+import logging
 import os
-from fastapi import FastAPI
+import sys
+import time
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import init_db
-from app.scheduler import get_scheduler, start_scheduler, shutdown_scheduler
+from app.database import engine, init_db
+from app.metrics import STARTUP_DURATION, MetricsMiddleware, render_latest, watch_engine
+from app.sql_instrumentation import SQLInstrumentationMiddleware, install as install_sql_instrumentation
+from app.profiling import ProfilingMiddleware
+from app.idempotency import IdempotencyMiddleware
+from app.invoice_documents import shutdown_render_pool
 from app.routers.orders import router as orders_router
 from app.routers.appointments import router as appointments_router
 from app.routers.auth import router as auth_router
 from app.routers.garages import router as garages_router
-from app.routers import jobs, spare_parts, warehouse, billing, task_actions
+from app.routers import jobs, spare_parts, warehouse, billing, task_actions, profiles, reminder_policies, dashboard
+from app.routers import job_events
+
+# Schema creation and seeding run once per deploy (python scripts/bootstrap.py),
+# not in every worker. INIT_DB_ON_STARTUP=1 restores the old behaviour for local use.
+INIT_DB_ON_STARTUP = os.getenv("INIT_DB_ON_STARTUP", "0") == "1"
+# Only one process needs to deliver reminders; set RUN_SCHEDULER=0 on the others.
+RUN_SCHEDULER = os.getenv("RUN_SCHEDULER", "1") == "1"
+
+# uvicorn configures this logger, so the startup report shows up in its output.
+logger = logging.getLogger("uvicorn.error")
 
 app = FastAPI(title="MotoTrack Service Assistant", version="0.1.0")
 
 raw_origins = os.getenv("CORS_ORIGINS", "*")
 allow_origins = ["*"] if raw_origins.strip() == "*" else [origin.strip() for origin in raw_origins.split(",") if origin.strip()]
 
+# Innermost, so replayed responses still get CORS headers and show up in metrics
+app.add_middleware(IdempotencyMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
@@ -22,6 +44,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(SQLInstrumentationMiddleware)
+app.add_middleware(MetricsMiddleware)
+watch_engine(engine)
+install_sql_instrumentation(engine)
+
 app.include_router(orders_router, prefix="/orders", tags=["orders"])
 app.include_router(appointments_router, prefix="/appointments", tags=["appointments"])
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
@@ -31,21 +59,55 @@ app.include_router(spare_parts.router)
 app.include_router(warehouse.router)
 app.include_router(billing.router)
 app.include_router(task_actions.router)
+app.include_router(profiles.router)
+app.include_router(reminder_policies.router)
+app.include_router(dashboard.router)
+app.include_router(job_events.router)
+
+import_seconds = time.perf_counter() - IMPORT_STARTED
+STARTUP_DURATION.labels(phase="import").set(import_seconds)
 
 
 @app.on_event("startup")
 async def on_startup() -> None:
-    init_db()
-    scheduler = get_scheduler()
-    start_scheduler(scheduler)
+    started = time.perf_counter()
+    if INIT_DB_ON_STARTUP:
+        init_db()
+    if RUN_SCHEDULER:
+        # APScheduler is only imported by the process that runs it.
+        from app.scheduler import get_scheduler, start_scheduler
+
+        start_scheduler(get_scheduler())
+
+    hooks_seconds = time.perf_counter() - started
+    total_seconds = time.perf_counter() - IMPORT_STARTED
+    STARTUP_DURATION.labels(phase="startup_hooks").set(hooks_seconds)
+    STARTUP_DURATION.labels(phase="total").set(total_seconds)
+    logger.info(
+        "Startup: app import %.0fms, startup hooks %.0fms, ready after %.0fms (init_db=%s, scheduler=%s)",
+        import_seconds * 1000,
+        hooks_seconds * 1000,
+        total_seconds * 1000,
+        "on" if INIT_DB_ON_STARTUP else "off",
+        "on" if RUN_SCHEDULER else "off",
+    )
 
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
-    scheduler = get_scheduler()
-    shutdown_scheduler(scheduler)
+    if "app.scheduler" in sys.modules:
+        from app.scheduler import get_scheduler, shutdown_scheduler
+
+        shutdown_scheduler(get_scheduler())
+    shutdown_render_pool()
 
 
 @app.get("/healthz")
 async def healthz() -> dict:
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""One-shot database bootstrap: create the schema and seed required rows.
+
+Run once per deploy, before starting the API workers (which no longer do this
+themselves):
+
+    python scripts/bootstrap.py               # schema + "Main" garage
+    python scripts/bootstrap.py --demo-users  # also upsert the demo logins
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.chdir(ROOT)
+
+from app.database import init_db  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--demo-users", action="store_true", help="also create the demo users (see DEMO_LOGIN.md)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    init_db()
+    print(f"OK: schema and seed data in place ({(time.perf_counter() - started) * 1000:.0f}ms).")
+
+    if args.demo_users:
+        import seed_demo_users
+
+        seed_demo_users.main()
+
+
+if __name__ == "__main__":
+    main()
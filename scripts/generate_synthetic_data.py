@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""Bulk-load synthetic data for load and capacity testing.
+
+Run from repo root:
+
+    python scripts/generate_synthetic_data.py --jobs 100000
+    DATABASE_URL=postgresql://localhost/mototrack_load python scripts/generate_synthetic_data.py --jobs 1000000
+
+Output is deterministic for a given --seed and --end-date. Rows are appended
+after the current max id of each table, so the script can be run against a
+database that already holds data. SQLite (and other backends) load through
+Core executemany inserts; Postgres loads through COPY FROM STDIN.
+"""
+
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Repo root on path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.chdir(ROOT)
+
+from sqlalchemy import func, select, text  # noqa: E402
+
+from app.availability import service_duration  # noqa: E402
+from app.database import engine, init_db  # noqa: E402
+from app.models import (  # noqa: E402
+    Appointment, Garage, Invoice, InvoiceItem, Job, JobStatus, JobTaskAction, OperationsStream, Reminder,
+    RequestStatus, RevenueStream, ServiceHistory, SparePartRequest, StockLocation, TaskAction, User, Vehicle,
+    WarehouseItem,
+)
+
+STAFF_ROLES = ["site_manager", "technician", "technician", "technician", "workshop_manager",
+               "warehouse_manager", "billing"]
+SERVICE_TYPES = ["service", "repair", "inspection", "wash", "tyres"]
+ISSUES = ["Engine noise", "Brake squeal", "Battery drain", "Dented door", "AC not cooling",
+          "Check engine light", "Oil leak", "Torn seat", "Headlight out", "Suspension knock"]
+PARTS = ["Oil filter", "Air filter", "Brake pad set", "Spark plug", "Battery", "Wiper blade",
+         "Headlight bulb", "Timing belt", "Clutch kit", "Radiator hose"]
+
+# Job statuses in lifecycle order; anything at or past COMPLETED has finished work.
+LIFECYCLE = list(JobStatus)
+FINISHED = {JobStatus.COMPLETED, JobStatus.MANAGER_REVIEW, JobStatus.BILLING, JobStatus.INVOICED}
+
+# Load order respects foreign keys (jobs.invoice_id is back-filled after invoices).
+TABLES = [Garage, User, WarehouseItem, StockLocation, TaskAction, Vehicle, Job, JobTaskAction, SparePartRequest,
+          Invoice, InvoiceItem, Appointment, Reminder, ServiceHistory]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk-load deterministic synthetic data.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today(),
+                        help="anchor for generated timestamps (ISO date); fixes output together with --seed")
+    parser.add_argument("--days", type=int, default=730, help="history window ending at --end-date")
+    parser.add_argument("--garages", type=int, default=10)
+    parser.add_argument("--staff-per-garage", type=int, default=14)
+    parser.add_argument("--vehicles", type=int, default=None, help="defaults to jobs / 2")
+    parser.add_argument("--jobs", type=int, default=100_000)
+    parser.add_argument("--warehouse-items", type=int, default=2_000)
+    parser.add_argument("--task-actions-per-stream", type=int, default=15)
+    parser.add_argument("--tasks-per-job", type=float, default=1.5, help="average JobTaskAction rows per job")
+    parser.add_argument("--parts-per-job", type=float, default=0.8, help="average SparePartRequest rows per job")
+    parser.add_argument("--appointments", type=int, default=None, help="defaults to jobs / 4")
+    parser.add_argument("--history-per-vehicle", type=int, default=2, help="max ServiceHistory rows per vehicle")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    return parser.parse_args()
+
+
+class BulkWriter:
+    """Buffer rows per table and flush them in FK order with executemany or COPY."""
+
+    def __init__(self, conn, chunk_size: int):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.use_copy = conn.dialect.name == "postgresql"
+        self.buffers = {model.__table__.name: [] for model in TABLES}
+        self.counts = dict.fromkeys(self.buffers, 0)
+
+    def add(self, model, row: dict) -> None:
+        buffer = self.buffers[model.__table__.name]
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        # Parents first so each chunk satisfies FKs on backends that check them immediately.
+        for model in TABLES:
+            table = model.__table__
+            rows = self.buffers[table.name]
+            if not rows:
+                continue
+            if self.use_copy:
+                self._copy(table, rows)
+            else:
+                self.conn.execute(table.insert(), rows)
+            self.counts[table.name] += len(rows)
+            self.buffers[table.name] = []
+
+    def _copy(self, table, rows: list) -> None:
+        columns = list(rows[0])
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([_copy_value(row[c]) for c in columns])
+        buf.seek(0)
+        cursor = self.conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf
+            )
+        finally:
+            cursor.close()
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (OperationsStream, RevenueStream, JobStatus, RequestStatus)):
+        # SQLAlchemy Enum columns store member names
+        return value.name
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def next_ids(conn) -> dict:
+    return {
+        model.__table__.name: (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+        for model in TABLES
+    }
+
+
+def generate(conn, args) -> dict:
+    rng = random.Random(args.seed)
+    end = datetime.combine(args.end_date, datetime.min.time())
+    window = timedelta(days=args.days).total_seconds()
+    vehicles_total = args.vehicles or max(1, args.jobs // 2)
+    appointments_total = args.appointments if args.appointments is not None else args.jobs // 4
+    ids = next_ids(conn)
+    ids["invoices_start"] = ids["invoices"]
+    out = BulkWriter(conn, args.chunk_size)
+
+    def moment(max_age_seconds: float = window) -> datetime:
+        return end - timedelta(seconds=rng.random() * max_age_seconds)
+
+    # Reference data -----------------------------------------------------------------------
+    garage_ids = []
+    staff = {}  # garage_id -> role -> [user ids]
+    for g in range(args.garages):
+        garage_id = ids["garages"] + g
+        garage_ids.append(garage_id)
+        out.add(Garage, {"id": garage_id, "name": f"Synthetic Garage {garage_id}",
+                         "address": f"{rng.randint(1, 999)} Industrial Area"})
+        staff[garage_id] = {}
+    user_id = ids["users"]
+    for garage_id in garage_ids:
+        # At least one user per staff role so every job can be fully staffed
+        for n in range(max(args.staff_per_garage, len(STAFF_ROLES))):
+            role = STAFF_ROLES[n % len(STAFF_ROLES)]
+            out.add(User, {"id": user_id, "email": f"user{user_id}@synthetic.local",
+                           "hashed_password": "!synthetic", "role": role, "garage_id": garage_id,
+                           "full_name": f"Staff {user_id}", "phone": f"07{rng.randint(10_000_000, 99_999_999)}"})
+            staff[garage_id].setdefault(role, []).append(user_id)
+            user_id += 1
+
+    item_ids = list(range(ids["warehouse_items"], ids["warehouse_items"] + args.warehouse_items))
+    item_prices = {}
+    for item_id in item_ids:
+        price = round(rng.uniform(2, 400), 2)
+        item_prices[item_id] = price
+        quantity = rng.randint(0, 500)
+        out.add(WarehouseItem, {"id": item_id, "name": f"{rng.choice(PARTS)} #{item_id}",
+                                "part_number": f"SYN-{item_id:07d}", "description": "",
+                                "quantity_in_stock": quantity, "unit_price": price,
+                                "reorder_level": rng.randint(5, 50), "is_active": rng.random() > 0.02})
+        # Each item is stocked at one garage; quantity_in_stock is the chain-wide total
+        out.add(StockLocation, {"garage_id": garage_ids[item_id % len(garage_ids)], "warehouse_item_id": item_id,
+                                "quantity": quantity})
+
+    task_actions = {}  # stream -> [(id, cost)]
+    task_id = ids["task_actions"]
+    for stream in OperationsStream:
+        for n in range(args.task_actions_per_stream):
+            cost = float(rng.randint(10, 300))
+            out.add(TaskAction, {"id": task_id, "operations_stream": stream, "name": f"{stream.value} task {n + 1}",
+                                 "description": "", "default_labor_cost": cost, "is_active": True})
+            task_actions.setdefault(stream, []).append((task_id, cost))
+            task_id += 1
+
+    vehicle_ids = list(range(ids["vehicles"], ids["vehicles"] + vehicles_total))
+    for vehicle_id in vehicle_ids:
+        mileage = rng.randint(1_000, 250_000)
+        out.add(Vehicle, {"id": vehicle_id, "registration_number": f"SYN {vehicle_id:08d}",
+                          "registration_key": f"SYN{vehicle_id:08d}",
+                          "vin": f"SYNV{vehicle_id:013d}", "vin_key": f"SYNV{vehicle_id:013d}",
+                          "owner_name": f"Owner {vehicle_id}",
+                          "owner_contact": f"07{rng.randint(10_000_000, 99_999_999)}", "current_mileage": mileage,
+                          "make": rng.choice(["Toyota", "Nissan", "Subaru", "Mazda", "Isuzu"]),
+                          "model": rng.choice(["A", "B", "C", "D"]), "year": rng.randint(1998, 2025)})
+        last = mileage
+        for _ in range(rng.randint(0, args.history_per_vehicle)):
+            last = max(0, last - rng.randint(5_000, 15_000))
+            out.add(ServiceHistory, {"id": ids["service_history"], "vehicle_id": vehicle_id,
+                                     "date": moment().date(), "mileage": last,
+                                     "service_type": rng.choice(SERVICE_TYPES), "notes": ""})
+            ids["service_history"] += 1
+
+    # Jobs and their children ---------------------------------------------------------------
+    streams = list(OperationsStream)
+    revenue_streams = list(RevenueStream)
+    for job_id in range(ids["jobs"], ids["jobs"] + args.jobs):
+        garage_id = rng.choice(garage_ids)
+        roles = staff[garage_id]
+        status = rng.choice(LIFECYCLE)
+        stream = rng.choice(streams)
+        created_at = moment()
+        assigned = LIFECYCLE.index(status) >= LIFECYCLE.index(JobStatus.ASSIGNED) and status != JobStatus.CANCELLED
+        finished = status in FINISHED
+        out.add(Job, {
+            "id": job_id, "vehicle_id": rng.choice(vehicle_ids), "garage_id": garage_id,
+            "site_manager_id": rng.choice(roles["site_manager"]),
+            "technician_id": rng.choice(roles["technician"]) if assigned else None,
+            "operations_stream": stream, "revenue_stream": rng.choice(revenue_streams), "status": status,
+            "issues_reported": rng.choice(ISSUES), "work_done": "Work completed" if finished else "",
+            "manager_notes": "", "created_at": created_at,
+            "assigned_at": created_at + timedelta(hours=rng.randint(1, 6)) if assigned else None,
+            "completed_at": created_at + timedelta(hours=rng.randint(8, 96)) if finished else None,
+            "invoice_id": None,
+        })
+
+        labor = []
+        for _ in range(_poisson(rng, args.tasks_per_job)):
+            task_action_id, cost = rng.choice(task_actions[stream])
+            out.add(JobTaskAction, {"id": ids["job_task_actions"], "job_id": job_id, "task_action_id": task_action_id,
+                                    "labor_cost": cost, "notes": "", "completed": finished})
+            ids["job_task_actions"] += 1
+            labor.append((task_action_id, cost))
+
+        parts = []
+        if assigned:
+            for _ in range(_poisson(rng, args.parts_per_job)):
+                item_id = rng.choice(item_ids)
+                quantity = rng.randint(1, 4)
+                if finished:
+                    request_status = RequestStatus.COMPLETED
+                elif status == JobStatus.AWAITING_PARTS:
+                    request_status = rng.choice([RequestStatus.PENDING, RequestStatus.APPROVED])
+                else:
+                    request_status = rng.choice(list(RequestStatus))
+                requested_at = created_at + timedelta(hours=rng.randint(1, 12))
+                approved = request_status != RequestStatus.PENDING
+                issued = request_status in (RequestStatus.ISSUED, RequestStatus.COMPLETED)
+                out.add(SparePartRequest, {
+                    "id": ids["spare_part_requests"], "job_id": job_id, "warehouse_item_id": item_id,
+                    "quantity": quantity, "status": request_status, "requested_by_id": rng.choice(roles["technician"]),
+                    "approved_by_id": rng.choice(roles["workshop_manager"]) if approved else None,
+                    "issued_by_id": rng.choice(roles["warehouse_manager"]) if issued else None,
+                    "requested_at": requested_at,
+                    "approved_at": requested_at + timedelta(hours=1) if approved else None,
+                    "issued_at": requested_at + timedelta(hours=3) if issued else None, "notes": "",
+                })
+                ids["spare_part_requests"] += 1
+                if request_status == RequestStatus.COMPLETED:
+                    parts.append((item_id, quantity))
+
+        if status == JobStatus.INVOICED:
+            invoice_id = ids["invoices"]
+            ids["invoices"] += 1
+            lines = [(None, f"Labor: task {task_action_id}", 1, cost, cost, "labor") for task_action_id, cost in labor]
+            lines += [(item_id, f"Part {item_id}", quantity, item_prices[item_id],
+                       round(item_prices[item_id] * quantity, 2), "part") for item_id, quantity in parts]
+            subtotal = round(sum(line[4] for line in lines), 2)
+            tax = round(subtotal * 0.16, 2)
+            invoiced_at = created_at + timedelta(days=rng.randint(1, 7))
+            paid = rng.random() < 0.8
+            out.add(Invoice, {"id": invoice_id, "job_id": job_id, "invoice_number": f"SYN-{invoice_id:09d}",
+                              "subtotal": subtotal, "tax": tax, "total": round(subtotal + tax, 2),
+                              "created_at": invoiced_at, "paid": paid,
+                              "paid_at": invoiced_at + timedelta(days=rng.randint(0, 30)) if paid else None})
+            for item_id, description, quantity, unit_price, total, item_type in lines:
+                out.add(InvoiceItem, {"id": ids["invoice_items"], "invoice_id": invoice_id,
+                                      "warehouse_item_id": item_id, "description": description,
+                                      "quantity": quantity, "unit_price": unit_price, "total": total,
+                                      "item_type": item_type})
+                ids["invoice_items"] += 1
+
+    # Appointments and reminders ------------------------------------------------------------
+    for appointment_id in range(ids["appointments"], ids["appointments"] + appointments_total):
+        # Spread a quarter of the window into the future so upcoming reminders exist
+        scheduled_at = end + timedelta(days=90) - timedelta(seconds=rng.random() * (window + 90 * 86400))
+        scheduled_at = scheduled_at.replace(minute=0, second=0, microsecond=0)
+        upcoming = scheduled_at > end
+        status = "scheduled" if upcoming else rng.choice(["completed", "completed", "cancelled"])
+        service_type = rng.choice(SERVICE_TYPES)
+        garage_id = rng.choice(garage_ids)
+        out.add(Appointment, {"id": appointment_id, "vehicle_id": rng.choice(vehicle_ids), "garage_id": garage_id,
+                              "service_type": service_type, "scheduled_at": scheduled_at,
+                              "ends_at": scheduled_at + service_duration(service_type), "notes": "",
+                              "status": status, "reminder_job_id": None})
+        remind_at = scheduled_at - timedelta(hours=24)
+        out.add(Reminder, {"id": ids["reminders"], "appointment_id": appointment_id, "garage_id": garage_id,
+                           "channel": "log", "offset_minutes": 24 * 60,
+                           "message": f"Reminder: {service_type} on {scheduled_at.isoformat()}",
+                           "scheduled_for": remind_at, "sent_at": remind_at if remind_at <= end else None})
+        ids["reminders"] += 1
+
+    out.flush()
+
+    # Link invoiced jobs to their invoices (circular FK, so done after both are loaded)
+    # UPDATE ... FROM (SQLite 3.33+, Postgres) joins once instead of a subquery per job.
+    conn.execute(text(
+        "UPDATE jobs SET invoice_id = invoices.id FROM invoices "
+        "WHERE invoices.job_id = jobs.id AND invoices.id >= :start"
+    ), {"start": ids["invoices_start"]})
+
+    if out.use_copy:
+        # COPY with explicit ids does not advance SERIAL sequences
+        for model in TABLES:
+            name = model.__table__.name
+            conn.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), GREATEST((SELECT MAX(id) FROM {name}), 1))"
+            )
+    return out.counts
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    """Small-mean Poisson sample (Knuth); keeps child counts realistic without numpy."""
+    limit = math.exp(-mean)
+    k, p = 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def main() -> None:
+    args = parse_args()
+    init_db()
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        counts = generate(conn, args)
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(f"OK: loaded {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s) into {engine.url.render_as_string()}")
+    for name, count in counts.items():
+        print(f"  {name:22} {count:>12,}")
+
+
+if __name__ == "__main__":
+    main()
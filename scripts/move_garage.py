@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Move a garage to another database shard while it keeps serving.
+
+Shards are configured with TENANT_SHARDS (see app/tenancy.py); "default" is
+the main DATABASE_URL database:
+
+    python scripts/move_garage.py --list
+    python scripts/move_garage.py --garage 7 --to east
+    python scripts/move_garage.py --garage 7 --to default
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.chdir(ROOT)
+
+from app.database import SessionLocal  # noqa: E402
+from app.models import Garage  # noqa: E402
+from app.tenancy import DIRECTORY, MOVE_BATCH_SIZE, move_garage, tenant_router  # noqa: E402
+
+
+def list_garages() -> None:
+    db = SessionLocal()
+    try:
+        for garage in db.query(Garage).order_by(Garage.id).all():
+            moving = "  (moving)" if garage.moving else ""
+            print(f"  {garage.id:6}  {garage.name:30}  {garage.shard or DIRECTORY}{moving}")
+    finally:
+        db.close()
+    print("Shards: " + ", ".join(shard.name for shard in tenant_router.shards()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--list", action="store_true", help="show each garage's shard and exit")
+    parser.add_argument("--garage", type=int, help="id of the garage to move")
+    parser.add_argument("--to", help="target shard name from TENANT_SHARDS, or \"default\"")
+    parser.add_argument("--batch-size", type=int, default=MOVE_BATCH_SIZE, help="rows copied per statement")
+    parser.add_argument(
+        "--settle", type=float, default=None,
+        help="seconds to wait for API workers to see a route change (default TENANT_ROUTES_REFRESH_SECONDS + 5)",
+    )
+    args = parser.parse_args()
+
+    if args.list:
+        list_garages()
+        return
+    if args.garage is None or not args.to:
+        parser.error("--garage and --to are required")
+
+    started = time.perf_counter()
+    counts = move_garage(args.garage, args.to, batch_size=args.batch_size, settle_seconds=args.settle)
+    print(f"OK: garage {args.garage} moved to {args.to} ({time.perf_counter() - started:.1f}s).")
+    for table, copied in counts.items():
+        print(f"  {table:32}  {copied}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ os.chdir(ROOT)
 from app.database import SessionLocal, init_db  # noqa: E402
 from app.models import Garage, User  # noqa: E402
 from app.auth import get_password_hash  # noqa: E402
+from app.tenancy import sync_all_reference  # noqa: E402
 
 # (email, password, role) — keep passwords short for demo only
 DEMO = [
@@ -53,6 +54,7 @@ def main() -> None:
                     )
                 )
         db.commit()
+        sync_all_reference()
         print("OK: demo users upserted.")
         for email, password, role in DEMO:
             print(f"  {role:20}  {email}  /  {password}")
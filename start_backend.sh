@@ -3,6 +3,7 @@
 
 cd "$(dirname "$0")"
 source .venv/bin/activate
+python scripts/bootstrap.py
 echo "Starting MotoTrack backend server on http://localhost:8000"
 echo "Press Ctrl+C to stop"
 uvicorn main:app --host 0.0.0.0 --port 8000 --reload
@@ -0,0 +1,71 @@
+"""Shared test setup: the app on scratch SQLite databases, plus garages and users with tokens.
+
+The default database is the directory; "east" and "west" are empty tenant shards
+that garages can be moved to (app/tenancy.py).
+"""
+import itertools
+import json
+import os
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp(prefix="mototrack-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATA_DIR}/test.db"
+os.environ["INVOICE_CACHE_DIR"] = f"{DATA_DIR}/invoice_cache"
+os.environ["RUN_SCHEDULER"] = "0"
+os.environ["TENANT_SHARDS"] = json.dumps({name: f"sqlite:///{DATA_DIR}/{name}.db" for name in ("east", "west")})
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.models import Garage, User  # noqa: E402
+from app.tenancy import mirror  # noqa: E402
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    init_db()
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def make_garage(client):
+    """Create a garage in the directory (and its shard copies); returns its id."""
+    def make(name=None, **values):
+        db = SessionLocal()
+        try:
+            garage = Garage(name=name or f"Test Garage {next(_names)}", **values)
+            db.add(garage)
+            db.commit()
+            garage_id = garage.id
+        finally:
+            db.close()
+        mirror(Garage, [garage_id])
+        return garage_id
+    return make
+
+
+@pytest.fixture
+def make_user(client):
+    """Create a user; returns (user id, auth headers) with the garage in the token's ``gid`` claim."""
+    def make(role, garage_id=None):
+        db = SessionLocal()
+        try:
+            if garage_id is None:
+                garage_id = db.query(Garage.id).order_by(Garage.id).first()[0]
+            user = User(email=f"{role}.{next(_names)}@example.com", hashed_password="x", role=role,
+                        garage_id=garage_id, full_name=role)
+            db.add(user)
+            db.commit()
+            user_id = user.id
+        finally:
+            db.close()
+        mirror(User, [user_id])
+        token = create_access_token({"sub": str(user_id), "gid": garage_id})
+        return user_id, {"Authorization": f"Bearer {token}"}
+    return make
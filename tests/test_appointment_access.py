@@ -0,0 +1,34 @@
+"""Staff only see and change their own garage's appointments."""
+
+BOOKING = {"vehicle_vin": "VINACC0001", "service_type": "inspection", "scheduled_at": "2030-02-01T10:00:00Z"}
+
+
+def test_other_garage_appointment_is_hidden(client, make_garage, make_user):
+    own, other = make_garage(), make_garage()
+    make_user("technician", own)
+    _, owner = make_user("site_manager", own)
+    _, outsider = make_user("site_manager", other)
+    _, admin = make_user("admin", other)
+
+    created = client.post("/appointments/", json=BOOKING, headers=owner)
+    assert created.status_code == 200, created.text
+    appointment_id = created.json()["id"]
+
+    assert client.get(f"/appointments/{appointment_id}", headers=outsider).status_code == 404
+    cancel = client.patch(f"/appointments/{appointment_id}", json={"status": "cancelled"}, headers=outsider)
+    assert cancel.status_code == 404
+    assert client.get(f"/appointments/{appointment_id}", headers=owner).json()["status"] == "scheduled"
+    assert client.get(f"/appointments/{appointment_id}", headers=admin).status_code == 200
+
+
+def test_booking_for_another_garage(client, make_garage, make_user):
+    own, other = make_garage(), make_garage()
+    _, headers = make_user("site_manager", own)
+    _, admin = make_user("admin", own)
+    make_user("technician", other)
+
+    assert client.post("/appointments/", json={**BOOKING, "garage_id": other}, headers=headers).status_code == 403
+    assert client.post("/appointments/", json={**BOOKING, "garage_id": 999999}, headers=admin).status_code == 404
+    booked = client.post("/appointments/", json={**BOOKING, "garage_id": other}, headers=admin)
+    assert booked.status_code == 200, booked.text
+    assert booked.json()["garage_id"] == other
@@ -0,0 +1,29 @@
+"""Appointment endpoints accept offset-aware timestamps and store them as naive UTC."""
+
+
+def test_z_timestamps(client, make_garage, make_user):
+    garage_id = make_garage()
+    _, headers = make_user("site_manager", garage_id)
+    make_user("technician", garage_id)
+
+    created = client.post(
+        "/appointments/",
+        json={"vehicle_vin": "VINTZ0001", "service_type": "inspection", "scheduled_at": "2030-01-01T10:00:00Z"},
+        headers=headers,
+    )
+    assert created.status_code == 200, created.text
+    assert created.json()["scheduled_at"].startswith("2030-01-01T10:00:00")
+
+    moved = client.patch(
+        f"/appointments/{created.json()['id']}", json={"scheduled_at": "2030-01-01T14:00:00+02:00"}, headers=headers
+    )
+    assert moved.status_code == 200, moved.text
+    assert moved.json()["scheduled_at"].startswith("2030-01-01T12:00:00")
+
+    slots = client.get(
+        "/appointments/availability",
+        params={"garage_id": garage_id, "service_type": "inspection",
+                "from": "2030-01-01T00:00:00Z", "to": "2030-01-02T00:00:00Z"},
+        headers=headers,
+    )
+    assert slots.status_code == 200, slots.text
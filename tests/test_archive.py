@@ -0,0 +1,58 @@
+"""Archived jobs and invoices are still served by id from the archive tables."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from app import archive
+from app.database import SessionLocal
+from app.models import Invoice, Job
+
+
+def test_reads_fall_through_to_the_archive(client, make_garage, make_user):
+    garage_id = make_garage()
+    headers = {role: make_user(role, garage_id) for role in
+               ("site_manager", "technician", "workshop_manager", "billing")}
+    technician_id, technician = headers["technician"]
+
+    job = client.post("/jobs/", headers=headers["site_manager"][1], json={
+        "registration_number": "KAR 100A", "owner_name": "Owner", "owner_contact": "0700000000",
+        "operations_stream": "mechanical_works", "revenue_stream": "walk_in", "issues_reported": "Noise",
+    }).json()
+    steps = [
+        ("post", f"/jobs/{job['id']}/assign", headers["site_manager"][1], {"technician_id": technician_id}),
+        ("patch", f"/jobs/{job['id']}", technician, {"status": "in_progress"}),
+        ("post", f"/jobs/{job['id']}/complete", technician, None),
+        ("post", f"/jobs/{job['id']}/manager-review", headers["workshop_manager"][1], None),
+        ("post", f"/jobs/{job['id']}/move-to-billing", headers["workshop_manager"][1], None),
+    ]
+    for method, url, auth, body in steps:
+        response = client.request(method, url, headers=auth, json=body)
+        assert response.status_code == 200, (url, response.text)
+    billing = headers["billing"][1]
+    invoice = client.post(f"/billing/jobs/{job['id']}/invoice", headers=billing, json={
+        "job_id": job["id"], "tax_rate": 16,
+        "items": [{"description": "Labour", "quantity": 2, "unit_price": 1500.0, "item_type": "labor"}],
+    })
+    assert invoice.status_code == 201, invoice.text
+    invoice_id = invoice.json()["id"]
+    assert client.post(f"/billing/invoices/{invoice_id}/mark-paid", headers=billing).status_code == 200
+
+    db = SessionLocal()
+    try:
+        paid_long_ago = datetime.utcnow() - timedelta(days=archive.ARCHIVE_AFTER_DAYS + 1)
+        db.execute(update(Invoice).where(Invoice.id == invoice_id).values(paid_at=paid_long_ago))
+        db.commit()
+        live_job = client.get(f"/jobs/{job['id']}", headers=technician).json()
+        live_invoice = client.get(f"/billing/invoices/{invoice_id}", headers=billing).json()
+        assert live_job["status"] == "invoiced"
+        assert archive.run_archival()["jobs"] >= 1
+        assert db.scalar(select(Job.id).where(Job.id == job["id"])) is None
+    finally:
+        db.close()
+
+    archived_job = client.get(f"/jobs/{job['id']}", headers=technician)
+    assert archived_job.status_code == 200
+    assert archived_job.json() == live_job
+    archived_invoice = client.get(f"/billing/invoices/{invoice_id}", headers=billing)
+    assert archived_invoice.status_code == 200
+    assert archived_invoice.json() == live_invoice
@@ -0,0 +1,110 @@
+"""POSTs carrying an Idempotency-Key run once; retries get the first response back."""
+import time
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, update
+
+from app import idempotency
+from app.database import SessionLocal, engine
+from app.idempotency import IdempotencyMiddleware
+from app.models import IdempotencyKey, Job
+
+
+def _job(registration_number):
+    return {
+        "registration_number": registration_number, "owner_name": "Owner", "owner_contact": "0700000000",
+        "operations_stream": "mechanical_works", "revenue_stream": "walk_in", "issues_reported": "Noise",
+    }
+
+
+def _count(model, *conditions):
+    db = SessionLocal()
+    try:
+        return db.scalar(select(func.count()).select_from(model).where(*conditions))
+    finally:
+        db.close()
+
+
+def test_retry_replays_the_stored_job(client, make_garage, make_user):
+    garage_id = make_garage()
+    _, site_manager = make_user("site_manager", garage_id)
+    keyed = {**site_manager, "Idempotency-Key": "create-job-1"}
+
+    first = client.post("/jobs/", headers=keyed, json=_job("KID 001A"))
+    retry = client.post("/jobs/", headers=keyed, json=_job("KID 001A"))
+
+    assert first.status_code == retry.status_code == 201
+    assert "idempotent-replayed" not in first.headers
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.content == first.content
+    assert retry.headers["content-type"] == first.headers["content-type"]
+    assert _count(Job, Job.garage_id == garage_id) == 1
+
+
+def test_key_reused_for_a_different_body_is_rejected(client, make_garage, make_user):
+    _, site_manager = make_user("site_manager", make_garage())
+    keyed = {**site_manager, "Idempotency-Key": "create-job-2"}
+
+    assert client.post("/jobs/", headers=keyed, json=_job("KID 002A")).status_code == 201
+    assert client.post("/jobs/", headers=keyed, json=_job("KID 002B")).status_code == 422
+
+
+def test_duplicate_of_a_running_request_waits_then_gets_409(client, make_garage, make_user, monkeypatch):
+    user_id, site_manager = make_user("site_manager", make_garage())
+    keyed = {**site_manager, "Idempotency-Key": "create-job-3"}
+    assert client.post("/jobs/", headers=keyed, json=_job("KID 003A")).status_code == 201
+    # Put the key back in the state it has while the first request's handler runs
+    with engine.begin() as conn:
+        conn.execute(
+            update(IdempotencyKey).where(IdempotencyKey.user_id == user_id)
+            .values(status_code=None, response_body=None, locked_until=datetime.utcnow() + timedelta(minutes=1))
+        )
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.3)
+
+    started = time.monotonic()
+    duplicate = client.post("/jobs/", headers=keyed, json=_job("KID 003A"))
+
+    assert time.monotonic() - started >= 0.3
+    assert duplicate.status_code == 409
+    assert duplicate.headers["retry-after"] == "1"
+
+
+def test_failed_request_releases_its_key(client, make_garage, make_user):
+    garage_id = make_garage()
+    user_id, site_manager = make_user("site_manager", garage_id)
+    keyed = {**site_manager, "Idempotency-Key": "create-job-4"}
+
+    rejected = client.post("/jobs/", headers=keyed, json={**_job("KID 004A"), "operations_stream": "bodywork"})
+    assert 400 <= rejected.status_code < 500
+    assert _count(IdempotencyKey, IdempotencyKey.user_id == user_id) == 0
+
+    retried = client.post("/jobs/", headers=keyed, json=_job("KID 004A"))
+    assert retried.status_code == 201
+    assert "idempotent-replayed" not in retried.headers
+
+
+def test_replay_keeps_the_original_headers(client, make_garage, make_user):
+    _, headers = make_user("site_manager", make_garage())
+    calls = []
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware)
+
+    @app.post("/things")
+    def create_thing():
+        calls.append(1)
+        return Response(b'{"id": 7}', status_code=201, media_type="application/json",
+                        headers={"Location": "/things/7", "ETag": '"v1"'})
+
+    with TestClient(app) as test_client:
+        keyed = {**headers, "Idempotency-Key": "create-thing-1"}
+        first = test_client.post("/things", headers=keyed)
+        retry = test_client.post("/things", headers=keyed)
+
+    assert len(calls) == 1
+    assert retry.status_code == 201
+    assert retry.headers["location"] == "/things/7"
+    assert retry.headers["etag"] == '"v1"'
+    assert retry.headers["content-type"] == first.headers["content-type"]
+    assert retry.headers["idempotent-replayed"] == "true"
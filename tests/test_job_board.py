@@ -0,0 +1,31 @@
+"""The cached job board picks up job writes as soon as they commit."""
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models import JobBoardVersion
+
+
+def _version(garage_id):
+    db = SessionLocal()
+    try:
+        return db.scalar(select(JobBoardVersion.version).where(JobBoardVersion.garage_id == garage_id)) or 0
+    finally:
+        db.close()
+
+
+def test_job_writes_invalidate_the_cached_board(client, make_garage, make_user):
+    garage_id = make_garage()
+    _, site_manager = make_user("site_manager", garage_id)
+    job = {
+        "registration_number": "KJB 001A", "owner_name": "Owner", "owner_contact": "0700000000",
+        "operations_stream": "mechanical_works", "revenue_stream": "walk_in", "issues_reported": "Noise",
+    }
+
+    assert client.get("/jobs/board", headers=site_manager).json()["by_status"] == {}
+    assert client.post("/jobs/", headers=site_manager, json=job).status_code == 201
+    assert _version(garage_id) == 1
+    assert client.get("/jobs/board", headers=site_manager).json()["by_status"] == {"received": 1}
+
+    assert client.post("/jobs/", headers=site_manager, json={**job, "registration_number": "KJB 002A"}).status_code == 201
+    assert _version(garage_id) == 2
+    assert client.get("/jobs/board", headers=site_manager).json()["by_status"] == {"received": 2}
@@ -0,0 +1,47 @@
+"""Service-due reminders belong to the garage that last serviced the vehicle, on that garage's shard."""
+from datetime import date, timedelta
+
+from sqlalchemy import insert, select
+
+from app.models import Reminder, ServiceHistory, Vehicle
+from app.service_forecast import run_forecast
+from app.tenancy import move_garage, tenant_router
+
+
+def _serviced_job(client, headers, registration):
+    created = client.post("/jobs/", headers=headers, json={
+        "registration_number": registration, "owner_name": "Owner", "owner_contact": "0700000000",
+        "operations_stream": "mechanical_works", "revenue_stream": "walk_in", "issues_reported": "Service",
+    })
+    assert created.status_code == 201, created.text
+    with tenant_router.directory.engine.begin() as conn:
+        vehicle_id = conn.execute(select(Vehicle.id).where(Vehicle.registration_number == registration)).scalar()
+        # Last serviced 360 days ago, so due within the reminder window
+        conn.execute(insert(ServiceHistory), [
+            {"vehicle_id": vehicle_id, "date": date.today() - timedelta(days=days), "mileage": km, "service_type": "full"}
+            for days, km in ((400, 0), (360, 100))
+        ])
+
+
+def _reminders(shard, registration):
+    with tenant_router.shard(shard).engine.connect() as conn:
+        return conn.execute(
+            select(Reminder.garage_id).where(Reminder.message.contains(registration))
+        ).scalars().all()
+
+
+def test_reminders_go_to_the_servicing_garage_once(client, make_garage, make_user):
+    local, moved = make_garage(), make_garage()
+    _, local_headers = make_user("site_manager", local)
+    _, moved_headers = make_user("site_manager", moved)
+    _serviced_job(client, local_headers, "KFA 100A")
+    _serviced_job(client, moved_headers, "KFA 200B")
+    # The move leaves a copy of the vehicle and its history behind on the default database
+    move_garage(moved, "east", settle_seconds=0)
+
+    for shard in tenant_router.shards():
+        run_forecast(bind=shard.engine)
+
+    assert _reminders("default", "KFA 100A") == [local]
+    assert _reminders("default", "KFA 200B") == []
+    assert _reminders("east", "KFA 200B") == [moved]
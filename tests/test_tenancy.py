@@ -0,0 +1,63 @@
+"""Requests are served from the shard of the token's garage, and garages move between shards."""
+from sqlalchemy import func, select
+
+from app.models import Appointment, Garage, Job
+from app.tenancy import move_garage, tenant_router
+
+
+def _job(registration):
+    return {
+        "registration_number": registration, "owner_name": "Owner", "owner_contact": "0700000000",
+        "operations_stream": "mechanical_works", "revenue_stream": "walk_in", "issues_reported": "Noise",
+    }
+
+
+def _jobs(shard, garage_id):
+    with tenant_router.shard(shard).engine.connect() as conn:
+        return conn.execute(select(func.count(Job.id)).where(Job.garage_id == garage_id)).scalar()
+
+
+def test_move_garage_and_route_by_token(client, make_garage, make_user):
+    garage_id = make_garage()
+    _, headers = make_user("site_manager", garage_id)
+    created = client.post("/jobs/", json=_job("KTN 001A"), headers=headers)
+    assert created.status_code == 201, created.text
+    job_id = created.json()["id"]
+    assert _jobs("default", garage_id) == 1
+
+    counts = move_garage(garage_id, "east", settle_seconds=0)
+
+    assert counts["jobs"] == 1
+    assert _jobs("default", garage_id) == 0
+    assert _jobs("east", garage_id) == 1
+    with tenant_router.directory.engine.connect() as conn:
+        garage = conn.execute(select(Garage.shard, Garage.moving).where(Garage.id == garage_id)).one()
+    assert garage.shard == "east" and not garage.moving
+
+    # The same token now reads and writes the east shard
+    assert client.get(f"/jobs/{job_id}", headers=headers).status_code == 200
+    assert client.post("/jobs/", json=_job("KTN 002A"), headers=headers).status_code == 201
+    assert _jobs("east", garage_id) == 2
+    assert _jobs("default", garage_id) == 0
+    assert _jobs("west", garage_id) == 0
+
+
+def test_appointments_stay_on_the_callers_shard(client, make_garage, make_user):
+    east_garage, west_garage = make_garage(), make_garage()
+    make_user("technician", west_garage)
+    move_garage(east_garage, "east", settle_seconds=0)
+    move_garage(west_garage, "west", settle_seconds=0)
+    _, admin = make_user("admin", east_garage)
+
+    booking = {"vehicle_vin": "VINSHARD01", "service_type": "inspection", "scheduled_at": "2030-03-01T10:00:00Z",
+               "garage_id": west_garage}
+    assert client.post("/appointments/", json=booking, headers=admin).status_code == 400
+    slots = client.get(
+        "/appointments/availability",
+        params={"garage_id": west_garage, "service_type": "inspection",
+                "from": "2030-03-01T00:00:00Z", "to": "2030-03-02T00:00:00Z"},
+        headers=admin,
+    )
+    assert slots.status_code == 400
+    with tenant_router.shard("east").engine.connect() as conn:
+        assert conn.execute(select(func.count(Appointment.id)).where(Appointment.garage_id == west_garage)).scalar() == 0